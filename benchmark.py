@@ -0,0 +1,462 @@
+"""
+Benchmarks for the database modules.
+
+Usage:
+    python benchmark.py compression [--rows 200000]
+    python benchmark.py parallel [--rows 1000000] [--processes]
+    python benchmark.py imports [--repeat 5]
+    python benchmark.py resilience [--ops 300] [--fail-rate 0.2] [--status 429]
+    python benchmark.py sheets-reads [--rows 5000]
+    python benchmark.py server [--clients 1 4 16] [--ops 200] [--rows 20000]
+    python benchmark.py partitions [--rows 200000] [--partition-by id|Category]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Cold-start budgets in seconds: (label, code timed in a fresh interpreter, budget).
+# pandas alone takes a few tenths of a second, so the backends get most of the budget.
+IMPORT_BUDGETS = [
+    ("import config", "import config", 0.05),
+    ("import cli", "import cli", 0.05),
+    ("import csv_db", "import csv_db", 1.0),
+    ("import gsheets_db", "import gsheets_db", 1.0),
+    ("config.get_database()", "import config; config.get_database()", 1.2),
+]
+
+# Modules that importing the database layer must not load
+LAZY_MODULES = ["streamlit", "gspread", "oauth2client"]
+
+
+def make_table(rows: int):
+    """Build a synthetic Cin7-style product table with repetitive text columns."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(42)
+    categories = ["Hand Tools", "Power Tools", "Fasteners", "Plumbing", "Electrical", "Garden", "Paint"]
+    brands = ["Acme", "Bosch", "Makita", "Stanley", "DeWalt", "Ryobi"]
+    words = ["steel", "heavy duty", "cordless", "18V", "pro", "kit", "set", "compact", "brushless", "case"]
+
+    category = rng.choice(categories, rows)
+    brand = rng.choice(brands, rows)
+    return pd.DataFrame({
+        "id": np.arange(1, rows + 1),
+        "timestamp": "2024-01-01 09:00:00",
+        "Code": [f"SKU-{i:07d}" for i in range(rows)],
+        "Name": [f"{b} {w} {c[:-1]}" for b, w, c in zip(brand, rng.choice(words, rows), category)],
+        "Category": category,
+        "Brand": brand,
+        "Description": [f"{b} {c} - {' '.join(rng.choice(words, 4))}" for b, c in zip(brand, category)],
+        "Price": np.round(rng.uniform(1, 500, rows), 2),
+        "Stock": rng.integers(0, 1000, rows),
+        "Status": rng.choice(["Active", "Active", "Active", "Discontinued"], rows),
+    })
+
+
+def _best_of(func, repeat: int = 3) -> float:
+    """Run a function several times and return the fastest time in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_compression(args):
+    """Compare file size, read throughput and append cost for each codec."""
+    import storage
+    from csv_db import CSVDatabase
+
+    df = make_table(args.rows)
+    workdir = tempfile.mkdtemp()
+    plain_bytes = len(df.to_csv(index=False).encode("utf-8"))
+
+    print(f"Compression benchmark: {args.rows} rows, {plain_bytes / 1e6:.1f} MB uncompressed")
+    print(f"{'codec':<8}{'size MB':>10}{'ratio':>8}{'write s':>10}{'read s':>9}{'read MB/s':>11}{'append ms':>11}")
+
+    try:
+        for suffix in ["", ".gz", ".zst", ".lz4"]:
+            path = os.path.join(workdir, "bench.csv" + suffix)
+            codec = storage.codec_for(path) or "none"
+            try:
+                write_time = _best_of(lambda: storage.write_csv(df, path), repeat=1)
+            except ImportError as e:
+                print(f"{codec:<8}  skipped ({e.name} not installed)")
+                continue
+
+            size = os.path.getsize(path)
+            read_time = _best_of(lambda: storage.read_csv(path), repeat=args.repeat)
+
+            db = CSVDatabase(path)
+            db.read_all()
+            append_time = _best_of(lambda: db.add_record({"Name": "benchmark row"}), repeat=args.repeat)
+
+            print(f"{codec:<8}{size / 1e6:>10.1f}{plain_bytes / size:>8.1f}{write_time:>10.2f}"
+                  f"{read_time:>9.2f}{plain_bytes / 1e6 / read_time:>11.1f}{append_time * 1000:>11.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_parallel(args):
+    """Time parallel CSV parsing against a plain pd.read_csv for each worker count."""
+    import pandas as pd
+    import storage
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "bench.csv")
+    make_table(args.rows).to_csv(path, index=False)
+    size_mb = os.path.getsize(path) / 1e6
+    cores = os.cpu_count() or 1
+
+    print(f"Parallel read benchmark: {args.rows} rows, {size_mb:.1f} MB, {cores} cores, "
+          f"{'processes' if args.processes else 'threads'}")
+    if cores == 1:
+        print("Only one core available: parallel parsing can't be faster here")
+
+    try:
+        baseline = _best_of(lambda: pd.read_csv(path), repeat=args.repeat)
+        print(f"{'workers':<10}{'read s':>9}{'MB/s':>9}{'speedup':>9}")
+        print(f"{'simple':<10}{baseline:>9.2f}{size_mb / baseline:>9.1f}{1.0:>9.2f}")
+
+        workers = 2
+        while workers <= max(cores, 2):
+            elapsed = _best_of(lambda: storage.read_csv_parallel(path, workers=workers, use_threads=not args.processes),
+                               repeat=args.repeat)
+            print(f"{workers:<10}{elapsed:>9.2f}{size_mb / elapsed:>9.1f}{baseline / elapsed:>9.2f}")
+            workers *= 2
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _time_import(code: str, cwd: str):
+    """Run code in a fresh interpreter; return its run time and the lazy modules it loaded."""
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{code}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"loaded = [m for m in {LAZY_MODULES!r} if m in sys.modules]\n"
+        "print(elapsed, ','.join(loaded))\n"
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                      env.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-c", script], cwd=cwd, env=env,
+                            capture_output=True, text=True, check=True)
+    elapsed, _, loaded = result.stdout.strip().splitlines()[-1].partition(" ")
+    return float(elapsed), [m for m in loaded.split(",") if m]
+
+
+def bench_imports(args):
+    """Time cold imports of the database modules against IMPORT_BUDGETS."""
+    workdir = tempfile.mkdtemp()
+    failures = 0
+
+    print(f"Import benchmark: best of {args.repeat} fresh interpreters")
+    print(f"{'step':<24}{'time s':>9}{'budget s':>10}  result")
+    try:
+        for label, code, budget in IMPORT_BUDGETS:
+            runs = [_time_import(code, workdir) for _ in range(args.repeat)]
+            elapsed = min(run[0] for run in runs)
+            loaded = sorted(set(m for run in runs for m in run[1]))
+            problems = []
+            if elapsed > budget:
+                problems.append("over budget")
+            if loaded:
+                problems.append("loaded " + ", ".join(loaded))
+            failures += bool(problems)
+            print(f"{label:<24}{elapsed:>9.3f}{budget:>10.2f}  {'; '.join(problems) or 'ok'}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if failures else 0
+
+
+def bench_resilience(args):
+    """Run Google Sheets operations against a fake worksheet that fails some calls, with and without retries."""
+    from sheets_fakes import FakeClient
+    from gsheets_db import GoogleSheetsDatabase
+    from query import Query
+    from sheets_api import SheetsExecutor, TokenBucket, CircuitBreaker
+
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)  # snapshots land in the working directory
+
+    print(f"Resilience benchmark: {args.ops} operations, {args.fail_rate:.0%} of API calls fail with HTTP {args.status}")
+    print(f"{'setup':<12}{'ok':>6}{'failed':>8}{'API calls':>11}{'retries':>9}{'time s':>8}")
+    try:
+        for label, retries in [("no retries", 0), ("executor", 4)]:
+            executor = SheetsExecutor(bucket=TokenBucket(rate_per_minute=1e6, capacity=1000),
+                                      breaker=CircuitBreaker(failure_threshold=10 ** 9),
+                                      max_retries=retries, base_delay=args.base_delay)
+            client = FakeClient()
+            db = GoogleSheetsDatabase(client=client, executor=executor)
+            worksheet = client.open(db.spreadsheet_name).worksheet(db.worksheet_name)
+            for i in range(20):
+                db.add_record({"Name": f"item {i}", "Price": i})
+            worksheet.fail_rate, worksheet.fail_status = args.fail_rate, args.status
+
+            ok = 0
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # the backend prints each failure
+                for i in range(args.ops):
+                    before = executor.stats["failures"]
+                    if i % 3 == 0:
+                        result = db.update_record(i % 20 + 1, {"Price": i})
+                    elif i % 3 == 1:
+                        result = db.query(Query().where("Price", ">", 5))
+                    else:
+                        result = db.read_all()
+                    ok += result is not False and executor.stats["failures"] == before
+            elapsed = time.perf_counter() - start
+            print(f"{label:<12}{ok:>6}{args.ops - ok:>8}{executor.stats['calls']:>11}"
+                  f"{executor.stats['retries']:>9}{elapsed:>8.2f}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_sheets_reads(args):
+    """Compare Google Sheets read paths that download ranges with reading the whole sheet, on a fake worksheet."""
+    from sheets_fakes import FakeClient
+    from gsheets_db import GoogleSheetsDatabase, _cell_rows
+    from query import Query
+    from sheets_api import SheetsExecutor, TokenBucket
+
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)  # the statistics file lands in the working directory
+
+    try:
+        client = FakeClient()
+        db = GoogleSheetsDatabase(client=client, executor=SheetsExecutor(bucket=TokenBucket(rate_per_minute=1e6,
+                                                                                            capacity=1000)))
+        worksheet = client.open(db.spreadsheet_name).worksheet(db.worksheet_name)
+        table = make_table(args.rows)
+        worksheet.rows = [list(table.columns)] + _cell_rows(table)
+        code = table["Code"].iloc[args.rows // 2]
+        record_id = int(table["id"].iloc[args.rows // 2])
+
+        # (label, whole-sheet version as the backend used to do it, range version)
+        operations = [
+            ("id list", lambda: db.read_all()["id"].tolist(), db.get_ids),
+            ("search one column", lambda: (lambda df: df[df["Code"] == code])(db.read_all()), lambda: db.search("Code", code)),
+            ("page of 100 rows", lambda: db.read_all().iloc[1000:1100], lambda: db.read_page(1000, 100)),
+            ("one record by id", lambda: (lambda df: df[df["id"] == record_id])(db.read_all()),
+             lambda: db.query(Query().where("id", "==", record_id))),
+            ("columns", lambda: list(db.read_all().columns), db.get_columns),
+        ]
+
+        print(f"Google Sheets read benchmark: {args.rows} rows x {len(table.columns)} columns (fake worksheet)")
+        print(f"{'operation':<20}{'cells, whole sheet':>20}{'cells, ranges':>15}{'API calls':>12}")
+        for label, whole, ranged in operations:
+            counts = []
+            for read in (whole, ranged):
+                calls, cells = len(worksheet.calls), worksheet.cells_returned
+                read()
+                counts.append((len(worksheet.calls) - calls, worksheet.cells_returned - cells))
+            print(f"{label:<20}{counts[0][1]:>20,}{counts[1][1]:>15,}{f'{counts[0][0]} -> {counts[1][0]}':>12}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run_clients(open_db, clients: int, ops: int, write_every: int, id_range: int):
+    """Run client threads doing point reads and adds; return (elapsed, latencies, adds, failed adds)."""
+    import random
+    import threading
+
+    latencies = []
+    added = [0] * clients
+    failed = [0] * clients
+    ready = threading.Barrier(clients + 1)
+
+    def client(k):
+        db = open_db()
+        rng = random.Random(k)
+        mine = []
+        ready.wait()
+        for i in range(ops):
+            start = time.perf_counter()
+            if i % write_every == 0:
+                ok = db.add_record({"Name": f"client {k} op {i}", "Price": i}) is True
+                added[k] += ok
+                failed[k] += not ok
+            else:
+                db.search("id", rng.randint(1, id_range))
+            mine.append(time.perf_counter() - start)
+        latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sorted(latencies), sum(added), sum(failed)
+
+
+def bench_server(args):
+    """Throughput of N concurrent clients writing the CSV file directly vs. through db_server."""
+    import http.client
+    import json
+    import storage
+    from csv_db import CSVDatabase
+    from db_server import RemoteDatabase
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "bench.csv")
+    server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db_server.py")
+
+    print(f"Server benchmark: {args.rows} rows, {args.ops} operations per client, "
+          f"1 in {args.write_every} is an add")
+    print(f"{'mode':<8}{'clients':>8}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'failed':>8}{'lost':>6}{'commits':>9}")
+    try:
+        for clients in args.clients:
+            for mode in ("direct", "server"):
+                storage.write_csv(make_table(args.rows), path)
+                for sidecar in os.listdir(workdir):
+                    if sidecar != "bench.csv":
+                        shutil.rmtree(os.path.join(workdir, sidecar), ignore_errors=True) \
+                            if os.path.isdir(os.path.join(workdir, sidecar)) \
+                            else os.remove(os.path.join(workdir, sidecar))
+
+                process, commits = None, "-"
+                if mode == "server":
+                    process = subprocess.Popen([sys.executable, server_script, "--path", path, "--port", "0"],
+                                               cwd=workdir, stdout=subprocess.PIPE, text=True)
+                    url = process.stdout.readline().split(" at ")[-1].strip()
+                    open_db = lambda: RemoteDatabase(url)
+                else:
+                    # Every app parses the file and writes it on its own
+                    open_db = lambda: CSVDatabase(path)
+                try:
+                    # Racing writers print their errors; they are counted instead
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        elapsed, latencies, added, failed = _run_clients(open_db, clients, args.ops,
+                                                                         args.write_every, args.rows)
+                    if process is not None:
+                        host, port = url.split("//")[-1].split(":")
+                        connection = http.client.HTTPConnection(host, int(port))
+                        connection.request("GET", "/health")
+                        commits = json.loads(connection.getresponse().read())["stats"]["commits"]
+                finally:
+                    if process is not None:
+                        process.terminate()
+                        process.wait()
+
+                # Adds reported as done that are missing from the file
+                lost = max(0, args.rows + added - len(storage.read_csv(path)))
+                total = clients * args.ops
+                print(f"{mode:<8}{clients:>8}{total / elapsed:>9.0f}"
+                      f"{latencies[len(latencies) // 2] * 1000:>9.1f}"
+                      f"{latencies[int(len(latencies) * 0.95)] * 1000:>9.1f}{failed:>8}{lost:>6}{commits:>9}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_partitions(args):
+    """Time single-record writes and a pruned query on one CSV file vs. a partitioned directory."""
+    from csv_db import CSVDatabase
+    from partitioned_db import PartitionedCSVDatabase
+    from query import Query
+
+    df = make_table(args.rows)
+    workdir = tempfile.mkdtemp()
+    rows_per_partition = max(1, args.rows // args.partitions)
+    layout = f"{args.partition_by}" + (f", {rows_per_partition} rows each" if args.partition_by == "id" else "")
+
+    print(f"Partition benchmark: {args.rows} rows, partitioned by {layout}")
+    print(f"{'operation':<24}{'single file ms':>16}{'partitioned ms':>16}{'speedup':>9}")
+    try:
+        single = CSVDatabase(os.path.join(workdir, "single.csv"))
+        parted = PartitionedCSVDatabase(os.path.join(workdir, "parts"), partition_by=args.partition_by,
+                                        rows_per_partition=rows_per_partition)
+        data = df.drop(columns=["id", "timestamp"])
+        for db in (single, parted):
+            db.bulk_import(data, mode="replace")
+            db.read_all()
+
+        target = args.rows // 2
+        column = "id" if args.partition_by == "id" else args.partition_by
+        value = target if args.partition_by == "id" else df.loc[target - 1, args.partition_by]
+        operations = [
+            ("update_record", lambda db, i: db.update_record(target + i, {"Price": i})),
+            ("delete_record", lambda db, i: db.delete_record(target + 100 + i)),
+            ("add with new column", lambda db, i: db.add_record({"Name": "new", "Category": value,
+                                                                 f"Extra{i}": i})),
+            # Each query follows a write, so the cached table is stale and the files are read
+            ("write + pruned query", lambda db, i: (db.update_record(target + i, {"Stock": i}),
+                                                    db.query(Query().where(column, "==", value)))),
+        ]
+        for label, operation in operations:
+            times = []
+            for db in (single, parted):
+                counter = iter(range(10 ** 6))
+                times.append(_best_of(lambda: operation(db, next(counter)), repeat=args.repeat))
+            print(f"{label:<24}{times[0] * 1000:>16.1f}{times[1] * 1000:>16.1f}{times[0] / times[1]:>9.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the database modules")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    compression = subparsers.add_parser("compression", help="Compare storage codecs")
+    compression.add_argument("--rows", type=int, default=200_000)
+    compression.add_argument("--repeat", type=int, default=3)
+    compression.set_defaults(func=bench_compression)
+
+    parallel = subparsers.add_parser("parallel", help="Time multi-core CSV parsing")
+    parallel.add_argument("--rows", type=int, default=1_000_000)
+    parallel.add_argument("--repeat", type=int, default=3)
+    parallel.add_argument("--processes", action="store_true", help="Use processes instead of threads")
+    parallel.set_defaults(func=bench_parallel)
+
+    imports = subparsers.add_parser("imports", help="Check cold-start import times against a budget")
+    imports.add_argument("--repeat", type=int, default=5)
+    imports.set_defaults(func=bench_imports)
+
+    resilience = subparsers.add_parser("resilience", help="Google Sheets retries against injected API faults")
+    resilience.add_argument("--ops", type=int, default=300)
+    resilience.add_argument("--fail-rate", type=float, default=0.2, help="Share of API calls that fail")
+    resilience.add_argument("--status", type=int, default=429, help="HTTP status of the injected failures")
+    resilience.add_argument("--base-delay", type=float, default=0.001, help="First backoff in seconds")
+    resilience.set_defaults(func=bench_resilience)
+
+    sheets_reads = subparsers.add_parser("sheets-reads", help="Google Sheets range reads vs. whole-sheet downloads")
+    sheets_reads.add_argument("--rows", type=int, default=5000)
+    sheets_reads.set_defaults(func=bench_sheets_reads)
+
+    server = subparsers.add_parser("server", help="Concurrent clients through db_server vs. direct file access")
+    server.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    server.add_argument("--ops", type=int, default=200, help="Operations per client")
+    server.add_argument("--rows", type=int, default=20_000)
+    server.add_argument("--write-every", type=int, default=5, help="Every nth operation is an add")
+    server.set_defaults(func=bench_server)
+
+    partitions = subparsers.add_parser("partitions", help="Single CSV file vs. partitioned directory")
+    partitions.add_argument("--rows", type=int, default=200_000)
+    partitions.add_argument("--partition-by", default="id", help="id or a column of the benchmark table")
+    partitions.add_argument("--partitions", type=int, default=20, help="Partitions with the id layout")
+    partitions.add_argument("--repeat", type=int, default=3)
+    partitions.set_defaults(func=bench_partitions)
+
+    args = parser.parse_args()
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Table Catalog Module
+Manages several named tables per backend, opening each one lazily on first use.
+"""
+
+import os
+from typing import Optional, List, Dict
+
+
+class CSVCatalog:
+    """
+    A directory of CSV tables, one file per table.
+
+    A subdirectory made by PartitionedCSVDatabase is opened as a partitioned table.
+    """
+
+    def __init__(self, root_dir: str = "tables", extension: str = ".csv", **table_options):
+        """
+        Initialize the CSV catalog.
+
+        Args:
+            root_dir: Directory holding one CSV file per table
+            extension: File extension used for table files
+            table_options: Extra keyword arguments passed to every CSVDatabase
+        """
+        self.root_dir = root_dir
+        self.extension = extension
+        self.table_options = table_options
+        self._tables = {}
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _path_for(self, name: str) -> str:
+        """Get the file path of a table, rejecting names that would escape the catalog."""
+        if not name or os.sep in name or "/" in name or name.startswith("."):
+            raise ValueError(f"Invalid table name: {name!r}")
+        return os.path.join(self.root_dir, name + self.extension)
+
+    def _is_partitioned(self, name: str) -> bool:
+        from partitioned_db import LAYOUT_FILE
+        return os.path.exists(os.path.join(self.root_dir, name, LAYOUT_FILE))
+
+    def table(self, name: str):
+        """
+        Open a table, creating it if it doesn't exist.
+
+        Tables are opened on first access and then reused, so each table keeps its own cache.
+
+        Args:
+            name: Table name
+
+        Returns:
+            CSVDatabase for the table
+        """
+        if name not in self._tables:
+            path = self._path_for(name)
+            if self._is_partitioned(name):
+                from partitioned_db import PartitionedCSVDatabase
+                self._tables[name] = PartitionedCSVDatabase(
+                    db_path=os.path.join(self.root_dir, name), **self.table_options)
+            else:
+                from csv_db import CSVDatabase
+                self._tables[name] = CSVDatabase(db_path=path, **self.table_options)
+        return self._tables[name]
+
+    def __getitem__(self, name: str):
+        return self.table(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tables or os.path.exists(self._path_for(name)) or self._is_partitioned(name)
+
+    def list_tables(self) -> List[str]:
+        """Get the names of all tables in the catalog."""
+        names = set(self._tables)
+        for filename in os.listdir(self.root_dir):
+            if filename.endswith(self.extension):
+                names.add(filename[:-len(self.extension)])
+            elif self._is_partitioned(filename):
+                names.add(filename)
+        return sorted(names)
+
+    def drop_table(self, name: str) -> bool:
+        """
+        Delete a table with its sidecar files and snapshots (see CSVDatabase.drop).
+
+        Args:
+            name: Table name
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            if name not in self:
+                raise FileNotFoundError(f"No table named {name!r}")
+            table = self.table(name)
+            self._tables.pop(name, None)
+            return table.drop()
+        except Exception as e:
+            print(f"Error dropping table: {e}")
+            return False
+
+
+class GoogleSheetsCatalog:
+    """A Google Spreadsheet whose worksheets are tables, sharing one connection."""
+
+    def __init__(self, spreadsheet_name: str = "SDATA Database", replica_dir: Optional[str] = None,
+                 replica_extension: str = ".sqlite", sync_interval: float = 60.0):
+        """
+        Initialize the Google Sheets catalog.
+
+        The client is authorized and the spreadsheet opened once; every table reuses them.
+
+        Args:
+            spreadsheet_name: Name of the Google Spreadsheet
+            replica_dir: Optional directory for per-table local replicas
+            replica_extension: Replica file extension (.sqlite, .csv or .parquet)
+            sync_interval: Seconds between replica reconciliations
+        """
+        from gsheets_db import authorize_client, open_spreadsheet
+        from sheets_api import default_executor
+
+        self.spreadsheet_name = spreadsheet_name
+        self.replica_dir = replica_dir
+        self.replica_extension = replica_extension
+        self.sync_interval = sync_interval
+        self._tables = {}
+
+        self.client = default_executor().wrap(authorize_client())
+        self.spreadsheet = open_spreadsheet(self.client, spreadsheet_name)
+        if self.replica_dir:
+            os.makedirs(self.replica_dir, exist_ok=True)
+
+    def table(self, name: str):
+        """
+        Open a worksheet as a table, creating it if it doesn't exist.
+
+        Args:
+            name: Worksheet name
+
+        Returns:
+            GoogleSheetsDatabase for the worksheet
+        """
+        if name not in self._tables:
+            from gsheets_db import GoogleSheetsDatabase
+            replica_path = None
+            if self.replica_dir:
+                replica_path = os.path.join(self.replica_dir, name + self.replica_extension)
+            self._tables[name] = GoogleSheetsDatabase(
+                spreadsheet_name=self.spreadsheet_name,
+                worksheet_name=name,
+                replica_path=replica_path,
+                sync_interval=self.sync_interval,
+                client=self.client,
+                spreadsheet=self.spreadsheet
+            )
+        return self._tables[name]
+
+    def __getitem__(self, name: str):
+        return self.table(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.list_tables()
+
+    def list_tables(self) -> List[str]:
+        """Get the names of all worksheets in the spreadsheet, except the change log companions."""
+        from changelog import SheetChangeLog
+        try:
+            return [ws.title for ws in self.spreadsheet.worksheets()
+                    if not ws.title.endswith(SheetChangeLog.SUFFIX)]
+        except Exception as e:
+            print(f"Error listing worksheets: {str(e)}")
+            return sorted(self._tables)
+
+    def drop_table(self, name: str) -> bool:
+        """
+        Delete a worksheet and its change log companion worksheet.
+
+        Args:
+            name: Worksheet name
+
+        Returns:
+            True if successful, False otherwise
+        """
+        import gspread
+        from changelog import SheetChangeLog
+        try:
+            self._tables.pop(name, None)
+            self.spreadsheet.del_worksheet(self.spreadsheet.worksheet(name))
+            try:
+                self.spreadsheet.del_worksheet(self.spreadsheet.worksheet(name + SheetChangeLog.SUFFIX))
+            except gspread.WorksheetNotFound:
+                pass
+            return True
+        except Exception as e:
+            print(f"Error dropping worksheet: {str(e)}")
+            return False
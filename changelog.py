@@ -0,0 +1,279 @@
+"""
+Change Log Module
+Versioned log of table mutations, so client apps can poll for just the rows that changed.
+"""
+
+import pandas as pd
+import json
+import os
+from typing import Optional, List, Dict, Tuple
+from datetime import datetime
+
+
+# Writes touching more records than this are logged as a reset (clients reload the table)
+MAX_IDS_PER_ENTRY = 10_000
+
+
+def classify(added: Optional[pd.DataFrame], removed: Optional[pd.DataFrame]) -> Tuple[List, List, List]:
+    """
+    Split a write into inserted, updated and deleted record IDs.
+
+    An ID present in both the added and removed rows is an update.
+
+    Returns:
+        Tuple of (inserted, updated, deleted) ID lists
+    """
+    added_ids = [int(i) for i in added["id"]] if added is not None else []
+    removed_ids = [int(i) for i in removed["id"]] if removed is not None else []
+    removed_set = set(removed_ids)
+    added_set = set(added_ids)
+    inserted = [i for i in added_ids if i not in removed_set]
+    updated = [i for i in added_ids if i in removed_set]
+    deleted = [i for i in removed_ids if i not in added_set]
+    return inserted, updated, deleted
+
+
+def summarize(entries: List[Dict]) -> Tuple[bool, List, List, List]:
+    """
+    Collapse a run of log entries into the net change per record.
+
+    A record inserted and then deleted within the run disappears; one inserted and
+    then updated is reported as inserted.
+
+    Returns:
+        Tuple of (reset, inserted, updated, deleted) ID lists
+    """
+    state = {}
+    for entry in entries:
+        if entry.get("reset"):
+            return True, [], [], []
+        for record_id in entry.get("inserted", []):
+            # IDs can be reused after the highest record is deleted
+            state[record_id] = "updated" if state.get(record_id) == "deleted" else "inserted"
+        for record_id in entry.get("updated", []):
+            if state.get(record_id) != "inserted":
+                state[record_id] = "updated"
+        for record_id in entry.get("deleted", []):
+            if state.get(record_id) == "inserted":
+                del state[record_id]
+            else:
+                state[record_id] = "deleted"
+
+    inserted = [i for i, s in state.items() if s == "inserted"]
+    updated = [i for i, s in state.items() if s == "updated"]
+    deleted = [i for i, s in state.items() if s == "deleted"]
+    return False, inserted, updated, deleted
+
+
+def empty_changes(version: int, reset: bool = False) -> Dict:
+    """Build a change set with nothing in it."""
+    return {"version": version, "reset": reset, "inserted": pd.DataFrame(),
+            "updated": pd.DataFrame(), "deleted": []}
+
+
+def apply_changes(df: pd.DataFrame, changes: Dict) -> pd.DataFrame:
+    """
+    Apply a change set from changes_since() to a client's cached copy of the table.
+
+    Args:
+        df: Cached table
+        changes: Result of changes_since()
+
+    Returns:
+        The updated table (callers must reload instead if changes["reset"] is True)
+    """
+    inserted, updated = changes["inserted"], changes["updated"]
+    drop = set(changes["deleted"])
+    if len(updated) > 0:
+        drop |= set(updated["id"])
+    if drop:
+        df = df[~df["id"].isin(drop)]
+    new_rows = [frame for frame in (updated, inserted) if len(frame) > 0]
+    if not new_rows:
+        return df
+    return pd.concat([df] + new_rows, ignore_index=True).sort_values("id", kind="stable").reset_index(drop=True)
+
+
+class ChangeLog:
+    """
+    Append-only JSON-lines log of mutations to a CSV table.
+
+    Every entry has a version number one higher than the last, and the data file
+    signature after the write. If the file's signature doesn't match the last entry,
+    someone changed it without logging, and a reset entry is added.
+    """
+
+    # Entries kept once the log is trimmed; older versions get a reset
+    MAX_ENTRIES = 1000
+
+    def __init__(self, path: str):
+        """
+        Initialize the change log.
+
+        Args:
+            path: Path of the log file
+        """
+        self.path = path
+        self._entries = []
+        self._log_signature = None
+
+    def _read(self) -> List[Dict]:
+        """Get the log entries, re-reading the file only if it changed."""
+        if not os.path.exists(self.path):
+            self._entries = []
+            self._log_signature = None
+            return self._entries
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if signature != self._log_signature:
+            with open(self.path) as f:
+                self._entries = [json.loads(line) for line in f if line.strip()]
+            self._log_signature = signature
+        return self._entries
+
+    @property
+    def version(self) -> int:
+        """Current version of the table."""
+        entries = self._read()
+        return entries[-1]["version"] if entries else 0
+
+    def _append(self, entry: Dict):
+        """Append an entry, trimming old entries when the log gets long."""
+        entries = self._read()
+        if len(entries) >= 2 * self.MAX_ENTRIES:
+            kept = entries[-self.MAX_ENTRIES:] + [entry]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.writelines(json.dumps(e) + "\n" for e in kept)
+            os.replace(tmp_path, self.path)
+        else:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def record(self, signature, added: Optional[pd.DataFrame] = None,
+               removed: Optional[pd.DataFrame] = None, reset: bool = False):
+        """
+        Log a write.
+
+        Args:
+            signature: Data file signature after the write
+            added: Rows inserted, or the new versions of updated rows
+            removed: Rows deleted, or the old versions of updated rows
+            reset: True if the whole table was replaced
+        """
+        entry = {
+            "version": self.version + 1,
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "sig": list(signature),
+        }
+        inserted, updated, deleted = classify(added, removed)
+        if reset or len(inserted) + len(updated) + len(deleted) > MAX_IDS_PER_ENTRY:
+            entry["reset"] = True
+        else:
+            entry.update(inserted=inserted, updated=updated, deleted=deleted)
+        self._append(entry)
+
+    def check(self, signature):
+        """
+        Log a reset if the data file was changed by a writer that doesn't log.
+
+        Args:
+            signature: Current data file signature
+        """
+        entries = self._read()
+        if not entries or entries[-1]["sig"] != list(signature):
+            self.record(signature, reset=True)
+
+    def since(self, version: int, signature) -> Tuple[int, bool, List, List, List]:
+        """
+        Work out what changed after a version.
+
+        Args:
+            version: Version the client last saw
+            signature: Current data file signature
+
+        Returns:
+            Tuple of (current version, reset, inserted, updated, deleted)
+        """
+        self.check(signature)
+        entries = self._read()
+        current = entries[-1]["version"]
+        if version == current:
+            return current, False, [], [], []
+        if version > current or version < entries[0]["version"] - 1:
+            return current, True, [], [], []
+        newer = [entry for entry in entries if entry["version"] > version]
+        reset, inserted, updated, deleted = summarize(newer)
+        return current, reset, inserted, updated, deleted
+
+
+class SheetChangeLog:
+    """
+    Change log kept in a companion worksheet of the spreadsheet.
+
+    Each write appends one row (time, inserted, updated, deleted, reset). The
+    version is the row's position, so concurrent writers never clash, and polling
+    reads only the rows after the client's version.
+    """
+
+    HEADERS = ["time", "inserted", "updated", "deleted", "reset"]
+    # Appended to the table's worksheet name to name the companion worksheet
+    SUFFIX = "__changes"
+    # Longest ID list written to a cell; Google Sheets rejects cells over 50,000 characters
+    MAX_CELL_CHARS = 40_000
+
+    def __init__(self, worksheet):
+        """
+        Initialize the change log.
+
+        Args:
+            worksheet: gspread worksheet holding the log
+        """
+        self.worksheet = worksheet
+
+    def record(self, added: Optional[pd.DataFrame] = None, removed: Optional[pd.DataFrame] = None,
+               reset: bool = False):
+        """
+        Log a write.
+
+        Args:
+            added: Rows inserted, or the new versions of updated rows
+            removed: Rows deleted, or the old versions of updated rows
+            reset: True if the whole table was replaced
+        """
+        cells = [json.dumps(ids) for ids in classify(added, removed)]
+        if reset or any(len(cell) > self.MAX_CELL_CHARS for cell in cells):
+            # Too many IDs for a cell: clients reload the table instead
+            cells, reset = ["[]", "[]", "[]"], True
+        time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.worksheet.append_row([time] + cells + ["TRUE" if reset else ""])
+
+    def since(self, version: int) -> Tuple[int, bool, List, List, List]:
+        """
+        Work out what changed after a version.
+
+        Args:
+            version: Version the client last saw
+
+        Returns:
+            Tuple of (current version, reset, inserted, updated, deleted)
+        """
+        # Version n is stored on row n + 1 (row 1 is the header)
+        rows = self.worksheet.get(f"A{version + 2}:E")
+        if not rows:
+            if version > 0 and not self.worksheet.row_values(version + 1):
+                # The client is ahead of the log, e.g. it was recreated
+                return len(self.worksheet.col_values(1)) - 1, True, [], [], []
+            return version, False, [], [], []
+
+        entries = []
+        for row in rows:
+            row = list(row) + [""] * (len(self.HEADERS) - len(row))
+            entries.append({
+                "inserted": json.loads(row[1] or "[]"),
+                "updated": json.loads(row[2] or "[]"),
+                "deleted": json.loads(row[3] or "[]"),
+                "reset": row[4] == "TRUE",
+            })
+        reset, inserted, updated, deleted = summarize(entries)
+        return version + len(rows), reset, inserted, updated, deleted
@@ -0,0 +1,329 @@
+"""
+Command-line interface for bulk operations outside Streamlit.
+
+Usage:
+    python cli.py import products.csv [--mode append|replace] [--key Code] [--required Code Name]
+    python cli.py export out.csv.gz [--where Status == Active] [--columns Code Name Price]
+    python cli.py upsert products.csv --key Code
+    python cli.py delete --where Status == Discontinued
+    python cli.py compact
+    python cli.py reindex
+
+The database is chosen by --backend/--server/--path/--spreadsheet/--worksheet, falling back to config.py.
+Heavy modules (pandas, gspread) are only imported by the command that needs them.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+
+def _open_database(args):
+    """
+    Open the database selected on the command line.
+
+    config.py is only imported for settings that weren't given as options, so
+    fully specified commands (e.g. --backend csv --path data.csv) never load it.
+    """
+    backend = args.backend
+    if backend is None:
+        import config
+        backend = config.DATABASE_TYPE
+
+    if backend == "gsheets":
+        from gsheets_db import GoogleSheetsDatabase
+        if args.spreadsheet and args.worksheet:
+            return GoogleSheetsDatabase(spreadsheet_name=args.spreadsheet, worksheet_name=args.worksheet,
+                                        replica_path=args.replica)
+        import config
+        return GoogleSheetsDatabase(
+            spreadsheet_name=args.spreadsheet or config.GSHEETS_SPREADSHEET_NAME,
+            worksheet_name=args.worksheet or config.GSHEETS_WORKSHEET_NAME,
+            replica_path=args.replica or config.GSHEETS_REPLICA_PATH,
+            sync_interval=config.GSHEETS_SYNC_INTERVAL
+        )
+
+    if args.server:
+        from db_server import RemoteDatabase
+        return RemoteDatabase(args.server)
+
+    from csv_db import CSVDatabase
+    text_columns = [col.strip() for col in args.text_columns.split(",")] if args.text_columns else None
+    if args.path:
+        if os.path.isdir(args.path):
+            # A partitioned table; its directory records the layout
+            from partitioned_db import PartitionedCSVDatabase
+            return PartitionedCSVDatabase(db_path=args.path, text_columns=text_columns)
+        return CSVDatabase(db_path=args.path, text_columns=text_columns)
+    import config
+    if config.CSV_SERVER_URL:
+        # The server owns the file; writing it directly would race with it
+        from db_server import RemoteDatabase
+        return RemoteDatabase(config.CSV_SERVER_URL)
+    if config.CSV_PARTITION_BY:
+        from partitioned_db import PartitionedCSVDatabase
+        return PartitionedCSVDatabase(
+            db_path=config.CSV_PATH, partition_by=config.CSV_PARTITION_BY,
+            rows_per_partition=config.CSV_ROWS_PER_PARTITION,
+            text_columns=text_columns if text_columns is not None else config.CSV_TEXT_COLUMNS)
+    return CSVDatabase(db_path=config.CSV_PATH,
+                       text_columns=text_columns if text_columns is not None else config.CSV_TEXT_COLUMNS)
+
+
+def _build_query(where):
+    """Turn repeated --where COLUMN OP VALUE triples into a Query."""
+    from query import Query
+
+    q = Query()
+    for column, op, value in where or []:
+        if op in ("in", "between"):
+            value = [v.strip() for v in value.split(",")]
+        q.where(column, op, value)
+    return q
+
+
+def _pipeline(args, schema=None):
+    """Build the import validation pipeline from the command-line options."""
+    from import_pipeline import ImportPipeline
+    # Keep the first of duplicate keys, matching how repeats across chunks are dropped
+    return ImportPipeline(schema=schema, required=args.required, key=args.key, keep="first")
+
+
+def _table_schema(db):
+    """Column types of the existing table, from a sample of its rows."""
+    from import_pipeline import table_schema
+    from query import Query
+    return table_schema(db.query(Query().limit(1000)))
+
+
+def _report_rejected(rejected, path):
+    """Print (and optionally save) the rows the pipeline rejected."""
+    if len(rejected) == 0:
+        return
+    print(f"Rejected {len(rejected)} row(s)", file=sys.stderr)
+    if path:
+        header = not os.path.exists(path)
+        rejected.to_csv(path, mode="a", header=header, index=False)
+    else:
+        for row in rejected[["row", "reason"]].head(10).itertuples(index=False):
+            print(f"  line {row.row}: {row.reason}", file=sys.stderr)
+
+
+def cmd_import(args):
+    """Stream a CSV file into the database in chunks."""
+    import numpy as np
+    import pandas as pd
+    import storage
+
+    db = _open_database(args)
+    schema = _table_schema(db) if args.mode == "append" else None
+    pipeline = _pipeline(args, schema)
+    if args.rejects and os.path.exists(args.rejects):
+        os.remove(args.rejects)
+
+    seen_keys = set()
+    stats = {"read": 0, "rejected": 0}
+
+    def clean_chunks():
+        for chunk in storage.read_csv_chunks(args.file, args.chunksize, dtype=str):
+            offset = stats["read"]
+            stats["read"] += len(chunk)
+            if args.no_validate:
+                yield chunk
+                continue
+            chunk = chunk.reset_index(drop=True)
+            result = pipeline.run(chunk)
+            if result["errors"]:
+                raise ValueError("; ".join(result["errors"]))
+            data, rejected = result["data"], result["rejected"]
+            if args.key:
+                # The pipeline only sees one chunk; reject keys seen in earlier chunks too
+                kept = np.setdiff1d(np.arange(len(chunk)), rejected["row"].to_numpy() - 2)
+                repeat = data[args.key].isin(seen_keys).to_numpy()
+                seen_keys.update(data.loc[~repeat, args.key].tolist())
+                if repeat.any():
+                    repeated = chunk.iloc[kept[repeat]].copy()
+                    repeated.insert(0, "row", kept[repeat] + 2)
+                    repeated["reason"] = f"{args.key}: duplicate of an earlier row"
+                    rejected = pd.concat([rejected, repeated], ignore_index=True)
+                    data = data[~repeat]
+            # Line numbers in the whole file, not the chunk
+            rejected["row"] += offset
+            stats["rejected"] += len(rejected)
+            _report_rejected(rejected, args.rejects)
+            yield data
+
+    start = time.perf_counter()
+    imported = db.import_chunks(clean_chunks(), mode=args.mode)
+    elapsed = time.perf_counter() - start
+    print(f"Imported {imported} of {stats['read']} rows ({stats['rejected']} rejected) in {elapsed:.1f}s")
+    return 0
+
+
+def cmd_export(args):
+    """Write the table (or the rows matching --where) to a CSV file or stdout."""
+    import storage
+
+    db = _open_database(args)
+    q = _build_query(args.where)
+    if args.columns:
+        q.select(*args.columns)
+    if args.limit:
+        q.limit(args.limit)
+
+    if args.output != "-" and not q.ordering and not q.row_limit and hasattr(db, "read_chunks") \
+            and storage.codec_for(args.output) is None:
+        # Stream the table chunk by chunk instead of loading it
+        usecols = q.columns_needed()
+        written = 0
+        with open(args.output, "w", newline="") as out:
+            for chunk in db.read_chunks(args.chunksize, usecols):
+                chunk = q.filter(chunk)
+                if q.selected is not None:
+                    chunk = chunk[q.selected]
+                chunk.to_csv(out, index=False, header=written == 0)
+                written += len(chunk)
+        print(f"Exported {written} rows to {args.output}", file=sys.stderr)
+        return 0
+
+    df = db.query(q)
+    if args.output == "-":
+        df.to_csv(sys.stdout, index=False)
+    else:
+        storage.write_csv(df, args.output)
+    print(f"Exported {len(df)} rows to {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_upsert(args):
+    """Update records matching the key column and insert the rest."""
+    import storage
+
+    db = _open_database(args)
+    df = storage.read_csv(args.file, dtype=str)
+    if not args.no_validate:
+        result = _pipeline(args, _table_schema(db)).run(df)
+        if result["errors"]:
+            print("; ".join(result["errors"]), file=sys.stderr)
+            return 1
+        _report_rejected(result["rejected"], args.rejects)
+        df = result["data"]
+
+    counts = db.upsert(df, args.key)
+    if counts is None:
+        return 1
+    print(f"Inserted {counts['inserted']}, updated {counts['updated']}, unchanged {counts['unchanged']}")
+    return 0
+
+
+def cmd_delete(args):
+    """Delete the records matching --where."""
+    db = _open_database(args)
+    q = _build_query(args.where)
+    if args.dry_run:
+        print(f"Would delete {len(db.query(q))} record(s)")
+        return 0
+    deleted = db.delete_where(q)
+    if deleted is None:
+        return 1
+    print(f"Deleted {deleted} record(s)")
+    return 0
+
+
+def _size(path: str) -> int:
+    """Size of a table file, or of all files in a partitioned table's directory."""
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    return os.path.getsize(path)
+
+
+def cmd_compact(args):
+    """Rewrite the data file and rebuild the sidecar indexes."""
+    db = _open_database(args)
+    if not hasattr(db, "compact"):
+        print("Compaction only applies to CSV tables", file=sys.stderr)
+        return 1
+    if not hasattr(db, "db_path"):
+        # Served by db_server, which rewrites its own file
+        return 0 if db.compact() else 1
+    before = _size(db.db_path)
+    if not db.compact():
+        return 1
+    print(f"Compacted {db.db_path}: {before / 1e6:.1f} MB -> {_size(db.db_path) / 1e6:.1f} MB")
+    return 0
+
+
+def cmd_reindex(args):
+    """Rebuild the text index (CSV) or the local replica (Google Sheets)."""
+    db = _open_database(args)
+    start = time.perf_counter()
+    if not db.reindex():
+        return 1
+    print(f"Rebuilt indexes in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Bulk operations on the shared database")
+    parser.add_argument("--backend", choices=["csv", "gsheets"], help="Default: DATABASE_TYPE in config.py")
+    parser.add_argument("--path", help="CSV database file (default: CSV_PATH in config.py)")
+    parser.add_argument("--server", help="Address of a running db_server.py (default: CSV_SERVER_URL in config.py)")
+    parser.add_argument("--text-columns", help="Comma-separated columns with a full-text index (CSV)")
+    parser.add_argument("--spreadsheet", help="Google Spreadsheet name")
+    parser.add_argument("--worksheet", help="Worksheet name")
+    parser.add_argument("--replica", help="Local replica file for Google Sheets")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_validation(sub):
+        sub.add_argument("--key", help="Column identifying a record; duplicates are rejected")
+        sub.add_argument("--required", nargs="*", default=[], help="Columns every row must have")
+        sub.add_argument("--rejects", help="Write rejected rows to this CSV file")
+        sub.add_argument("--no-validate", action="store_true", help="Import rows as they are")
+
+    where_help = "Filter, e.g. --where Status == Active (repeatable; in/between take comma-separated values)"
+
+    sub = subparsers.add_parser("import", help="Import a CSV file in chunks")
+    sub.add_argument("file", help="CSV file (.csv, .csv.gz, .csv.zst or .csv.lz4)")
+    sub.add_argument("--mode", choices=["append", "replace"], default="append")
+    sub.add_argument("--chunksize", type=int, default=50_000, help="Rows per chunk")
+    add_validation(sub)
+    sub.set_defaults(func=cmd_import)
+
+    sub = subparsers.add_parser("export", help="Export the table to CSV")
+    sub.add_argument("output", help="Output file (a .gz/.zst/.lz4 suffix compresses it), or - for stdout")
+    sub.add_argument("--where", nargs=3, action="append", metavar=("COLUMN", "OP", "VALUE"), help=where_help)
+    sub.add_argument("--columns", nargs="*", help="Columns to export")
+    sub.add_argument("--limit", type=int)
+    sub.add_argument("--chunksize", type=int, default=100_000, help="Rows per chunk when streaming")
+    sub.set_defaults(func=cmd_export)
+
+    sub = subparsers.add_parser("upsert", help="Update matching records and insert new ones")
+    sub.add_argument("file", help="CSV file")
+    add_validation(sub)
+    sub.set_defaults(func=cmd_upsert)
+
+    sub = subparsers.add_parser("delete", help="Delete the records matching a filter")
+    sub.add_argument("--where", nargs=3, action="append", required=True,
+                     metavar=("COLUMN", "OP", "VALUE"), help=where_help)
+    sub.add_argument("--dry-run", action="store_true", help="Only count the matching records")
+    sub.set_defaults(func=cmd_delete)
+
+    sub = subparsers.add_parser("compact", help="Rewrite the CSV file and rebuild its indexes")
+    sub.set_defaults(func=cmd_compact)
+
+    sub = subparsers.add_parser("reindex", help="Rebuild the text index or the Google Sheets replica")
+    sub.set_defaults(func=cmd_reindex)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "upsert" and not args.key:
+        print("upsert needs --key", file=sys.stderr)
+        return 2
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Compact Tables Module
+Shrinks loaded tables in memory (categories, downcast numbers, Arrow strings) and shares them between sessions.
+"""
+
+import pandas as pd
+import numpy as np
+import threading
+from typing import Optional, Dict, Callable
+
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+# Rows sampled when estimating the memory used by text columns
+SAMPLE_ROWS = 10_000
+
+# Per-column override values besides any pandas dtype name (e.g. "int32")
+OVERRIDES = ("category", "string", "keep")
+
+# (table key) -> (file signature, compacted frame, memory report), shared by every session
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _arrow_strings_available() -> bool:
+    """Check whether pyarrow-backed strings can be used."""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _is_text(series: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def column_bytes(series: pd.Series) -> int:
+    """
+    Estimate the memory a column uses.
+
+    Measuring every Python string is slow on big tables, so text columns are
+    measured on a sample and scaled up.
+    """
+    if len(series) > SAMPLE_ROWS and _is_text(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+        sample = series.sample(SAMPLE_ROWS, random_state=0)
+        return int(sample.memory_usage(deep=True, index=False) * len(series) / SAMPLE_ROWS)
+    return int(series.memory_usage(deep=True, index=False))
+
+
+def _compact_column(series: pd.Series, override: Optional[str], arrow_strings: bool) -> pd.Series:
+    """Convert one column to its compact form."""
+    if override == "keep":
+        return series
+    if override == "category":
+        return series.astype(pd.CategoricalDtype(ordered=True))
+    if override == "string":
+        return series.astype(pd.StringDtype("pyarrow") if arrow_strings else "string")
+    if override is not None:
+        return series.astype(override)
+
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if pd.api.types.is_float_dtype(series):
+        # Only when no value changes, e.g. prices usually need float64
+        narrow = series.astype(np.float32)
+        if np.array_equal(narrow.to_numpy(dtype=np.float64), series.to_numpy(dtype=np.float64), equal_nan=True):
+            return narrow
+        return series
+    if not _is_text(series) or series.isna().all():
+        return series
+
+    if series.nunique() <= len(series) * CATEGORY_MAX_RATIO:
+        # Ordered, so min/max and sorting behave as they do on plain strings
+        return series.astype(pd.CategoricalDtype(ordered=True))
+    if arrow_strings:
+        return series.astype(pd.StringDtype("pyarrow"))
+    return series
+
+
+def compact_frame(df: pd.DataFrame, overrides: Optional[Dict[str, str]] = None,
+                  arrow_strings: bool = True) -> pd.DataFrame:
+    """
+    Convert a table to a smaller in-memory representation.
+
+    Low-cardinality text columns become categoricals, integers and lossless floats
+    are downcast, and other text columns use pyarrow-backed strings when pyarrow is
+    installed. Values are unchanged, so writing the table out gives the same CSV.
+
+    Args:
+        df: Table to compact
+        overrides: Column -> "category", "string", "keep" or a pandas dtype name,
+                   for columns where the automatic choice is wrong
+        arrow_strings: Use pyarrow strings for high-cardinality text columns
+
+    Returns:
+        Compacted copy of the table
+    """
+    overrides = overrides or {}
+    arrow_strings = arrow_strings and _arrow_strings_available()
+    return pd.DataFrame({col: _compact_column(df[col], overrides.get(col), arrow_strings)
+                         for col in df.columns}, index=df.index)
+
+
+def expand_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a compacted table back to ordinary dtypes, so any value can be written into it.
+
+    Returns:
+        Editable copy of the table
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories
+            series = series.astype(object if _is_text(categories.to_series()) else categories.dtype)
+        elif isinstance(series.dtype, pd.StringDtype):
+            series = series.astype(object)
+        elif pd.api.types.is_bool_dtype(series):
+            series = series.copy()
+        elif pd.api.types.is_integer_dtype(series):
+            series = series.astype(np.int64)
+        elif pd.api.types.is_float_dtype(series):
+            series = series.astype(np.float64)
+        else:
+            series = series.copy()
+        columns[col] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compare the memory used by each column before and after compaction.
+
+    Returns:
+        DataFrame with one row per column plus a "TOTAL" row
+    """
+    rows = []
+    for col in before.columns:
+        rows.append({
+            "column": col,
+            "dtype_before": str(before[col].dtype),
+            "dtype_after": str(after[col].dtype),
+            "bytes_before": column_bytes(before[col]),
+            "bytes_after": column_bytes(after[col]),
+        })
+    report = pd.DataFrame(rows, columns=["column", "dtype_before", "dtype_after", "bytes_before", "bytes_after"])
+    total = {"column": "TOTAL", "dtype_before": "", "dtype_after": "",
+             "bytes_before": int(report["bytes_before"].sum()), "bytes_after": int(report["bytes_after"].sum())}
+    return pd.concat([report, pd.DataFrame([total])], ignore_index=True)
+
+
+def shared_frame(key, signature, load: Callable[[], pd.DataFrame],
+                 overrides: Optional[Dict[str, str]] = None):
+    """
+    Get the compacted table for a file version, loading it only once per process.
+
+    Every database object (one per Streamlit session, say) opened on the same file
+    gets the same frame, so the table is held in memory once however many
+    sessions are connected.
+
+    Args:
+        key: Identifies the table, e.g. its absolute path
+        signature: File signature; a new one replaces the shared frame
+        load: Reads the table when no frame is shared for this signature
+        overrides: Per-column overrides for compact_frame
+
+    Returns:
+        Tuple of (compacted frame, memory report). Treat the frame as read-only.
+    """
+    options = tuple(sorted((overrides or {}).items()))
+    with _shared_lock:
+        entry = _shared.get(key)
+        if entry is not None and entry[0] == (signature, options):
+            return entry[1], entry[2]
+
+    # Load outside the lock so other tables aren't blocked
+    df = load()
+    compacted = compact_frame(df, overrides)
+    report = memory_report(df, compacted)
+    with _shared_lock:
+        _shared[key] = ((signature, options), compacted, report)
+    return compacted, report
+
+
+def shallow_copy(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copy a shared frame cheaply.
+
+    With pandas copy-on-write (the default from pandas 3) a shallow copy can be
+    edited without touching the original; older versions need a deep copy.
+    """
+    try:
+        copy_on_write = int(pd.__version__.split(".")[0]) >= 3 or pd.get_option("mode.copy_on_write") is True
+    except (ValueError, KeyError, pd.errors.OptionError):
+        copy_on_write = False
+    return df.copy(deep=not copy_on_write)
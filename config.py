@@ -1,9 +1,13 @@
 """
 Configuration file for database selection
+
+Importing this module doesn't import Streamlit or any backend library, so scripts
+and the command line can use get_database() without the UI dependencies; messages
+are shown with Streamlit only when called from a Streamlit app.
 """
 
-import streamlit as st
 import os
+import sys
 
 # Database configuration
 # Options: "csv" or "gsheets"
@@ -12,15 +16,58 @@ DATABASE_TYPE = "csv"  # Change to "gsheets" for Google Sheets storage
 # CSV settings
 CSV_PATH = "shared_data.csv"
 
+# Text columns indexed for partial-word search on the Search page (CSV only)
+CSV_TEXT_COLUMNS = []  # e.g. ["Name", "Description"]
+
+# Hold the table in memory in compact form, shared by all sessions (see compact.py).
+# Overrides map a column to "category", "string", "keep" or a pandas dtype such as "int32".
+CSV_COMPACT_MEMORY = False
+CSV_COMPACT_OVERRIDES = {}  # e.g. {"Code": "string", "Barcode": "keep"}
+
+# Split the table into partition files by "id" range or by a key column (e.g. "Category");
+# CSV_PATH is then a directory of partition files (see partitioned_db.py)
+CSV_PARTITION_BY = None
+CSV_ROWS_PER_PARTITION = 100_000
+
+# Address of a running db_server.py, e.g. "http://127.0.0.1:8765". When set, CSV mode
+# connects to that server instead of opening CSV_PATH, so every app shares one writer.
+CSV_SERVER_URL = None
+
+# Multi-table catalog settings (see get_catalog)
+# CSV tables are stored as one file per table in this directory;
+# Google Sheets tables are the worksheets of GSHEETS_SPREADSHEET_NAME.
+CSV_CATALOG_DIR = "tables"
+GSHEETS_REPLICA_DIR = None  # e.g. "gsheets_replicas"
+
 # Google Sheets settings
 GSHEETS_SPREADSHEET_NAME = "SDATA Database"
 GSHEETS_WORKSHEET_NAME = "data"
 
+# Optional local mirror of the worksheet (.csv, .sqlite or .parquet).
+# When set, reads are served locally; the first read after GSHEETS_SYNC_INTERVAL seconds reconciles it.
+GSHEETS_REPLICA_PATH = None  # e.g. "gsheets_replica.sqlite"
+GSHEETS_SYNC_INTERVAL = 60
+
+
+def _streamlit():
+    """Get the streamlit module if the caller is a Streamlit app, else None."""
+    return sys.modules.get("streamlit")
+
+
+def _notify(level: str, message: str):
+    """Show a message in the Streamlit app (st.warning, st.error, ...), or print it outside one."""
+    st = _streamlit()
+    if st is not None:
+        getattr(st, level)(message)
+    else:
+        print(message, file=sys.stderr)
+
 
 def check_gsheets_credentials():
     """Check if Google Sheets credentials are available."""
     # Check for Streamlit secrets (Cloud deployment)
-    if hasattr(st, 'secrets') and 'gcp_service_account' in st.secrets:
+    st = _streamlit()
+    if st is not None and hasattr(st, 'secrets') and 'gcp_service_account' in st.secrets:
         return True
     # Check for local credentials file
     if os.path.exists('credentials.json'):
@@ -28,6 +75,21 @@ def check_gsheets_credentials():
     return False
 
 
+def _csv_database():
+    """Create the CSV database with the configured options."""
+    if CSV_SERVER_URL:
+        from db_server import RemoteDatabase
+        return RemoteDatabase(CSV_SERVER_URL)
+    options = dict(text_columns=CSV_TEXT_COLUMNS, compact_memory=CSV_COMPACT_MEMORY,
+                   compact_overrides=CSV_COMPACT_OVERRIDES)
+    if CSV_PARTITION_BY:
+        from partitioned_db import PartitionedCSVDatabase
+        return PartitionedCSVDatabase(db_path=CSV_PATH, partition_by=CSV_PARTITION_BY,
+                                      rows_per_partition=CSV_ROWS_PER_PARTITION, **options)
+    from csv_db import CSVDatabase
+    return CSVDatabase(db_path=CSV_PATH, **options)
+
+
 def get_database():
     """
     Get the configured database instance.
@@ -38,22 +100,51 @@ def get_database():
     if DATABASE_TYPE == "gsheets":
         # Check if credentials are available
         if not check_gsheets_credentials():
-            st.warning("⚠️ Google Sheets credentials not found. Falling back to CSV mode.")
-            st.info("To use Google Sheets, please follow the setup guide in GOOGLE_SHEETS_SETUP.md")
-            from csv_db import CSVDatabase
-            return CSVDatabase(db_path=CSV_PATH)
+            _notify("warning", "⚠️ Google Sheets credentials not found. Falling back to CSV mode.")
+            _notify("info", "To use Google Sheets, please follow the setup guide in GOOGLE_SHEETS_SETUP.md")
+            return _csv_database()
 
         try:
             from gsheets_db import GoogleSheetsDatabase
             return GoogleSheetsDatabase(
                 spreadsheet_name=GSHEETS_SPREADSHEET_NAME,
-                worksheet_name=GSHEETS_WORKSHEET_NAME
+                worksheet_name=GSHEETS_WORKSHEET_NAME,
+                replica_path=GSHEETS_REPLICA_PATH,
+                sync_interval=GSHEETS_SYNC_INTERVAL
+            )
+        except Exception as e:
+            _notify("error", f"Failed to connect to Google Sheets: {str(e)}")
+            _notify("warning", "Falling back to CSV mode.")
+            return _csv_database()
+    else:
+        return _csv_database()
+
+
+def get_catalog():
+    """
+    Get the configured multi-table catalog.
+
+    Tables are opened lazily, e.g. ``get_catalog().table("orders")``.
+
+    Returns:
+        Catalog instance (CSVCatalog or GoogleSheetsCatalog)
+    """
+    from catalog import CSVCatalog, GoogleSheetsCatalog
+
+    if DATABASE_TYPE == "gsheets":
+        if not check_gsheets_credentials():
+            _notify("warning", "⚠️ Google Sheets credentials not found. Falling back to CSV mode.")
+            return CSVCatalog(root_dir=CSV_CATALOG_DIR)
+
+        try:
+            return GoogleSheetsCatalog(
+                spreadsheet_name=GSHEETS_SPREADSHEET_NAME,
+                replica_dir=GSHEETS_REPLICA_DIR,
+                sync_interval=GSHEETS_SYNC_INTERVAL
             )
         except Exception as e:
-            st.error(f"Failed to connect to Google Sheets: {str(e)}")
-            st.warning("Falling back to CSV mode.")
-            from csv_db import CSVDatabase
-            return CSVDatabase(db_path=CSV_PATH)
+            _notify("error", f"Failed to connect to Google Sheets: {str(e)}")
+            _notify("warning", "Falling back to CSV mode.")
+            return CSVCatalog(root_dir=CSV_CATALOG_DIR)
     else:
-        from csv_db import CSVDatabase
-        return CSVDatabase(db_path=CSV_PATH)
+        return CSVCatalog(root_dir=CSV_CATALOG_DIR)
@@ -4,22 +4,66 @@ Provides basic CRUD operations for CSV files that can be shared across multiple
 """
 
 import pandas as pd
+import numpy as np
+import io
 import os
-from typing import Optional, List, Dict
+import shutil
+import threading
+from typing import Optional, List, Dict, Iterable
 from datetime import datetime
+from query import Query, coerce_value
+from text_index import TextIndex
+from changelog import ChangeLog, empty_changes
+from watcher import FileWatcher
+from snapshots import SnapshotStore
+from table_stats import TableStats
+from schema import TableSchema
+from import_pipeline import plan_upsert
+import storage
+import compact
 
 
 class CSVDatabase:
     """A simple CSV-based database with basic CRUD operations."""
 
-    def __init__(self, db_path: str = "data.csv"):
+    # Rows per chunk when a query streams the file instead of using the cache
+    CHUNK_ROWS = 100_000
+    # Suffixes of the sidecar files kept beside the data file (snapshots are a directory)
+    SIDECARS = (".changes", ".stats", ".schema", ".textidx", ".textidx.log")
+
+    def __init__(self, db_path: str = "data.csv", text_columns: Optional[List[str]] = None,
+                 compact_memory: bool = False, compact_overrides: Optional[Dict[str, str]] = None):
         """
         Initialize the CSV database.
 
         Args:
-            db_path: Path to the CSV file
+            db_path: Path to the CSV file. A .gz, .zst or .lz4 suffix (e.g. "data.csv.zst")
+                     stores the table compressed; zstd and lz4 need the zstandard / lz4 packages.
+            text_columns: Columns to keep a full-text index for (see search_text).
+                          The index is stored beside the CSV file.
+            compact_memory: Hold the table in a compact form (categoricals, downcast numbers,
+                            Arrow strings) that is shared by every database object opened
+                            on the same file; see memory_report
+            compact_overrides: Column -> "category", "string", "keep" or a pandas dtype,
+                               for columns where the automatic choice is wrong
         """
         self.db_path = db_path
+        self._cache = None
+        self._cache_signature = None
+        self._indexes = {}
+        self.compact_memory = compact_memory
+        self.compact_overrides = dict(compact_overrides or {})
+        self._memory_report = None
+        self.text_columns = list(text_columns) if text_columns else []
+        self._text_index = TextIndex(db_path + ".textidx", self.text_columns) if self.text_columns else None
+        self._changelog = ChangeLog(db_path + ".changes")
+        self._snapshots = SnapshotStore(db_path + ".snapshots")
+        self._stats = TableStats(db_path + ".stats")
+        self._schema = TableSchema(db_path + ".schema")
+        # Guards the cache, which a file watcher thread may reload
+        self._lock = threading.RLock()
+        self._watcher = None
+        self.data_version = 0
         self._ensure_db_exists()
 
     def _ensure_db_exists(self):
@@ -27,17 +71,308 @@ class CSVDatabase:
         if not os.path.exists(self.db_path):
             # Create empty dataframe with default columns
             df = pd.DataFrame(columns=["id", "timestamp"])
-            df.to_csv(self.db_path, index=False)
+            self._save(df)
+
+    def _signature(self):
+        """File identity used to tell whether the cached table is still current."""
+        stat = os.stat(self.db_path)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino, self._schema.version)
+
+    def _load(self, verify: bool = False) -> pd.DataFrame:
+        """
+        Return the cached table, re-reading the file only if it changed on disk.
+
+        Args:
+            verify: Check the file even while watching. Writes use this, so they never
+                    start from a table the watcher hasn't reloaded yet.
+        """
+        with self._lock:
+            if self._cache is not None and not verify and self._watcher is not None and self._watcher.running:
+                # The watcher invalidates the cache, so there's no need to stat the file
+                return self._cache
+            signature = self._signature()
+            if self._cache is None or signature != self._cache_signature:
+                if self.compact_memory:
+                    self._cache, self._memory_report = compact.shared_frame(
+                        os.path.abspath(self.db_path), signature, self._read_table, self.compact_overrides)
+                else:
+                    self._cache = self._read_table()
+                self._cache_signature = signature
+                self._indexes = {}
+            return self._cache
+
+    def _read_table(self) -> pd.DataFrame:
+        """Read the whole table from disk."""
+        if not self._schema.pending:
+            return storage.read_csv(self.db_path)
+        options = self._schema.read_options(storage.read_header(self.db_path))
+        return self._schema.apply(storage.read_csv(self.db_path, **options))
+
+    def _write_table(self, df: pd.DataFrame, added: Optional[pd.DataFrame] = None,
+                     removed: Optional[pd.DataFrame] = None):
+        """Write the whole table to disk (added/removed say what changed, for layouts that can use it)."""
+        storage.write_csv(df, self.db_path)
+        # The file now has the table's columns
+        self._schema.materialize()
+
+    def _append_rows(self, rows: pd.DataFrame) -> bool:
+        """
+        Append rows on disk; False if the table must be rewritten instead.
+
+        Only rows whose columns are all in the file's header are appended, so the
+        file stays plain CSV that other tools can read; new columns rewrite it.
+        """
+        if self._schema.conflicts(rows.columns):
+            return False
+        return storage.append_csv(self._schema.to_file_columns(rows), self.db_path)
+
+    def _cache_is_current(self) -> bool:
+        """Check whether the cached table matches the file without reading it."""
+        return self._cache is not None and self._signature() == self._cache_signature
+
+    def _index(self, column: str) -> Dict:
+        """Value -> row positions lookup for a column of the cached table, built on first use."""
+        with self._lock:
+            df = self._load()
+            if column not in self._indexes:
+                self._indexes[column] = df.groupby(column, sort=False, observed=True).indices
+            return self._indexes[column]
+
+    def _lookup(self, column: str, values: List) -> pd.DataFrame:
+        """Fetch the rows whose column equals any of the values, using the column index."""
+        with self._lock:
+            df = self._load()
+            index = self._index(column)
+        positions = []
+        for value in values:
+            value = coerce_value(df[column], value)
+            try:
+                if value in index:
+                    positions.append(index[value])
+            except TypeError:
+                # Unhashable value, so it can't be in the index
+                pass
+        if not positions:
+            return df.iloc[0:0]
+        return df.iloc[np.sort(np.concatenate(positions))]
+
+    def _save(self, df: Optional[pd.DataFrame], added: Optional[pd.DataFrame] = None,
+              removed: Optional[pd.DataFrame] = None, reset: bool = False, append: bool = False):
+        """
+        Write the table to disk, drop the cached copy and record what changed.
+
+        Args:
+            df: The full table to write. With append=True it may be None, in which case
+                the table is only built (current rows + added) if appending isn't possible.
+            added: Rows inserted, or the new versions of updated rows
+            removed: Rows deleted, or the old versions of updated rows
+            reset: True if the whole table was replaced
+            append: True if the only change is the added rows at the end of the table,
+                    so they can be appended instead of rewriting the file
+        """
+        with self._lock:
+            prev_signature = self._cache_signature
+            if not reset and prev_signature is not None and self._signature() != prev_signature:
+                # The change was worked out from a table (or schema) someone else has changed since
+                self._cache = None
+                raise RuntimeError(f"{self.db_path} changed on disk while writing; nothing was written, try again")
+            # Appended rows can extend the cached table instead of the whole file being re-read
+            cached = self._cache if append and not self.compact_memory and self._cache_is_current() else None
+            appended = append and self._append_rows(added)
+            if not appended:
+                if df is None:
+                    df = pd.concat([self._editable_table(), added], ignore_index=True)
+                self._write_table(df, added, removed)
+            self._cache = self._extend_cache(cached, added) if appended and cached is not None else None
+            self._indexes = {}
+            # Remembered so the next write can tell whether anyone else changed the file
+            self._cache_signature = self._signature()
+            try:
+                self._on_change(prev_signature, self._cache_signature, added, removed, reset, table=df)
+            except Exception as e:
+                # The data is written, so the write has happened: raising would make callers
+                # repeat it. The change log logs a reset when it next sees the file; the
+                # indexes are rebuilt when next used.
+                print(f"Error updating the change log and indexes: {e}")
+                self._drop_sidecar_state()
+
+    def _drop_sidecar_state(self):
+        """Make the text index and statistics rebuild, after a write they couldn't follow."""
+        for sidecar in (self._text_index, self._stats):
+            try:
+                if sidecar is not None:
+                    sidecar.reset()
+            except Exception as e:
+                print(f"Error resetting {sidecar.path}: {e}")
+
+    @staticmethod
+    def _extend_cache(cached: pd.DataFrame, added: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        The cached table plus appended rows, parsed as re-reading the file would parse them.
+
+        Returns:
+            The extended table, or None (re-read the file) if the new values don't fit
+            the cached column types, e.g. text or a blank in a numeric column, or
+            bring new columns
+        """
+        if any(col not in cached.columns for col in added.columns):
+            return None
+        text = added.reindex(columns=cached.columns).to_csv(index=False)
+        try:
+            rows = pd.read_csv(io.StringIO(text), dtype=cached.dtypes.to_dict())
+        except (ValueError, TypeError):
+            return None
+        return pd.concat([cached, rows], ignore_index=True)
+
+    def _on_change(self, prev_signature, signature, added: Optional[pd.DataFrame],
+                   removed: Optional[pd.DataFrame], reset: bool, table: Optional[pd.DataFrame] = None):
+        """Keep the sidecar structures in step with a write (table is the new full table, if at hand)."""
+        if added is None and removed is None and not reset:
+            return
+
+        if not reset and prev_signature is not None:
+            # Log a reset first if someone else changed the file since we read it
+            self._changelog.check(prev_signature)
+        self._changelog.record(signature, added, removed, reset)
+
+        if self._text_index is not None:
+            if reset:
+                self._text_index.reset()
+            elif added is not None or removed is not None:
+                self._text_index.record_change(prev_signature, signature, added, removed)
+
+        if reset:
+            if table is not None:
+                self._stats.build(table, signature)
+            else:
+                self._stats.reset()
+        else:
+            self._stats.record_change(prev_signature, signature, added, removed, table)
+
+    def watch(self, on_change=None, interval: float = 0.5):
+        """
+        Reload the table in the background whenever the CSV file or its schema sidecar changes.
+
+        While watching, reads are served from memory without touching the disk, and
+        ``data_version`` goes up after every reload. Uses inotify when the optional
+        ``inotify_simple`` package is installed, and polls file metadata otherwise.
+
+        Args:
+            on_change: Optional function called with this database after each reload
+            interval: Seconds between checks when polling
+        """
+        if self._watcher is not None and self._watcher.running:
+            return
+
+        def _reload():
+            with self._lock:
+                self._cache = None
+                self._load()
+                self.data_version += 1
+            if on_change is not None:
+                on_change(self)
+
+        # Schema changes made elsewhere change how the file reads without touching it
+        self._watcher = FileWatcher(self.db_path, _reload, interval=interval, extra_paths=[self._schema.path])
+        self._watcher.start()
+
+    def stop_watching(self):
+        """Stop the background file watcher."""
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
 
     def read_all(self) -> pd.DataFrame:
         """Read all data from the CSV file."""
         try:
-            df = pd.read_csv(self.db_path)
-            return df
+            if self.compact_memory:
+                return compact.shallow_copy(self._load())
+            return self._load().copy()
         except Exception as e:
             print(f"Error reading CSV: {e}")
             return pd.DataFrame()
 
+    def get_ids(self) -> List[int]:
+        """Get the IDs of all records."""
+        try:
+            return self._load()["id"].tolist()
+        except Exception as e:
+            print(f"Error reading CSV: {e}")
+            return []
+
+    def read_page(self, offset: int, limit: int) -> pd.DataFrame:
+        """
+        Read a window of records, e.g. one page of a table view.
+
+        Args:
+            offset: Position of the first record (0 for the first)
+            limit: Maximum number of records
+
+        Returns:
+            DataFrame with the records, indexed by position like read_all()
+        """
+        try:
+            return self._load().iloc[offset:offset + limit].copy()
+        except Exception as e:
+            print(f"Error reading CSV: {e}")
+            return pd.DataFrame()
+
+    def read_record(self, record_id: int) -> Optional[Dict]:
+        """
+        Read one record, looked up with the id index.
+
+        Args:
+            record_id: ID of the record
+
+        Returns:
+            Dictionary of the record's values, or None if it doesn't exist
+        """
+        try:
+            rows = self._lookup("id", [record_id])
+            return rows.iloc[0].to_dict() if len(rows) else None
+        except Exception as e:
+            print(f"Error reading CSV: {e}")
+            return None
+
+    def _editable_table(self) -> pd.DataFrame:
+        """Private copy of the table with ordinary dtypes, for the write methods to modify."""
+        df = self._load(verify=True)
+        return compact.expand_frame(df) if self.compact_memory else df.copy()
+
+    def memory_report(self) -> Optional[pd.DataFrame]:
+        """
+        Memory used by each column before and after compaction.
+
+        Returns:
+            DataFrame from compact.memory_report, or None unless compact_memory is on
+        """
+        if not self.compact_memory:
+            return None
+        with self._lock:
+            self._load()
+            return self._memory_report
+
+    def stats(self) -> Dict:
+        """
+        Get table statistics without scanning the table.
+
+        The statistics sidecar is updated by every write, so this only reads the
+        file's metadata (and the small sidecar the first time). It is rebuilt from
+        the table if another program changed the file.
+
+        Returns:
+            Dictionary with "rows", "built", "updated" and "columns" (DataFrame of
+            column, dtype, count, nulls, min, max, distinct, bounds_exact).
+            "distinct" is a HyperLogLog estimate (about 2% error); after deletes
+            it and min/max may be loose until reindex() ("bounds_exact" is False).
+        """
+        with self._lock:
+            signature = self._signature()
+            if self._stats.signature != list(signature) and not self._stats.load(signature):
+                df = self._load()
+                self._stats.build(df, self._cache_signature)
+            return self._stats.summary()
+
     def add_record(self, data: Dict) -> bool:
         """
         Add a new record to the database.
@@ -49,7 +384,7 @@ class CSVDatabase:
             True if successful, False otherwise
         """
         try:
-            df = self.read_all()
+            df = self._editable_table()
 
             # Auto-generate ID
             if len(df) == 0:
@@ -65,7 +400,7 @@ class CSVDatabase:
             new_df = pd.DataFrame([data])
             df = pd.concat([df, new_df], ignore_index=True)
 
-            df.to_csv(self.db_path, index=False)
+            self._save(df, added=new_df, append=True)
             return True
         except Exception as e:
             print(f"Error adding record: {e}")
@@ -83,12 +418,14 @@ class CSVDatabase:
             True if successful, False otherwise
         """
         try:
-            df = self.read_all()
+            df = self._editable_table()
 
             if record_id not in df["id"].values:
                 print(f"Record with ID {record_id} not found")
                 return False
 
+            old_row = df[df["id"] == record_id].copy()
+
             # Update the record
             for key, value in data.items():
                 if key != "id":  # Don't allow ID updates
@@ -97,7 +434,7 @@ class CSVDatabase:
             # Update timestamp
             df.loc[df["id"] == record_id, "timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-            df.to_csv(self.db_path, index=False)
+            self._save(df, added=df[df["id"] == record_id], removed=old_row)
             return True
         except Exception as e:
             print(f"Error updating record: {e}")
@@ -114,19 +451,98 @@ class CSVDatabase:
             True if successful, False otherwise
         """
         try:
-            df = self.read_all()
+            df = self._editable_table()
 
             if record_id not in df["id"].values:
                 print(f"Record with ID {record_id} not found")
                 return False
 
+            removed = df[df["id"] == record_id]
             df = df[df["id"] != record_id]
-            df.to_csv(self.db_path, index=False)
+            self._save(df, removed=removed)
             return True
         except Exception as e:
             print(f"Error deleting record: {e}")
             return False
 
+    def write_batch(self, operations: List[tuple]) -> List[bool]:
+        """
+        Apply several record writes with one file write (group commit).
+
+        Each operation is ("add_record", data), ("update_record", record_id, data)
+        or ("delete_record", record_id), with the same effect as calling that
+        method. A batch of adds only is appended to the file. If the batch can't
+        be applied as a whole, each operation is applied on its own instead, so
+        one bad write doesn't fail the others. That only happens when nothing was
+        written: once the file is written, _save doesn't raise.
+
+        Args:
+            operations: Writes to apply, in order
+
+        Returns:
+            One result per operation: True if it was applied
+        """
+        try:
+            with self._lock:
+                # Raises only before the file is written (see _save), so nothing is applied twice
+                return self._write_batch(operations)
+        except Exception as e:
+            print(f"Error applying write batch, writing one by one: {e}")
+            return [getattr(self, op)(*args) for op, *args in operations]
+
+    def _write_batch(self, operations: List[tuple]) -> List[bool]:
+        df = self._editable_table()
+        before = df.copy()
+        next_id = 1 if len(df) == 0 else int(df["id"].max()) + 1
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        new_rows = []
+        touched = []
+        results = []
+
+        for op, *args in operations:
+            if op == "add_record":
+                data = dict(args[0], id=next_id, timestamp=timestamp)
+                new_rows.append(data)
+                touched.append(next_id)
+                next_id += 1
+                results.append(True)
+                continue
+            if op not in ("update_record", "delete_record"):
+                raise ValueError(f"Unsupported batch operation: {op}")
+            if new_rows:
+                # Later operations may refer to records added earlier in the batch
+                df = pd.concat([df, pd.DataFrame(new_rows)], ignore_index=True)
+                new_rows = []
+            record_id = args[0]
+            if record_id not in df["id"].values:
+                print(f"Record with ID {record_id} not found")
+                results.append(False)
+                continue
+            if op == "update_record":
+                for key, value in args[1].items():
+                    if key != "id":
+                        df.loc[df["id"] == record_id, key] = value
+                df.loc[df["id"] == record_id, "timestamp"] = timestamp
+            else:
+                df = df[df["id"] != record_id]
+            touched.append(record_id)
+            results.append(True)
+
+        if not touched:
+            return results
+        only_adds = all(op == "add_record" for op, *_ in operations)
+        if only_adds:
+            self._save(None, added=pd.DataFrame(new_rows), append=True)
+            return results
+        if new_rows:
+            df = pd.concat([df, pd.DataFrame(new_rows)], ignore_index=True)
+
+        # Net effect on each touched record: its old version is removed, its final version added
+        added = df[df["id"].isin(touched)]
+        removed = before[before["id"].isin(touched)]
+        self._save(df, added=added if len(added) else None, removed=removed if len(removed) else None)
+        return results
+
     def search(self, column: str, value) -> pd.DataFrame:
         """
         Search for records matching a specific value in a column.
@@ -139,20 +555,281 @@ class CSVDatabase:
             DataFrame containing matching records
         """
         try:
-            df = self.read_all()
+            df = self._load()
             if column not in df.columns:
                 print(f"Column {column} not found")
                 return pd.DataFrame()
 
-            return df[df[column] == value]
+            return self._lookup(column, [value])
         except Exception as e:
             print(f"Error searching: {e}")
             return pd.DataFrame()
 
+    def get_version(self) -> int:
+        """Get the current version of the table, for use with changes_since."""
+        try:
+            self._changelog.check(self._signature())
+            return self._changelog.version
+        except Exception as e:
+            print(f"Error reading change log: {e}")
+            return 0
+
+    def changes_since(self, version: int) -> Dict:
+        """
+        Get the records that changed after a version.
+
+        Polling is cheap: when nothing changed, only the file's metadata is read.
+        Apply the result to a cached frame with changelog.apply_changes.
+
+        Args:
+            version: Version the caller last saw (from get_version or a previous call)
+
+        Returns:
+            Dictionary with "version" (the current version), "reset" (True if the
+            caller must reload the whole table), "inserted" and "updated" (DataFrames
+            of the current rows) and "deleted" (list of IDs)
+        """
+        try:
+            current, reset, inserted, updated, deleted = self._changelog.since(version, self._signature())
+            if reset:
+                return empty_changes(current, reset=True)
+
+            changes = empty_changes(current)
+            changes["deleted"] = deleted
+            if inserted or updated:
+                df = self._load()
+                index = self._index("id")
+                for key, ids in (("inserted", inserted), ("updated", updated)):
+                    positions = [index[i][0] for i in ids if i in index]
+                    changes[key] = df.iloc[sorted(positions)].copy()
+            return changes
+        except Exception as e:
+            print(f"Error reading changes: {e}")
+            return empty_changes(version, reset=True)
+
+    def search_text(self, query: str, columns: Optional[List[str]] = None, limit: int = 20) -> pd.DataFrame:
+        """
+        Full-text search over the indexed text columns.
+
+        Each word of the query may be partial ("hamm" finds "Hammer"). Records
+        matching more words, and matching them more closely, come first.
+
+        Args:
+            query: Text to search for
+            columns: Indexed columns to search (default: all text_columns)
+            limit: Maximum number of records to return
+
+        Returns:
+            DataFrame containing the best matching records, best first
+        """
+        if self._text_index is None:
+            print("No text columns configured; pass text_columns to CSVDatabase")
+            return pd.DataFrame()
+
+        missing = [col for col in (columns or []) if col not in self.text_columns]
+        if missing:
+            print(f"Columns not in text index: {missing}")
+            return pd.DataFrame()
+
+        try:
+            df = self._load()
+            if self._text_index.signature != list(self._cache_signature):
+                if not self._text_index.load(self._cache_signature):
+                    self._text_index.build(df, self._cache_signature)
+
+            ids = self._text_index.search(query, columns, limit)
+            index = self._index("id")
+            positions = [index[i][0] for i in ids if i in index]
+            return df.iloc[positions]
+        except Exception as e:
+            print(f"Error searching text: {e}")
+            return pd.DataFrame()
+
+    def query(self, q: Query) -> pd.DataFrame:
+        """
+        Run a query against the table.
+
+        When the cached table is current it is used directly, with equality and "in"
+        predicates answered from column indexes. Otherwise the file is streamed in
+        chunks, reading only the columns the query needs and filtering each chunk.
+
+        Args:
+            q: Query to run
+
+        Returns:
+            DataFrame containing the query results
+        """
+        try:
+            if self._cache_is_current():
+                return q.apply(self._candidates(q))
+            return q.apply(self._scan(q))
+        except Exception as e:
+            print(f"Error running query: {e}")
+            return pd.DataFrame()
+
+    def _candidates(self, q: Query) -> pd.DataFrame:
+        """Narrow the cached table using an index on the first equality predicate."""
+        df = self._load()
+        for column, op, value in q.predicates:
+            if column in df.columns and op in ("==", "in"):
+                return self._lookup(column, [value] if op == "==" else list(value))
+        return df
+
+    def _scan(self, q: Query) -> pd.DataFrame:
+        """Stream the file in chunks, keeping only the needed columns of matching rows."""
+        # Without sorting or aggregating, the first matching rows are the answer
+        stop_after = q.row_limit if not q.ordering and not q.is_aggregate else None
+
+        parts = []
+        matched = 0
+        for chunk in self.read_chunks(self.CHUNK_ROWS, q.columns_needed()):
+            chunk = q.filter(chunk)
+            parts.append(chunk)
+            matched += len(chunk)
+            if stop_after is not None and matched >= stop_after:
+                break
+
+        if not parts:
+            return self._schema.apply(pd.DataFrame(columns=storage.read_header(self.db_path)))
+        return pd.concat(parts)
+
+    def read_chunks(self, chunksize: int, columns: Optional[List[str]] = None):
+        """
+        Stream the table from disk in chunks of rows, without loading it.
+
+        Args:
+            chunksize: Rows per chunk
+            columns: Columns needed (default: all); others may be left out
+
+        Yields:
+            DataFrames of up to chunksize rows
+        """
+        header = storage.read_header(self.db_path)
+        options = self._schema.read_options(header)
+        usecols = self._schema.usecols(columns, options.get("names", header))
+        for chunk in storage.read_csv_chunks(self.db_path, chunksize, usecols=usecols or None, **options):
+            yield self._schema.apply(chunk)
+
     def get_columns(self) -> List[str]:
         """Get list of all columns in the database."""
-        df = self.read_all()
-        return list(df.columns)
+        try:
+            return list(self._load().columns)
+        except Exception as e:
+            print(f"Error reading CSV: {e}")
+            return []
+
+    def add_column(self, column: str, default=None) -> bool:
+        """
+        Add a column without rewriting the data file.
+
+        The column is recorded in the schema sidecar (beside the CSV file), so
+        this costs the same however big the table is. Existing records read as
+        the default (or empty) in it; records written later store their values
+        after the existing columns. The next full rewrite (e.g. compact) writes
+        the column into the file and clears the sidecar.
+
+        Args:
+            column: Name of the new column
+            default: Value for the existing records
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with self._lock:
+                df = self._load(verify=True)
+                if column in df.columns:
+                    print(f"Column {column} already exists")
+                    return False
+                if self._schema.conflicts([column]) and not self.compact():
+                    # The file still holds a dropped or renamed column of that name
+                    return False
+                max_id = int(df["id"].max()) if len(df) else 0
+                self._schema.add_column(column, default, max_id)
+                self._schema_changed()
+                return True
+        except Exception as e:
+            print(f"Error adding column: {e}")
+            return False
+
+    def drop_column(self, column: str) -> bool:
+        """
+        Remove a column without rewriting the data file.
+
+        The column is hidden until the next full rewrite drops its values.
+
+        Args:
+            column: Name of the column to remove
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with self._lock:
+                if not self._check_schema_column(column):
+                    return False
+                self._schema.drop_column(column)
+                if column in self.text_columns:
+                    self.text_columns.remove(column)
+                    self._text_index = TextIndex(self.db_path + ".textidx", self.text_columns) \
+                        if self.text_columns else None
+                self._schema_changed()
+                return True
+        except Exception as e:
+            print(f"Error dropping column: {e}")
+            return False
+
+    def rename_column(self, column: str, new_name: str) -> bool:
+        """
+        Rename a column without rewriting the data file.
+
+        Args:
+            column: Current column name
+            new_name: New column name
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with self._lock:
+                if not self._check_schema_column(column):
+                    return False
+                if new_name in self._load(verify=True).columns:
+                    print(f"Column {new_name} already exists")
+                    return False
+                if self._schema.conflicts([new_name]) and self._schema.file_column(column) != new_name \
+                        and not self.compact():
+                    return False
+                self._schema.rename_column(column, new_name)
+                if column in self.text_columns:
+                    self.text_columns[self.text_columns.index(column)] = new_name
+                    self._text_index = TextIndex(self.db_path + ".textidx", self.text_columns)
+                self._schema_changed()
+                return True
+        except Exception as e:
+            print(f"Error renaming column: {e}")
+            return False
+
+    def _check_schema_column(self, column: str) -> bool:
+        """Check that a column exists and may be dropped or renamed."""
+        if column in ("id", "timestamp"):
+            print(f"Column {column} is required")
+            return False
+        if column not in self._load(verify=True).columns:
+            print(f"Column {column} not found")
+            return False
+        return True
+
+    def _schema_changed(self):
+        """Drop what was derived from the old columns; pollers see a reset and the sidecars rebuild lazily."""
+        self._cache = None
+        self._indexes = {}
+        if self._text_index is not None:
+            self._text_index.reset()
+        signature = self._signature()
+        self._changelog.check(signature)
+        self._cache_signature = signature
+        self.data_version += 1
 
     def bulk_import(self, df_import: pd.DataFrame, mode: str = "append") -> bool:
         """
@@ -167,30 +844,287 @@ class CSVDatabase:
         """
         try:
             if mode == "replace":
+                # Keep a copy of the data being replaced
+                self._snapshot_if_not_empty("before replace import")
+
                 # Add id and timestamp columns
                 df_import = df_import.reset_index(drop=True)
                 df_import.insert(0, "id", range(1, len(df_import) + 1))
                 df_import["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                df_import.to_csv(self.db_path, index=False)
+                self._save(df_import, reset=True)
             elif mode == "append":
-                df_existing = self.read_all()
-
-                # Get the next ID
-                if len(df_existing) == 0:
-                    next_id = 1
-                else:
-                    next_id = df_existing["id"].max() + 1
+                next_id = self._next_id()
 
                 # Add id and timestamp to imported data
                 df_import = df_import.reset_index(drop=True)
                 df_import.insert(0, "id", range(next_id, next_id + len(df_import)))
                 df_import["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-                # Combine with existing data
-                df_combined = pd.concat([df_existing, df_import], ignore_index=True)
-                df_combined.to_csv(self.db_path, index=False)
+                # Appended to the file; the table is only rebuilt if there are new columns
+                self._save(None, added=df_import, append=True)
 
             return True
         except Exception as e:
             print(f"Error importing data: {e}")
             return False
+
+    def _next_id(self) -> int:
+        """Work out the next record ID."""
+        df = self._load(verify=True)
+        return 1 if len(df) == 0 else int(df["id"].max()) + 1
+
+    def import_chunks(self, chunks: Iterable[pd.DataFrame], mode: str = "append") -> int:
+        """
+        Import a stream of DataFrames, e.g. a large file read in chunks.
+
+        Each chunk is appended to the file as it arrives, so memory use stays at one
+        chunk (plus the cached table) however big the import is.
+
+        Args:
+            chunks: DataFrames to import, all with the same columns
+            mode: 'append' to add to existing data, 'replace' to overwrite
+
+        Returns:
+            Number of records imported
+
+        Raises:
+            Exception: Whatever stopped the import; chunks already written stay imported
+        """
+        with self._lock:
+            if mode == "replace":
+                self._snapshot_if_not_empty("before replace import")
+                next_id = 1
+            else:
+                next_id = self._next_id()
+
+            imported = 0
+            for chunk in chunks:
+                chunk = chunk.reset_index(drop=True)
+                chunk.insert(0, "id", range(next_id, next_id + len(chunk)))
+                chunk["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                if mode == "replace" and imported == 0:
+                    self._save(chunk, reset=True)
+                else:
+                    self._save(None, added=chunk, append=True)
+                next_id += len(chunk)
+                imported += len(chunk)
+            if mode == "replace" and imported == 0:
+                self._save(pd.DataFrame(columns=["id", "timestamp"]), reset=True)
+            return imported
+
+    def upsert(self, df_import: pd.DataFrame, key: str) -> Optional[Dict]:
+        """
+        Update records whose key matches an imported row and insert the rest.
+
+        Records are only rewritten when a value actually changes, so re-importing
+        the same export is a no-op.
+
+        Args:
+            df_import: Rows to upsert
+            key: Column identifying a record, e.g. a product code
+
+        Returns:
+            Dictionary with inserted/updated/unchanged counts, or None on error
+        """
+        try:
+            with self._lock:
+                df = self._editable_table()
+                plan = plan_upsert(df, df_import, key)
+                updated, inserted = plan["updated"], plan["inserted"]
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+                if len(updated) > 0:
+                    for col in updated.columns:
+                        if col not in df.columns:
+                            df[col] = np.nan
+                    updated["timestamp"] = now
+                    df = df.astype({col: object for col in updated.columns
+                                    if df[col].dtype != updated[col].dtype})
+                    df.iloc[plan["positions"], [df.columns.get_loc(col) for col in updated.columns]] = \
+                        updated.to_numpy(dtype=object)
+
+                if len(inserted) > 0:
+                    next_id = 1 if len(df) == 0 else int(df["id"].max()) + 1
+                    inserted.insert(0, "id", range(next_id, next_id + len(inserted)))
+                    inserted["timestamp"] = now
+
+                if len(updated) > 0:
+                    df = pd.concat([df, inserted], ignore_index=True) if len(inserted) > 0 else df
+                    self._save(df, added=pd.concat([updated, inserted], ignore_index=True),
+                               removed=plan["removed"])
+                elif len(inserted) > 0:
+                    self._save(None, added=inserted, append=True)
+
+                return {"inserted": len(inserted), "updated": len(updated), "unchanged": plan["unchanged"]}
+        except Exception as e:
+            print(f"Error upserting data: {e}")
+            return None
+
+    def delete_where(self, q: Query) -> Optional[int]:
+        """
+        Delete every record matching a query's filters.
+
+        A snapshot is taken first, so the deletion can be undone with restore().
+
+        Args:
+            q: Query whose where() predicates select the records to delete
+
+        Returns:
+            Number of records deleted, or None on error
+        """
+        if not q.predicates:
+            print("Refusing to delete without a filter; use bulk_import(mode='replace') to empty the table")
+            return None
+        try:
+            with self._lock:
+                df = self._load(verify=True)
+                mask = q.mask(df)
+                if not mask.any():
+                    return 0
+                self._snapshot_if_not_empty("before delete")
+                df = self._editable_table()
+                removed = df[mask.to_numpy()]
+                self._save(df[~mask.to_numpy()], removed=removed)
+                return len(removed)
+        except Exception as e:
+            print(f"Error deleting records: {e}")
+            return None
+
+    def compact(self) -> bool:
+        """
+        Rewrite the data file and rebuild the sidecar indexes.
+
+        Many small appends leave compressed tables as lots of tiny blocks and the
+        text index with a long change log; compacting rewrites both in full.
+        The data doesn't change, so clients polling changes_since see an empty change.
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with self._lock:
+                df = self._editable_table()
+                prev_signature = self._cache_signature
+                self._write_table(df)
+                self._cache = None
+                self._indexes = {}
+                signature = self._signature()
+
+                self._changelog.check(prev_signature)
+                self._changelog.record(signature)
+                if self._text_index is not None:
+                    self._text_index.build(self._load(), signature)
+                self._stats.build(df, signature)
+                return True
+        except Exception as e:
+            print(f"Error compacting: {e}")
+            return False
+
+    def reindex(self) -> bool:
+        """
+        Rebuild the full-text index and table statistics, and drop the in-memory column indexes.
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with self._lock:
+                self._indexes = {}
+                df = self._load()
+                if self._text_index is not None:
+                    self._text_index.reset()
+                    self._text_index.build(df, self._cache_signature)
+                self._stats.build(df, self._cache_signature)
+                return True
+        except Exception as e:
+            print(f"Error rebuilding indexes: {e}")
+            return False
+
+    def drop(self) -> bool:
+        """
+        Delete the table: its data, the sidecar files beside it and its snapshots.
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with self._lock:
+                self.stop_watching()
+                self._remove_data()
+                for suffix in self.SIDECARS:
+                    if os.path.exists(self.db_path + suffix):
+                        os.remove(self.db_path + suffix)
+                shutil.rmtree(self.db_path + ".snapshots", ignore_errors=True)
+                self._cache = None
+                self._cache_signature = None
+                self._indexes = {}
+                return True
+        except Exception as e:
+            print(f"Error dropping table: {e}")
+            return False
+
+    def _remove_data(self):
+        """Delete the data file."""
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    def _snapshot_if_not_empty(self, label: str) -> Optional[int]:
+        """Snapshot the table before a destructive write. Errors propagate so the write is abandoned."""
+        df = self._load()
+        if len(df) == 0:
+            return None
+        return self._snapshots.snapshot(df, label)
+
+    def snapshot(self, label: str = "") -> Optional[int]:
+        """
+        Save the current version of the table.
+
+        Snapshots are taken automatically before replace imports and restores.
+        Only ID ranges that changed since the last snapshot take up new space.
+
+        Args:
+            label: Why the snapshot was taken
+
+        Returns:
+            Snapshot version, or None on error
+        """
+        try:
+            return self._snapshots.snapshot(self._load(), label)
+        except Exception as e:
+            print(f"Error taking snapshot: {e}")
+            return None
+
+    def list_snapshots(self) -> pd.DataFrame:
+        """List the stored snapshots (version, time, label, rows, chunks)."""
+        return self._snapshots.list()
+
+    def restore(self, version: int) -> bool:
+        """
+        Put the table back the way it was at a snapshot.
+
+        The current table is snapshotted first, so a restore can be undone too.
+
+        Args:
+            version: Snapshot version from list_snapshots
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            df = self._snapshots.load(version)
+            self._snapshot_if_not_empty(f"before restore of snapshot {version}")
+            self._save(df, reset=True)
+            return True
+        except Exception as e:
+            print(f"Error restoring snapshot: {e}")
+            return False
+
+    def diff(self, from_version: int, to_version: int) -> Dict:
+        """
+        Compare two snapshots.
+
+        Returns:
+            Dictionary with inserted/updated rows, deleted IDs and added/removed columns
+            (see SnapshotStore.diff)
+        """
+        return self._snapshots.diff(from_version, to_version)
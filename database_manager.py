@@ -5,6 +5,8 @@ Database Manager - Main Streamlit app for managing the database
 import streamlit as st
 import pandas as pd
 from config import get_database, DATABASE_TYPE
+from query import Query
+from import_pipeline import ImportPipeline, table_schema
 
 # Page configuration
 st.set_page_config(
@@ -13,9 +15,16 @@ st.set_page_config(
     layout="wide"
 )
 
+
+@st.cache_resource
+def _open_database():
+    """Open the database once per server process instead of on every rerun."""
+    return get_database()
+
+
 # Initialize database
 try:
-    db = get_database()
+    db = _open_database()
     db_status = "connected"
 except Exception as e:
     st.error(f"Failed to connect to database: {str(e)}")
@@ -37,7 +46,7 @@ if DATABASE_TYPE == "gsheets" and hasattr(db, 'get_spreadsheet_url'):
 st.sidebar.header("Operations")
 operation = st.sidebar.radio(
     "Choose an operation:",
-    ["View All", "Upload CSV (Cin7)", "Add Record", "Update Record", "Delete Record", "Search"]
+    ["View All", "Upload CSV (Cin7)", "Add Record", "Update Record", "Delete Record", "Search", "Snapshots"]
 )
 
 # VIEW ALL RECORDS
@@ -49,6 +58,13 @@ if operation == "View All":
         st.dataframe(df, use_container_width=True)
         st.info(f"Total records: {len(df)}")
 
+        report = db.memory_report() if hasattr(db, "memory_report") else None
+        if report is not None:
+            total = report.iloc[-1]
+            with st.expander(f"💾 Memory: {total['bytes_after'] / 1e6:.1f} MB "
+                             f"(was {total['bytes_before'] / 1e6:.1f} MB before compaction)"):
+                st.dataframe(report, use_container_width=True)
+
         # Download button
         csv = df.to_csv(index=False)
         st.download_button(
@@ -70,11 +86,49 @@ elif operation == "Upload CSV (Cin7)":
 
     if uploaded_file is not None:
         try:
-            # Read the uploaded CSV
-            df_upload = pd.read_csv(uploaded_file)
+            # Read the uploaded CSV as text; the import pipeline converts the types
+            df_raw = pd.read_csv(uploaded_file, dtype=str)
 
             st.success(f"✅ File loaded successfully: {uploaded_file.name}")
-            st.info(f"Found {len(df_upload)} records with {len(df_upload.columns)} columns")
+            st.info(f"Found {len(df_raw)} records with {len(df_raw.columns)} columns")
+
+            # Validation options
+            st.subheader("Validation:")
+            upload_columns = [str(col).strip() for col in df_raw.columns]
+            col_key, col_required = st.columns(2)
+            with col_key:
+                key_column = st.selectbox("Unique key column (duplicates are rejected):",
+                                          ["(none)"] + upload_columns)
+            with col_required:
+                required_columns = st.multiselect("Required columns:", upload_columns)
+
+            # Check the upload against the types already in the table
+            existing_sample = db.query(Query().limit(1000))
+            pipeline = ImportPipeline(
+                schema=table_schema(existing_sample),
+                required=required_columns,
+                key=None if key_column == "(none)" else key_column
+            )
+            result = pipeline.run(df_raw)
+            df_upload = result["data"]
+            del df_raw
+
+            for message in result["warnings"]:
+                st.info(message)
+            for message in result["errors"]:
+                st.error(f"❌ {message}")
+
+            rejected = result["rejected"]
+            if len(rejected) > 0:
+                st.warning(f"⚠️ {len(rejected)} row(s) will be skipped")
+                with st.expander("🚫 Rejected rows"):
+                    st.dataframe(rejected, use_container_width=True)
+                    st.download_button(
+                        label="📥 Download rejected rows",
+                        data=rejected.to_csv(index=False),
+                        file_name="rejected_rows.csv",
+                        mime="text/csv"
+                    )
 
             # Preview the data
             st.subheader("Preview of uploaded data:")
@@ -82,13 +136,7 @@ elif operation == "Upload CSV (Cin7)":
 
             # Show column information
             with st.expander("📋 Column Details"):
-                col_info = pd.DataFrame({
-                    "Column Name": df_upload.columns,
-                    "Data Type": [str(df_upload[col].dtype) for col in df_upload.columns],
-                    "Non-Null Count": [df_upload[col].notna().sum() for col in df_upload.columns],
-                    "Sample Value": [str(df_upload[col].iloc[0]) if len(df_upload) > 0 else "" for col in df_upload.columns]
-                })
-                st.dataframe(col_info, use_container_width=True)
+                st.dataframe(result["profile"], use_container_width=True)
 
             # Import options
             st.subheader("Import Options:")
@@ -114,11 +162,12 @@ elif operation == "Upload CSV (Cin7)":
 
             # Confirmation and import
             if import_mode == "Replace all existing data":
-                st.warning("⚠️ **Warning**: This will delete all existing records in the database!")
+                st.warning("⚠️ **Warning**: This will delete all existing records in the database! "
+                           "A snapshot is saved first, so you can undo it from the Snapshots page.")
 
-            # Show what will happen
-            current_df = db.read_all()
-            current_count = len(current_df)
+            # Show what will happen; the count comes from the statistics sidecar, not a full read
+            stats = db.stats()
+            current_count = stats["rows"] if stats else len(db.read_all())
 
             if import_mode == "Append to existing data":
                 st.info(f"Current records: {current_count} → After import: {current_count + len(df_upload)}")
@@ -129,7 +178,7 @@ elif operation == "Upload CSV (Cin7)":
             col_a, col_b, col_c = st.columns([1, 1, 2])
 
             with col_a:
-                if st.button("📥 Import Data", type="primary"):
+                if st.button("📥 Import Data", type="primary", disabled=bool(result["errors"])):
                     mode = "append" if import_mode == "Append to existing data" else "replace"
 
                     with st.spinner("Importing data..."):
@@ -227,23 +276,27 @@ elif operation == "Add Record":
 elif operation == "Update Record":
     st.header("✏️ Update Record")
 
-    df = db.read_all()
+    # Only the id list and the selected record are read, not the whole table
+    record_ids = db.get_ids()
 
-    if len(df) > 0:
+    if len(record_ids) > 0:
         # Select record to update
-        record_id = st.selectbox("Select Record ID to update:", df["id"].tolist())
+        record_id = st.selectbox("Select Record ID to update:", record_ids)
 
         # Get current record data
-        current_record = df[df["id"] == record_id].iloc[0]
+        current_record = db.read_record(record_id)
+        if current_record is None:
+            st.error(f"❌ Record {record_id} not found")
+            st.stop()
 
         st.subheader(f"Current data for Record ID: {record_id}")
-        st.json(current_record.to_dict())
+        st.json(current_record)
 
         with st.form("update_record_form"):
             st.subheader("Enter new values:")
 
             updated_data = {}
-            data_cols = [col for col in df.columns if col not in ["id", "timestamp"]]
+            data_cols = [col for col in current_record if col not in ["id", "timestamp"]]
 
             for col in data_cols:
                 current_value = str(current_record[col]) if pd.notna(current_record[col]) else ""
@@ -264,19 +317,25 @@ elif operation == "Update Record":
 elif operation == "Delete Record":
     st.header("🗑️ Delete Record")
 
-    df = db.read_all()
+    record_ids = db.get_ids()
 
-    if len(df) > 0:
-        # Show all records
-        st.dataframe(df, use_container_width=True)
+    if len(record_ids) > 0:
+        # Show the records a page at a time
+        page_size = 100
+        pages = (len(record_ids) - 1) // page_size + 1
+        page = st.number_input(f"Page (of {pages}):", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+        st.dataframe(db.read_page((page - 1) * page_size, page_size), use_container_width=True)
 
         # Select record to delete
-        record_id = st.selectbox("Select Record ID to delete:", df["id"].tolist())
+        record_id = st.selectbox("Select Record ID to delete:", record_ids)
 
         # Show record details
-        record_to_delete = df[df["id"] == record_id].iloc[0]
+        record_to_delete = db.read_record(record_id)
+        if record_to_delete is None:
+            st.error(f"❌ Record {record_id} not found")
+            st.stop()
         st.subheader("Record to be deleted:")
-        st.json(record_to_delete.to_dict())
+        st.json(record_to_delete)
 
         # Confirmation
         col1, col2, col3 = st.columns([1, 1, 2])
@@ -296,31 +355,97 @@ elif operation == "Delete Record":
 elif operation == "Search":
     st.header("🔍 Search Records")
 
-    df = db.read_all()
+    columns = db.get_columns()
+    text_columns = getattr(db, "text_columns", [])
 
-    if len(df) > 0:
-        col1, col2 = st.columns(2)
+    if len(columns) > 0:
+        search_mode = "Exact match"
+        if text_columns:
+            search_mode = st.radio("Search mode:", ["Text search", "Exact match"], horizontal=True)
 
-        with col1:
-            search_column = st.selectbox("Select column to search:", df.columns.tolist())
+        if search_mode == "Text search":
+            search_text = st.text_input(f"Search {', '.join(text_columns)}:", placeholder="Type part of a name or description")
 
-        with col2:
-            search_value = st.text_input("Enter search value:")
-
-        if st.button("Search"):
-            if search_value:
-                results = db.search(search_column, search_value)
+            if search_text:
+                results = db.search_text(search_text, limit=50)
 
                 if len(results) > 0:
-                    st.success(f"Found {len(results)} matching record(s)")
+                    st.success(f"Top {len(results)} matching record(s)")
                     st.dataframe(results, use_container_width=True)
                 else:
                     st.warning("No matching records found")
-            else:
-                st.warning("Please enter a search value")
+        else:
+            col1, col2 = st.columns(2)
+
+            with col1:
+                search_column = st.selectbox("Select column to search:", columns)
+
+            with col2:
+                search_value = st.text_input("Enter search value:")
+
+            if st.button("Search"):
+                if search_value:
+                    results = db.search(search_column, search_value)
+
+                    if len(results) > 0:
+                        st.success(f"Found {len(results)} matching record(s)")
+                        st.dataframe(results, use_container_width=True)
+                    else:
+                        st.warning("No matching records found")
+                else:
+                    st.warning("Please enter a search value")
     else:
         st.warning("No records available to search.")
 
+# SNAPSHOTS
+elif operation == "Snapshots":
+    st.header("🕒 Snapshots")
+    st.markdown("Saved versions of the table. One is taken automatically before every replace import and restore.")
+
+    if st.button("📸 Take snapshot now"):
+        version = db.snapshot("manual")
+        if version is not None:
+            st.success(f"✅ Saved snapshot {version}")
+        else:
+            st.error("❌ Failed to take snapshot")
+
+    snapshots = db.list_snapshots()
+    if len(snapshots) > 0:
+        st.dataframe(snapshots, use_container_width=True)
+        versions = snapshots["version"].tolist()
+
+        st.subheader("Compare")
+        col1, col2 = st.columns(2)
+        with col1:
+            from_version = st.selectbox("From:", versions, index=max(len(versions) - 2, 0))
+        with col2:
+            to_version = st.selectbox("To:", versions, index=len(versions) - 1)
+        if from_version != to_version:
+            changes = db.diff(from_version, to_version)
+            st.info(f"{len(changes['inserted'])} inserted, {len(changes['updated'])} updated, "
+                    f"{len(changes['deleted'])} deleted")
+            if len(changes["inserted"]) > 0:
+                with st.expander("Inserted"):
+                    st.dataframe(changes["inserted"], use_container_width=True)
+            if len(changes["updated"]) > 0:
+                with st.expander("Updated (new values)"):
+                    st.dataframe(changes["updated"], use_container_width=True)
+            if changes["deleted"]:
+                with st.expander("Deleted IDs"):
+                    st.write(changes["deleted"])
+
+        st.subheader("Restore")
+        restore_version = st.selectbox("Snapshot to restore:", versions, index=len(versions) - 1)
+        st.warning("⚠️ The current table is replaced by this snapshot (after saving a snapshot of it).")
+        if st.button("♻️ Restore", type="primary"):
+            if db.restore(restore_version):
+                st.success(f"✅ Restored snapshot {restore_version}")
+                st.rerun()
+            else:
+                st.error("❌ Failed to restore snapshot")
+    else:
+        st.info("No snapshots yet.")
+
 # Footer
 st.sidebar.markdown("---")
 st.sidebar.info("💡 This database can be accessed by multiple Streamlit apps using the CSVDatabase class.")
@@ -0,0 +1,519 @@
+"""
+Database Server Module
+Optional local server that owns a CSVDatabase, so several apps share one in-memory table and one writer.
+
+Usage:
+    python db_server.py --path shared_data.csv [--port 8765]
+
+Apps then connect with ``RemoteDatabase("http://127.0.0.1:8765")`` (or set CSV_SERVER_URL
+in config.py), which has the same methods as CSVDatabase.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, List, Dict, Iterable
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+from query import Query
+
+
+DEFAULT_PORT = 8765
+
+# Methods served straight from the in-memory table, concurrently
+READ_METHODS = ("read_all", "get_ids", "read_page", "read_record", "search", "search_text", "query",
+                "get_columns", "get_version", "changes_since", "stats", "memory_report", "list_snapshots", "diff")
+
+# Database attributes clients can read
+READ_ATTRIBUTES = ("text_columns",)
+
+# Record writes that are committed together (see CSVDatabase.write_batch)
+GROUPED_WRITES = ("add_record", "update_record", "delete_record")
+
+# Other writes, run one at a time by the writer thread
+WRITE_METHODS = GROUPED_WRITES + ("bulk_import", "import_chunks", "upsert", "delete_where",
+                                  "compact", "reindex", "snapshot", "restore", "add_column", "drop_column",
+                                  "rename_column")
+
+
+class ServerError(Exception):
+    """Raised by RemoteDatabase when the server reports an error."""
+
+
+def encode(value):
+    """Convert a method argument or result (DataFrames, Queries, numpy values) to JSON-friendly data."""
+    if isinstance(value, pd.DataFrame):
+        # Column by column, as plain Python values with None for missing ones
+        values = []
+        for i in range(value.shape[1]):
+            column = value.iloc[:, i]
+            items = column.tolist()
+            if column.hasnans:
+                items = [None if missing else v for v, missing in zip(items, column.isna().tolist())]
+            values.append(items)
+        return {"__frame__": {
+            "columns": [str(col) for col in value.columns],
+            "dtypes": [str(dtype) for dtype in value.dtypes],
+            "values": values,
+            "index": encode(value.index.tolist()),
+            "index_name": value.index.name,
+        }}
+    if isinstance(value, Query):
+        return {"__query__": {key: encode(v) for key, v in vars(value).items()}}
+    if isinstance(value, dict):
+        return {str(key): encode(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def decode(value):
+    """Rebuild what encode() converted."""
+    if isinstance(value, dict):
+        if "__frame__" in value:
+            frame = value["__frame__"]
+            columns = {}
+            for i, (dtype, items) in enumerate(zip(frame["dtypes"], frame["values"])):
+                # Restore number and bool types; text columns are inferred as usual
+                if dtype.startswith(("int", "uint", "float", "bool")) and None not in items:
+                    columns[i] = np.array(items, dtype=dtype)
+                elif dtype.startswith("float"):
+                    columns[i] = np.array([np.nan if v is None else v for v in items], dtype="float64")
+                else:
+                    columns[i] = items if items else np.array([], dtype=object)
+            if frame.get("index"):
+                index = pd.Index(frame["index"], name=frame.get("index_name"))
+            else:
+                index = pd.RangeIndex(len(frame["values"][0]) if frame["values"] else 0, name=frame.get("index_name"))
+            df = pd.DataFrame(columns, index=index)
+            df.columns = frame["columns"]
+            return df
+        if "__query__" in value:
+            q = Query()
+            for key, v in value["__query__"].items():
+                setattr(q, key, decode(v))
+            q.predicates = [tuple(p) for p in q.predicates]
+            q.ordering = [tuple(o) for o in q.ordering]
+            q.aggregates = {name: tuple(agg) for name, agg in q.aggregates.items()}
+            return q
+        return {key: decode(v) for key, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+
+class _Write:
+    """A write waiting for the writer thread."""
+
+    def __init__(self, method: str, args: list, kwargs: dict):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for many apps connecting at once (the default backlog is 5)
+    request_queue_size = 128
+
+
+class DatabaseServer:
+    """
+    Serves a CSVDatabase over localhost HTTP.
+
+    The server is the only process writing the CSV file, so the table stays
+    parsed in memory and is only re-read after its own writes. Reads are
+    answered concurrently from that table. Writes are queued for a single
+    writer thread; record writes that queue up while a commit is in progress are
+    applied together with one file write (group commit), so many clients
+    writing at once cost a few file writes instead of one each.
+    """
+
+    def __init__(self, db, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 max_batch: int = 500, commit_delay: float = 0.0):
+        """
+        Initialize the server.
+
+        Args:
+            db: CSVDatabase to serve
+            host: Interface to listen on; keep it local, there is no authentication
+            port: Port to listen on (0 picks a free one; see url)
+            max_batch: Most record writes committed together
+            commit_delay: Seconds to wait for more writes before committing a batch
+        """
+        self.db = db
+        self.max_batch = max_batch
+        self.commit_delay = commit_delay
+        self.stats = {"reads": 0, "writes": 0, "commits": 0}
+        self._writes = queue.Queue()
+        self._held = None
+        self._writer = None
+        self._http = _HTTPServer((host, port), self._handler_class())
+
+    @property
+    def url(self) -> str:
+        host, port = self._http.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections open between calls, and send small replies without delay
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._reply(200, {"ok": True, "path": server.db.db_path, "stats": server.stats})
+                else:
+                    self._reply(404, {"error": "Not found"})
+
+            def do_POST(self):
+                if self.path != "/call":
+                    self._reply(404, {"error": "Not found"})
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    result = server.call(request["method"], decode(request.get("args", [])),
+                                         decode(request.get("kwargs", {})))
+                    self._reply(200, {"result": encode(result)})
+                except Exception as e:
+                    self._reply(500, {"error": str(e), "type": type(e).__name__})
+
+            def _reply(self, status: int, body: Dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def call(self, method: str, args: list, kwargs: dict):
+        """
+        Run a database method (or read an attribute in READ_ATTRIBUTES): reads right away,
+        writes through the writer thread.
+
+        Raises:
+            ValueError: The method isn't served
+        """
+        if method in READ_METHODS:
+            self.stats["reads"] += 1
+            return getattr(self.db, method)(*args, **kwargs)
+        if method in READ_ATTRIBUTES:
+            return getattr(self.db, method)
+        if method not in WRITE_METHODS:
+            raise ValueError(f"Unsupported method: {method}")
+
+        write = _Write(method, args, kwargs)
+        self._writes.put(write)
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _next_batch(self) -> List[_Write]:
+        """Take the next write, plus any record writes queued behind it."""
+        first = self._held if self._held is not None else self._writes.get()
+        self._held = None
+        if first is None or first.method not in GROUPED_WRITES:
+            return [first]
+
+        batch = [first]
+        deadline = time.monotonic() + self.commit_delay
+        while len(batch) < self.max_batch:
+            try:
+                write = self._writes.get(timeout=max(0.0, deadline - time.monotonic())) \
+                    if self.commit_delay else self._writes.get_nowait()
+            except queue.Empty:
+                break
+            if write is None or write.method not in GROUPED_WRITES:
+                # Runs after this batch
+                self._held = write
+                break
+            batch.append(write)
+        return batch
+
+    def _run_writer(self):
+        while True:
+            batch = self._next_batch()
+            if batch[0] is None:
+                return
+            try:
+                if batch[0].method in GROUPED_WRITES:
+                    results = self.db.write_batch([(w.method, *w.args) for w in batch])
+                else:
+                    results = [getattr(self.db, batch[0].method)(*batch[0].args, **batch[0].kwargs)]
+                for write, result in zip(batch, results):
+                    write.result = result
+                # Parse the new file now, so readers don't wait for it
+                self.db.read_all()
+            except Exception as e:
+                for write in batch:
+                    write.error = e
+            self.stats["writes"] += len(batch)
+            self.stats["commits"] += 1
+            for write in batch:
+                write.done.set()
+
+    def start(self):
+        """Serve in background threads."""
+        self.db.read_all()
+        self._writer = threading.Thread(target=self._run_writer, name="db-writer", daemon=True)
+        self._writer.start()
+        threading.Thread(target=self._http.serve_forever, name="db-server", daemon=True).start()
+
+    def serve_forever(self):
+        """Serve until interrupted."""
+        self.start()
+        try:
+            while self._writer.is_alive():
+                self._writer.join(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stop serving; queued writes are finished first."""
+        self._http.shutdown()
+        self._http.server_close()
+        if self._writer is not None and self._writer.is_alive():
+            self._writes.put(None)
+            self._writer.join()
+
+
+class RemoteDatabase:
+    """
+    Client for a DatabaseServer with the same methods as CSVDatabase.
+
+    Methods return what the server's CSVDatabase returns. Connection problems
+    raise ConnectionError; errors the database raises are re-raised as ServerError.
+    """
+
+    def __init__(self, url: str = f"http://127.0.0.1:{DEFAULT_PORT}", timeout: float = 60.0):
+        """
+        Initialize the client.
+
+        Args:
+            url: Server address, e.g. "http://127.0.0.1:8765"
+            timeout: Seconds to wait for an answer
+        """
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or DEFAULT_PORT
+        self.timeout = timeout
+        self.data_version = 0
+        self._local = threading.local()
+        self._watch_stop = None
+        self._text_columns = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        """This thread's connection to the server, kept open between calls."""
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._local.connection
+
+    def _call(self, method: str, *args, **kwargs):
+        # As bytes, so headers and body go out in one packet
+        body = json.dumps({"method": method, "args": encode(list(args)), "kwargs": encode(kwargs)}).encode("utf-8")
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request("POST", "/call", body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                reply = json.loads(response.read())
+                break
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                self._local.connection = None
+                # A kept-alive connection may have been closed (e.g. the server restarted):
+                # retry reads once on a new one. Writes aren't repeated, they may have been applied.
+                if attempt or method not in READ_METHODS + READ_ATTRIBUTES or isinstance(e, TimeoutError):
+                    raise ConnectionError(f"Database server at {self.url} unavailable: {e}") from e
+        if "error" in reply:
+            raise ServerError(f"{reply.get('type', 'Error')}: {reply['error']}")
+        return decode(reply["result"])
+
+    @property
+    def text_columns(self) -> List[str]:
+        """Columns the server's database keeps a full-text index for (fetched once)."""
+        if self._text_columns is None:
+            self._text_columns = self._call("text_columns")
+        return self._text_columns
+
+    def read_all(self) -> pd.DataFrame:
+        return self._call("read_all")
+
+    def get_ids(self) -> List[int]:
+        return self._call("get_ids")
+
+    def read_page(self, offset: int, limit: int) -> pd.DataFrame:
+        return self._call("read_page", offset, limit)
+
+    def read_record(self, record_id: int) -> Optional[Dict]:
+        return self._call("read_record", record_id)
+
+    def add_record(self, data: Dict) -> bool:
+        return self._call("add_record", data)
+
+    def update_record(self, record_id: int, data: Dict) -> bool:
+        return self._call("update_record", record_id, data)
+
+    def delete_record(self, record_id: int) -> bool:
+        return self._call("delete_record", record_id)
+
+    def search(self, column: str, value) -> pd.DataFrame:
+        return self._call("search", column, value)
+
+    def search_text(self, query: str, columns: Optional[List[str]] = None, limit: int = 20) -> pd.DataFrame:
+        return self._call("search_text", query, columns, limit)
+
+    def query(self, q: Query) -> pd.DataFrame:
+        return self._call("query", q)
+
+    def get_columns(self) -> List[str]:
+        return self._call("get_columns")
+
+    def get_version(self) -> int:
+        return self._call("get_version")
+
+    def changes_since(self, version: int) -> Dict:
+        return self._call("changes_since", version)
+
+    def stats(self) -> Dict:
+        return self._call("stats")
+
+    def memory_report(self) -> Optional[pd.DataFrame]:
+        return self._call("memory_report")
+
+    def bulk_import(self, df_import: pd.DataFrame, mode: str = "append") -> bool:
+        return self._call("bulk_import", df_import, mode)
+
+    def import_chunks(self, chunks: Iterable[pd.DataFrame], mode: str = "append") -> int:
+        """Send the chunks one request at a time, so memory use stays at one chunk here too."""
+        imported = 0
+        for chunk in chunks:
+            imported += self._call("import_chunks", [chunk], mode if imported == 0 else "append")
+        if imported == 0 and mode == "replace":
+            self._call("import_chunks", [], "replace")
+        return imported
+
+    def upsert(self, df_import: pd.DataFrame, key: str) -> Optional[Dict]:
+        return self._call("upsert", df_import, key)
+
+    def delete_where(self, q: Query) -> Optional[int]:
+        return self._call("delete_where", q)
+
+    def add_column(self, column: str, default=None) -> bool:
+        return self._call("add_column", column, default)
+
+    def drop_column(self, column: str) -> bool:
+        return self._call("drop_column", column)
+
+    def rename_column(self, column: str, new_name: str) -> bool:
+        return self._call("rename_column", column, new_name)
+
+    def compact(self) -> bool:
+        return self._call("compact")
+
+    def reindex(self) -> bool:
+        return self._call("reindex")
+
+    def snapshot(self, label: str = "") -> Optional[int]:
+        return self._call("snapshot", label)
+
+    def list_snapshots(self) -> pd.DataFrame:
+        return self._call("list_snapshots")
+
+    def restore(self, version: int) -> bool:
+        return self._call("restore", version)
+
+    def diff(self, from_version: int, to_version: int) -> Dict:
+        return self._call("diff", from_version, to_version)
+
+    def watch(self, on_change=None, interval: float = 0.5):
+        """
+        Poll the server's table version in the background; ``data_version`` goes
+        up whenever it changes, as with CSVDatabase.watch (see watcher.autorefresh).
+
+        Args:
+            on_change: Optional function called with this database after each change
+            interval: Seconds between checks
+        """
+        if self._watch_stop is not None:
+            return
+        self._watch_stop = threading.Event()
+        stop = self._watch_stop
+
+        def _poll():
+            last = None
+            while not stop.wait(interval):
+                try:
+                    version = self.get_version()
+                except (ConnectionError, ServerError):
+                    continue
+                if last is not None and version != last:
+                    self.data_version += 1
+                    if on_change is not None:
+                        on_change(self)
+                last = version
+
+        threading.Thread(target=_poll, name="remote-db-watch", daemon=True).start()
+
+    def stop_watching(self):
+        """Stop polling the server."""
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve a CSV database to several apps")
+    parser.add_argument("--path", help="CSV database file or partition directory (default: CSV_PATH in config.py)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    parser.add_argument("--commit-delay", type=float, default=0.0,
+                        help="Seconds to wait for more writes before committing a batch")
+    args = parser.parse_args(argv)
+
+    from csv_db import CSVDatabase
+    from partitioned_db import PartitionedCSVDatabase
+    import config
+    path = args.path or config.CSV_PATH
+    options = dict(text_columns=config.CSV_TEXT_COLUMNS, compact_memory=config.CSV_COMPACT_MEMORY,
+                   compact_overrides=config.CSV_COMPACT_OVERRIDES)
+    if os.path.isdir(path) or (not args.path and config.CSV_PARTITION_BY):
+        db = PartitionedCSVDatabase(db_path=path, partition_by=None if args.path else config.CSV_PARTITION_BY,
+                                    rows_per_partition=config.CSV_ROWS_PER_PARTITION, **options)
+    else:
+        db = CSVDatabase(db_path=path, **options)
+    server = DatabaseServer(db, host=args.host, port=args.port, commit_delay=args.commit_delay)
+    print(f"Serving {db.db_path} at {server.url}", flush=True)
+    server.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
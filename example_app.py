@@ -5,6 +5,9 @@ Example Client App - Demonstrates how to connect to the shared CSV database
 import streamlit as st
 import pandas as pd
 from csv_db import CSVDatabase
+from query import Query
+from changelog import apply_changes
+from watcher import autorefresh
 
 # Page configuration
 st.set_page_config(
@@ -14,7 +17,33 @@ st.set_page_config(
 )
 
 # Connect to the same database
-db = CSVDatabase("shared_data.csv")
+# Cached across reruns so the parsed table and its indexes are reused
+@st.cache_resource
+def get_db():
+    db = CSVDatabase("shared_data.csv")
+    # Reload in the background when another app writes the file
+    db.watch()
+    return db
+
+
+db = get_db()
+autorefresh(db)
+
+
+def load_data() -> pd.DataFrame:
+    """Get the table, re-reading only the records that changed since the last run."""
+    if "data" not in st.session_state:
+        st.session_state.version = db.get_version()
+        st.session_state.data = db.read_all()
+        return st.session_state.data
+
+    changes = db.changes_since(st.session_state.version)
+    if changes["reset"]:
+        st.session_state.data = db.read_all()
+    elif changes["version"] != st.session_state.version:
+        st.session_state.data = apply_changes(st.session_state.data, changes)
+    st.session_state.version = changes["version"]
+    return st.session_state.data
 
 st.title("📱 Example Client App")
 st.markdown("This app demonstrates connecting to the shared CSV database")
@@ -28,7 +57,7 @@ tab1, tab2, tab3 = st.tabs(["📊 View Data", "➕ Quick Add", "📈 Statistics"
 with tab1:
     st.header("Current Database Contents")
 
-    df = db.read_all()
+    df = load_data()
 
     if len(df) > 0:
         st.dataframe(df, use_container_width=True)
@@ -42,7 +71,6 @@ with tab1:
 with tab2:
     st.header("Quick Add Record")
 
-    df = db.read_all()
     existing_cols = db.get_columns()
     data_cols = [col for col in existing_cols if col not in ["id", "timestamp"]]
 
@@ -72,34 +100,43 @@ with tab2:
 with tab3:
     st.header("Database Statistics")
 
-    df = db.read_all()
+    # Kept up to date by every write, so nothing is scanned on rerun
+    stats = db.stats()
+    total = stats["rows"] if stats else 0
 
-    if len(df) > 0:
+    if total > 0:
+        columns = stats["columns"].set_index("column")
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            st.metric("Total Records", len(df))
+            st.metric("Total Records", total)
 
         with col2:
-            st.metric("Total Columns", len(df.columns))
+            st.metric("Total Columns", len(columns))
 
         with col3:
             # Get most recent timestamp
-            if "timestamp" in df.columns:
-                latest = df["timestamp"].max()
-                st.metric("Last Updated", latest)
+            if "timestamp" in columns.index:
+                st.metric("Last Updated", columns.loc["timestamp", "max"])
+
+        sample = db.query(Query().limit(5))
 
         st.subheader("Column Information")
         col_info = pd.DataFrame({
-            "Column": df.columns,
-            "Non-Null Count": [df[col].notna().sum() for col in df.columns],
-            "Data Type": [str(df[col].dtype) for col in df.columns]
+            "Column": columns.index,
+            "Non-Null Count": columns["count"].to_numpy(),
+            "Null Count": columns["nulls"].to_numpy(),
+            "Distinct (approx.)": columns["distinct"].to_numpy(),
+            # Min/max mix numbers and text, so show them as text
+            "Min": columns["min"].astype(str).to_numpy(),
+            "Max": columns["max"].astype(str).to_numpy(),
+            "Data Type": columns["dtype"].to_numpy()
         })
         st.dataframe(col_info, use_container_width=True)
 
         # Sample data
         st.subheader("Sample Data (First 5 Records)")
-        st.dataframe(df.head(), use_container_width=True)
+        st.dataframe(sample, use_container_width=True)
     else:
         st.warning("No data available for statistics.")
 
@@ -115,7 +152,7 @@ This is an example app showing how to connect to the shared CSV database.
 
 **To use:**
 1. Run the Database Manager app to add/edit records
-2. This app will automatically see those changes
+2. This app picks up those changes automatically within a second
 3. You can also add records directly from this app
 """)
 
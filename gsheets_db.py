@@ -4,77 +4,196 @@ Provides database operations using Google Sheets as the backend storage.
 """
 
 import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from typing import Optional, List, Dict
+import numpy as np
+from typing import Optional, List, Dict, Iterable
 from datetime import datetime
 import json
 import os
+import re
+import sqlite3
+import sys
+from replica import LocalReplica
+from snapshots import SnapshotStore
+from sheets_api import SheetsExecutor, default_executor
+from table_stats import TableStats
+from query import Query
+from import_pipeline import plan_upsert
+from changelog import SheetChangeLog, empty_changes
+
+# Ranges per batch_get request: they are sent in the request URL, which has a length limit
+MAX_RANGES_PER_REQUEST = 100
+
+
+def _column_letter(index: int) -> str:
+    """Convert a 1-based column index to its A1 letter (1 -> A, 27 -> AA)."""
+    letters = ""
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _numericise(value):
+    """Convert a cell string to int or float where possible, like get_all_records does."""
+    if not isinstance(value, str) or value == "" or "_" in value:
+        # int() and float() accept "1_000"; gspread keeps it as text
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def _cell_rows(df: pd.DataFrame) -> List[List]:
+    """Convert a frame to plain Python cell values, with missing values as empty cells."""
+    return df.astype(object).where(df.notna(), "").values.tolist()
+
+
+def _record_values(values: List, headers: List[str]) -> List:
+    """One downloaded row as typed values, padded to the header (the API drops empty trailing cells)."""
+    values = list(values)[:len(headers)]
+    return [_numericise(v) for v in values + [""] * (len(headers) - len(values))]
+
+
+def authorize_client():
+    """
+    Create an authorized gspread client.
+
+    Credentials come from Streamlit secrets (cloud deployment) or a local credentials.json file.
+
+    Returns:
+        Authorized gspread client
+    """
+    # Imported here: the Google client libraries take a while to load and
+    # aren't needed until a spreadsheet is actually opened
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    scope = [
+        "https://spreadsheets.google.com/feeds",
+        "https://www.googleapis.com/auth/drive"
+    ]
+
+    credentials = None
+
+    # Try Streamlit secrets first (for cloud deployment); only inside a Streamlit app
+    try:
+        st = sys.modules.get("streamlit")
+        if st is not None and hasattr(st, 'secrets') and 'gcp_service_account' in st.secrets:
+            credentials_dict = dict(st.secrets["gcp_service_account"])
+            credentials = ServiceAccountCredentials.from_json_keyfile_dict(
+                credentials_dict, scope
+            )
+    except:
+        pass
+
+    # Fall back to local credentials.json file
+    if credentials is None:
+        if os.path.exists('credentials.json'):
+            credentials = ServiceAccountCredentials.from_json_keyfile_name(
+                'credentials.json', scope
+            )
+        else:
+            raise FileNotFoundError("No credentials found. Please add credentials.json or configure Streamlit secrets.")
+
+    return gspread.authorize(credentials)
+
+
+def open_spreadsheet(client, spreadsheet_name: str):
+    """
+    Open a spreadsheet by name, creating it if it doesn't exist.
+
+    Args:
+        client: Authorized gspread client
+        spreadsheet_name: Name of the Google Spreadsheet
+
+    Returns:
+        gspread Spreadsheet
+    """
+    import gspread
+
+    try:
+        return client.open(spreadsheet_name)
+    except gspread.SpreadsheetNotFound:
+        spreadsheet = client.create(spreadsheet_name)
+        # Share with your email (optional)
+        # spreadsheet.share('your-email@gmail.com', perm_type='user', role='writer')
+        return spreadsheet
 
 
 class GoogleSheetsDatabase:
     """A Google Sheets-based database with basic CRUD operations."""
 
-    def __init__(self, spreadsheet_name: str = "SDATA Database", worksheet_name: str = "data"):
+    def __init__(self, spreadsheet_name: str = "SDATA Database", worksheet_name: str = "data",
+                 replica_path: Optional[str] = None, sync_interval: float = 60.0,
+                 client=None, spreadsheet=None, snapshot_dir: Optional[str] = None,
+                 executor: Optional[SheetsExecutor] = None, stats_path: Optional[str] = None,
+                 verify_interval: float = 600.0):
         """
         Initialize the Google Sheets database.
 
         Args:
             spreadsheet_name: Name of the Google Spreadsheet
             worksheet_name: Name of the worksheet/tab within the spreadsheet
+            replica_path: Optional local CSV/SQLite/Parquet file that mirrors the worksheet.
+                          When set, reads are served locally; the first read after sync_interval
+                          has elapsed reconciles the replica (there is no background timer).
+            sync_interval: Seconds between replica reconciliations
+            client: Already-authorized gspread client to reuse
+            spreadsheet: Already-open gspread Spreadsheet to reuse (e.g. shared by a catalog)
+            snapshot_dir: Local directory for snapshots taken before destructive writes
+                          (default: gsheets_snapshots/<spreadsheet>__<worksheet>)
+            executor: Runs every API call with rate limiting, retries and a circuit
+                      breaker (default: the executor shared by the whole process)
+            stats_path: Local file for the table statistics (default: beside the replica,
+                        or gsheets_stats/<spreadsheet>__<worksheet>.json)
+            verify_interval: Seconds between replica reconciliations that compare row hashes,
+                             catching edits that left the timestamp unchanged
         """
         self.spreadsheet_name = spreadsheet_name
         self.worksheet_name = worksheet_name
-        self.client = None
+        self.executor = executor or default_executor()
+        self.client = self.executor.wrap(client)
+        self.spreadsheet = self.executor.wrap(spreadsheet)
         self.sheet = None
-        self._connect()
+        self._changelog = None
+        # Set when a write couldn't be logged; the next log entry is then a reset
+        self._log_missed = False
+        # Last table downloaded, served while the API is unavailable
+        self._last_fetch = None
+        self.replica = LocalReplica(replica_path, sync_interval, verify_interval) if replica_path else None
+        safe_name = re.sub(r"[^\w.-]+", "_", f"{spreadsheet_name}__{worksheet_name}")
+        if snapshot_dir is None:
+            snapshot_dir = os.path.join("gsheets_snapshots", safe_name)
+        self._snapshots = SnapshotStore(snapshot_dir)
+        if stats_path is None:
+            stats_path = replica_path + ".stats" if replica_path else os.path.join("gsheets_stats", safe_name + ".json")
+        self._stats = TableStats(stats_path)
+        try:
+            self._connect()
+        except Exception:
+            # A populated replica keeps the app readable through an API outage
+            if self.replica is None or not self.replica.exists():
+                raise
+            print("Serving reads from the local replica until Google Sheets is reachable")
 
     def _connect(self):
         """Connect to Google Sheets using credentials from Streamlit secrets or local file."""
         try:
-            # Get credentials
-            scope = [
-                "https://spreadsheets.google.com/feeds",
-                "https://www.googleapis.com/auth/drive"
-            ]
-
-            credentials = None
-
-            # Try Streamlit secrets first (for cloud deployment)
-            try:
-                import streamlit as st
-                if hasattr(st, 'secrets') and 'gcp_service_account' in st.secrets:
-                    credentials_dict = dict(st.secrets["gcp_service_account"])
-                    credentials = ServiceAccountCredentials.from_json_keyfile_dict(
-                        credentials_dict, scope
-                    )
-            except:
-                pass
-
-            # Fall back to local credentials.json file
-            if credentials is None:
-                if os.path.exists('credentials.json'):
-                    credentials = ServiceAccountCredentials.from_json_keyfile_name(
-                        'credentials.json', scope
-                    )
-                else:
-                    raise FileNotFoundError("No credentials found. Please add credentials.json or configure Streamlit secrets.")
-
-            self.client = gspread.authorize(credentials)
-
-            # Try to open existing spreadsheet or create new one
-            try:
-                spreadsheet = self.client.open(self.spreadsheet_name)
-            except gspread.SpreadsheetNotFound:
-                spreadsheet = self.client.create(self.spreadsheet_name)
-                # Share with your email (optional)
-                # spreadsheet.share('your-email@gmail.com', perm_type='user', role='writer')
+            if self.spreadsheet is None:
+                if self.client is None:
+                    self.client = self.executor.wrap(authorize_client())
+                self.spreadsheet = open_spreadsheet(self.client, self.spreadsheet_name)
 
             # Try to get worksheet or create new one
+            import gspread
             try:
-                self.sheet = spreadsheet.worksheet(self.worksheet_name)
+                self.sheet = self.spreadsheet.worksheet(self.worksheet_name)
             except gspread.WorksheetNotFound:
-                self.sheet = spreadsheet.add_worksheet(
+                self.sheet = self.spreadsheet.add_worksheet(
                     title=self.worksheet_name,
                     rows="1000",
                     cols="26"
@@ -87,16 +206,45 @@ class GoogleSheetsDatabase:
             raise
 
     def read_all(self) -> pd.DataFrame:
-        """Read all data from Google Sheets."""
+        """Read all data, from the local replica if one is configured."""
+        if self.replica is not None:
+            return self._replica_frame().copy()
+
         try:
-            data = self.sheet.get_all_records()
-            if len(data) == 0:
-                # Return empty DataFrame with id and timestamp columns
-                return pd.DataFrame(columns=["id", "timestamp"])
-            return pd.DataFrame(data)
+            return self._fetch_all()
         except Exception as e:
             print(f"Error reading from Google Sheets: {str(e)}")
+            return self._cached_table()
+
+    def _cached_table(self) -> pd.DataFrame:
+        """Get the last table downloaded, for reads while Google Sheets is unavailable."""
+        if self._last_fetch is None:
             return pd.DataFrame()
+        print("Serving the last table read from Google Sheets")
+        return self._last_fetch.copy()
+
+    def _replica_frame(self) -> pd.DataFrame:
+        """Get the replica table, reconciling it first if the sync interval has elapsed."""
+        if self.replica.needs_sync() or not self.replica.exists():
+            try:
+                result = self.sync()
+                if result.get("mode") == "full" or result.get("changed") or result.get("deleted"):
+                    # Changes made elsewhere; rebuild the statistics from the replica when next asked
+                    self._stats.reset()
+            except Exception as e:
+                print(f"Error syncing replica: {str(e)}")
+        return self.replica.load()
+
+    def _fetch_all(self) -> pd.DataFrame:
+        """Download the whole worksheet. Errors are raised to the caller."""
+        data = self.sheet.get_all_records()
+        if len(data) == 0:
+            # Return empty DataFrame with id and timestamp columns
+            df = pd.DataFrame(columns=["id", "timestamp"])
+        else:
+            df = pd.DataFrame(data)
+        self._last_fetch = df
+        return df.copy()
 
     def add_record(self, data: Dict) -> bool:
         """
@@ -109,31 +257,25 @@ class GoogleSheetsDatabase:
             True if successful, False otherwise
         """
         try:
-            df = self.read_all()
-
-            # Auto-generate ID
-            if len(df) == 0:
-                new_id = 1
-            else:
-                new_id = int(df["id"].max()) + 1
+            new_id = self._next_id()
 
             # Add timestamp
             data["id"] = new_id
             data["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-            # Get all columns (union of existing and new)
-            all_columns = list(self.sheet.row_values(1))  # Header row
-            for col in data.keys():
-                if col not in all_columns:
-                    all_columns.append(col)
-                    # Update header row
-                    self.sheet.update([all_columns], 'A1')
+            # Get all columns (union of existing and new), adding new ones in one call
+            all_columns = self._extend_header(list(data))
 
             # Create row with all columns
             row_data = [data.get(col, "") for col in all_columns]
 
             # Append the row
             self.sheet.append_row(row_data)
+
+            row = pd.DataFrame([dict(zip(all_columns, row_data))])
+            if self.replica is not None:
+                self.replica.append(row)
+            self._on_change(added=row)
             return True
         except Exception as e:
             print(f"Error adding record: {str(e)}")
@@ -151,24 +293,31 @@ class GoogleSheetsDatabase:
             True if successful, False otherwise
         """
         try:
-            # Find the row with the matching ID
-            cell = self.sheet.find(str(record_id))
-            if not cell:
+            headers = self.sheet.row_values(1)
+            row_num = self._row_number(record_id, headers)
+            if row_num is None:
                 print(f"Record with ID {record_id} not found")
                 return False
 
-            row_num = cell.row
-            headers = self.sheet.row_values(1)
-
             # Update timestamp
             data["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-            # Update cells
-            for key, value in data.items():
-                if key in headers and key != "id":
-                    col_num = headers.index(key) + 1
-                    self.sheet.update_cell(row_num, col_num, value)
+            # New columns are added to the header in one call, and all cells written in another
+            headers = self._extend_header([key for key in data if key != "id"], headers)
+            self.sheet.batch_update([
+                {"range": f"{_column_letter(headers.index(key) + 1)}{row_num}", "values": [[value]]}
+                for key, value in data.items() if key != "id"
+            ])
 
+            new_values = {k: v for k, v in data.items() if k in headers}
+            old_row = None
+            if self.replica is not None:
+                # The old values, for the statistics, are only known locally with a replica
+                old_row = self._replica_row(record_id, list(new_values))
+                self.replica.update(record_id, new_values)
+            changed = pd.DataFrame([{**new_values, "id": record_id}])
+            self._on_change(added=changed, removed=old_row if old_row is not None else changed[["id"]],
+                            rows_known=old_row is not None)
             return True
         except Exception as e:
             print(f"Error updating record: {str(e)}")
@@ -185,13 +334,19 @@ class GoogleSheetsDatabase:
             True if successful, False otherwise
         """
         try:
-            # Find the row with the matching ID
-            cell = self.sheet.find(str(record_id))
-            if not cell:
+            row_num = self._row_number(record_id)
+            if row_num is None:
                 print(f"Record with ID {record_id} not found")
                 return False
 
-            self.sheet.delete_rows(cell.row)
+            self.sheet.delete_rows(row_num)
+
+            old_row = None
+            if self.replica is not None:
+                old_row = self._replica_row(record_id)
+                self.replica.delete(record_id)
+            removed = old_row if old_row is not None else pd.DataFrame({"id": [record_id]})
+            self._on_change(removed=removed, rows_known=old_row is not None)
             return True
         except Exception as e:
             print(f"Error deleting record: {str(e)}")
@@ -209,24 +364,297 @@ class GoogleSheetsDatabase:
             DataFrame containing matching records
         """
         try:
-            df = self.read_all()
-            if column not in df.columns:
+            if self.replica is not None:
+                df = self.read_all()
+                if column not in df.columns:
+                    print(f"Column {column} not found")
+                    return pd.DataFrame()
+                return df[df[column] == value]
+
+            # Only the searched column is downloaded, then just the matching rows
+            headers = self.sheet.row_values(1)
+            if column not in headers:
                 print(f"Column {column} not found")
                 return pd.DataFrame()
+            values = self.sheet.col_values(headers.index(column) + 1)
+            row_numbers = [row for row, cell in enumerate(values, start=1)
+                           if row > 1 and _numericise(cell) == value]
+            rows = self._fetch_rows(row_numbers, headers, total_rows=len(values) - 1)
+            # Same index as the record's position in read_all()
+            rows.index = [row - 2 for row in row_numbers]
+            return rows
+        except Exception as e:
+            # Not an empty result: search the whole table instead (or the last one read)
+            print(f"Error searching by ranges, reading the whole sheet: {str(e)}")
+            df = self.read_all()
+            return df[df[column] == value] if column in df.columns else pd.DataFrame()
 
-            return df[df[column] == value]
+    def get_ids(self) -> List[int]:
+        """Get the IDs of all records, downloading only the id column."""
+        if self.replica is not None:
+            return self.read_all()["id"].tolist()
+        try:
+            return [value for value in self._id_values() if value != ""]
         except Exception as e:
-            print(f"Error searching: {str(e)}")
+            print(f"Error reading IDs: {str(e)}")
+            return self._cached_table()["id"].tolist() if self._last_fetch is not None else []
+
+    def read_page(self, offset: int, limit: int) -> pd.DataFrame:
+        """
+        Read a window of records, e.g. one page of a table view.
+
+        The header and the rows are downloaded together in one batch_get request.
+
+        Args:
+            offset: Position of the first record (0 for the first)
+            limit: Maximum number of records
+
+        Returns:
+            DataFrame with the records, indexed by position like read_all()
+        """
+        if limit <= 0:
             return pd.DataFrame()
+        if self.replica is not None:
+            return self.read_all().iloc[offset:offset + limit]
+        try:
+            header, window = self.sheet.batch_get(["1:1", f"{offset + 2}:{offset + limit + 1}"])
+            headers = list(header[0]) if header else ["id", "timestamp"]
+            rows = [_record_values(values, headers) for values in window]
+            return pd.DataFrame(rows, columns=headers, index=range(offset, offset + len(rows)))
+        except Exception as e:
+            print(f"Error reading from Google Sheets: {str(e)}")
+            return self._cached_table().iloc[offset:offset + limit]
+
+    def read_record(self, record_id: int) -> Optional[Dict]:
+        """
+        Read one record: from the replica if one is configured, otherwise by
+        downloading the header, the id column and then just the record's row.
+
+        Args:
+            record_id: ID of the record
+
+        Returns:
+            Dictionary of the record's values, or None if it doesn't exist
+        """
+        try:
+            if self.replica is not None:
+                df = self._replica_frame()
+            else:
+                df = self._fetch_records([record_id])
+        except Exception as e:
+            print(f"Error reading record: {str(e)}")
+            df = self._cached_table() if self._last_fetch is not None else pd.DataFrame()
+        if "id" not in df.columns:
+            return None
+        rows = df[df["id"].astype(str) == str(record_id)]
+        return rows.iloc[0].to_dict() if len(rows) else None
+
+    def _id_values(self, headers: Optional[List[str]] = None) -> List:
+        """
+        The id column's values, in sheet order, read on their own.
+
+        Args:
+            headers: Header row, read first if not given, to find the id column
+        """
+        headers = self.sheet.row_values(1) if headers is None else headers
+        if "id" not in headers:
+            return []
+        return [_numericise(value) for value in self.sheet.col_values(headers.index("id") + 1)[1:]]
+
+    def _row_number(self, record_id: int, headers: Optional[List[str]] = None) -> Optional[int]:
+        """Sheet row of a record, found from the id column alone (the header is row 1)."""
+        for position, value in enumerate(self._id_values(headers)):
+            if str(value) == str(record_id):
+                return position + 2
+        return None
+
+    def query(self, q: Query) -> pd.DataFrame:
+        """
+        Run a query against the worksheet.
+
+        With a SQLite replica the query is compiled to SQL; with another replica it runs
+        on the local copy. Without a replica only the columns the query needs are
+        downloaded, in a single batch request.
+
+        Args:
+            q: Query to run
+
+        Returns:
+            DataFrame containing the query results
+        """
+        try:
+            if self.replica is not None:
+                df = self._replica_frame()
+                if self.replica.format == "sqlite" and os.path.exists(self.replica.path):
+                    try:
+                        sql, params = q.to_sql(LocalReplica.SQLITE_TABLE)
+                        return self.replica.query_sql(sql, params)
+                    except sqlite3.Error:
+                        pass
+                return q.apply(df)
+
+            ids = self._id_predicate(q)
+            if ids is not None:
+                # Just the rows of the requested records
+                return q.apply(self._fetch_records(ids))
+            columns = q.columns_needed()
+            df = self._fetch_columns(columns) if columns is not None else self._fetch_all()
+            return q.apply(df)
+        except Exception as e:
+            print(f"Error running query: {str(e)}")
+            if self._last_fetch is not None:
+                return q.apply(self._cached_table())
+            return pd.DataFrame()
+
+    @staticmethod
+    def _id_predicate(q: Query) -> Optional[List]:
+        """IDs named by an id == / in filter of a query, or None if it has no such filter."""
+        for column, op, value in q.predicates:
+            if column == "id" and op in ("==", "in"):
+                return [value] if op == "==" else list(value)
+        return None
+
+    def _fetch_columns(self, columns: List[str]) -> pd.DataFrame:
+        """
+        Download only some columns of the worksheet in one batch_get request.
+
+        Args:
+            columns: Column names to fetch
+
+        Returns:
+            DataFrame with the requested columns that exist in the sheet
+        """
+        headers = self.sheet.row_values(1)
+        present = [col for col in columns if col in headers]
+        # The id column is always fetched so blank cells at the bottom don't shorten the table
+        fetch = list(dict.fromkeys((["id"] if "id" in headers else []) + present))
+        if not fetch:
+            return pd.DataFrame(columns=present)
+
+        letters = [_column_letter(headers.index(col) + 1) for col in fetch]
+        value_ranges = self.sheet.batch_get([f"{letter}2:{letter}" for letter in letters])
+
+        num_rows = max(len(value_range) for value_range in value_ranges)
+        data = {}
+        for col, value_range in zip(fetch, value_ranges):
+            values = [_numericise(row[0]) if row else "" for row in value_range]
+            data[col] = values + [""] * (num_rows - len(values))
+        return pd.DataFrame(data)[present]
 
     def get_columns(self) -> List[str]:
         """Get list of all columns in the database."""
+        if self.replica is not None and self.replica.exists():
+            return list(self.read_all().columns)
         try:
             return self.sheet.row_values(1)
         except Exception as e:
             print(f"Error getting columns: {str(e)}")
+            if self._last_fetch is not None:
+                return list(self._last_fetch.columns)
             return ["id", "timestamp"]
 
+    def add_column(self, column: str, default=None) -> bool:
+        """
+        Add a column to the worksheet.
+
+        The header cell (and the default for every existing record, if given)
+        is written with one API call.
+
+        Args:
+            column: Name of the new column
+            default: Value for the existing records
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            headers = self.sheet.row_values(1)
+            if column in headers:
+                print(f"Column {column} already exists")
+                return False
+            values = [[column]]
+            if default is not None:
+                if self.replica is not None and self.replica.exists():
+                    num_rows = len(self.replica.load())
+                else:
+                    num_rows = len(self.sheet.col_values(headers.index("id") + 1)) - 1
+                values += [[default]] * num_rows
+            self.sheet.update(values, f"{_column_letter(len(headers) + 1)}1")
+
+            def add(df):
+                df[column] = default if default is not None else ""
+                return df
+            self._schema_changed(add)
+            return True
+        except Exception as e:
+            print(f"Error adding column: {str(e)}")
+            return False
+
+    def drop_column(self, column: str) -> bool:
+        """
+        Delete a column from the worksheet with one API call.
+
+        Args:
+            column: Name of the column to delete
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            headers = self._schema_column(column)
+            if headers is None:
+                return False
+            self.sheet.delete_columns(headers.index(column) + 1)
+            self._schema_changed(lambda df: df.drop(columns=[column], errors="ignore"))
+            return True
+        except Exception as e:
+            print(f"Error dropping column: {str(e)}")
+            return False
+
+    def rename_column(self, column: str, new_name: str) -> bool:
+        """
+        Rename a column by rewriting its header cell.
+
+        Args:
+            column: Current column name
+            new_name: New column name
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            headers = self._schema_column(column)
+            if headers is None:
+                return False
+            if new_name in headers:
+                print(f"Column {new_name} already exists")
+                return False
+            self.sheet.update_cell(1, headers.index(column) + 1, new_name)
+            self._schema_changed(lambda df: df.rename(columns={column: new_name}))
+            return True
+        except Exception as e:
+            print(f"Error renaming column: {str(e)}")
+            return False
+
+    def _schema_column(self, column: str) -> Optional[List[str]]:
+        """Get the header row if a column exists and may be dropped or renamed, else None."""
+        if column in ("id", "timestamp"):
+            print(f"Column {column} is required")
+            return None
+        headers = self.sheet.row_values(1)
+        if column not in headers:
+            print(f"Column {column} not found")
+            return None
+        return headers
+
+    def _schema_changed(self, change):
+        """Apply a column change to the local copies instead of downloading the sheet again, and log a reset."""
+        if self.replica is not None and self.replica.exists():
+            self.replica.save(change(self.replica.load()))
+        if self._last_fetch is not None:
+            self._last_fetch = change(self._last_fetch.copy())
+        self._on_change(reset=True)
+
     def bulk_import(self, df_import: pd.DataFrame, mode: str = "append") -> bool:
         """
         Import data from a DataFrame in bulk.
@@ -240,6 +668,9 @@ class GoogleSheetsDatabase:
         """
         try:
             if mode == "replace":
+                # Keep a copy of the data being replaced; clear() can't be undone
+                self._snapshot_if_not_empty("before replace import")
+
                 # Clear all data except header
                 self.sheet.clear()
 
@@ -249,16 +680,14 @@ class GoogleSheetsDatabase:
                 df_import["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
                 # Update sheet with new data
-                self.sheet.update([df_import.columns.values.tolist()] + df_import.values.tolist())
+                self.sheet.update([df_import.columns.values.tolist()] + _cell_rows(df_import))
 
-            elif mode == "append":
-                df_existing = self.read_all()
+                if self.replica is not None:
+                    self.replica.save(df_import)
+                self._on_change(reset=True, table=df_import)
 
-                # Get the next ID
-                if len(df_existing) == 0:
-                    next_id = 1
-                else:
-                    next_id = int(df_existing["id"].max()) + 1
+            elif mode == "append":
+                next_id = self._next_id()
 
                 # Add id and timestamp to imported data
                 df_import = df_import.reset_index(drop=True)
@@ -266,18 +695,528 @@ class GoogleSheetsDatabase:
                 df_import["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
                 # Append rows to sheet
-                values = df_import.values.tolist()
+                values = _cell_rows(df_import)
                 self.sheet.append_rows(values)
 
+                if self.replica is not None:
+                    self.replica.append(df_import)
+                self._on_change(added=df_import)
+
             return True
         except Exception as e:
             print(f"Error importing data: {str(e)}")
             return False
 
+    def _changes_log(self) -> SheetChangeLog:
+        """Open the companion worksheet holding the change log, creating it on first use."""
+        if self._changelog is None:
+            title = self.worksheet_name + SheetChangeLog.SUFFIX
+            import gspread
+            try:
+                worksheet = self.spreadsheet.worksheet(title)
+            except gspread.WorksheetNotFound:
+                worksheet = self.spreadsheet.add_worksheet(title=title, rows="1000", cols="5")
+                worksheet.append_row(SheetChangeLog.HEADERS)
+            self._changelog = SheetChangeLog(worksheet)
+        return self._changelog
+
+    def _on_change(self, added: Optional[pd.DataFrame] = None, removed: Optional[pd.DataFrame] = None,
+                   reset: bool = False, table: Optional[pd.DataFrame] = None, rows_known: bool = True):
+        """
+        Record a write in the change log and the statistics. The write itself has already succeeded.
+
+        Args:
+            added: Rows inserted, or the new values of updated rows (with "id")
+            removed: Rows deleted, or the old values of updated rows (with "id")
+            reset: True if the whole table was replaced
+            table: The new full table, if the writer has it
+            rows_known: False if added/removed only hold IDs, so the statistics
+                        can't be updated and are rebuilt on next use instead
+        """
+        try:
+            self._changes_log().record(added, removed, reset or self._log_missed)
+            self._log_missed = False
+        except Exception as e:
+            print(f"Error writing change log: {str(e)}")
+            try:
+                # Pollers must not miss the write: a reset entry is small enough to fit
+                self._changes_log().record(reset=True)
+                self._log_missed = False
+            except Exception as e:
+                print(f"Error writing change log, the next entry will be a reset: {str(e)}")
+                self._log_missed = True
+        try:
+            if reset or not rows_known:
+                if table is not None:
+                    self._stats.build(table, None)
+                else:
+                    self._stats.reset()
+            else:
+                self._stats.record_change(None, None, added, removed, table)
+        except Exception as e:
+            print(f"Error updating statistics: {str(e)}")
+
+    def _replica_row(self, record_id: int, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """Get a record's current values from the replica (None if it isn't there)."""
+        df = self.replica.load()
+        row = df[pd.to_numeric(df["id"], errors="coerce") == int(record_id)]
+        if len(row) != 1:
+            return None
+        return row if columns is None else row[["id"] + [col for col in columns if col in row.columns]]
+
+    def stats(self) -> Optional[Dict]:
+        """
+        Get table statistics without reading the worksheet.
+
+        The statistics file is updated by this object's writes. With a replica,
+        updates and deletes are folded in from the old values held locally;
+        without one, and after a replica sync brings in other writers' changes,
+        the statistics are rebuilt from one full read on next use.
+
+        Returns:
+            Dictionary like CSVDatabase.stats(), or None on error
+        """
+        try:
+            if self._stats.data is None and not self._stats.load(None):
+                df = self._replica_frame() if self.replica is not None else self._fetch_all()
+                self._stats.build(df, None)
+            return self._stats.summary()
+        except Exception as e:
+            print(f"Error reading statistics: {str(e)}")
+            return None
+
+    def get_version(self) -> int:
+        """Get the current version of the table, for use with changes_since."""
+        try:
+            return len(self._changes_log().worksheet.col_values(1)) - 1
+        except Exception as e:
+            print(f"Error reading change log: {str(e)}")
+            return 0
+
+    def changes_since(self, version: int) -> Dict:
+        """
+        Get the records that changed after a version.
+
+        Only the change log rows after the version are read; when records changed,
+        just those rows are fetched (or taken from the replica).
+
+        Args:
+            version: Version the caller last saw (from get_version or a previous call)
+
+        Returns:
+            Dictionary with "version" (the current version), "reset" (True if the
+            caller must reload the whole table), "inserted" and "updated" (DataFrames
+            of the current rows) and "deleted" (list of IDs)
+        """
+        try:
+            current, reset, inserted, updated, deleted = self._changes_log().since(version)
+            if reset or self._log_missed:
+                return empty_changes(current, reset=True)
+
+            changes = empty_changes(current)
+            changes["deleted"] = deleted
+            if inserted or updated:
+                rows = self._fetch_records(inserted + updated)
+                ids = rows["id"].astype(str)
+                changes["inserted"] = rows[ids.isin([str(i) for i in inserted])].reset_index(drop=True)
+                changes["updated"] = rows[ids.isin([str(i) for i in updated])].reset_index(drop=True)
+            return changes
+        except Exception as e:
+            print(f"Error reading changes: {str(e)}")
+            return empty_changes(version, reset=True)
+
+    def _fetch_records(self, record_ids: List[int]) -> pd.DataFrame:
+        """Get specific records, from the replica or by downloading just their rows."""
+        wanted = {str(i) for i in record_ids}
+        if self.replica is not None:
+            # The change log says these rows changed, so the replica needs a sync first
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Error syncing replica: {str(e)}")
+            df = self.replica.load()
+            return df[df["id"].astype(str).isin(wanted)]
+
+        # The header says which column holds the ids; then only that column is read
+        headers = self.sheet.row_values(1)
+        if "id" not in headers:
+            return pd.DataFrame(columns=headers or ["id", "timestamp"])
+        letter = _column_letter(headers.index("id") + 1)
+        ids = self.sheet.batch_get([f"{letter}2:{letter}"])[0]
+        row_numbers = [row for row, values in enumerate(ids, start=2)
+                       if values and str(_numericise(values[0])) in wanted]
+        return self._fetch_rows(row_numbers, headers, total_rows=len(ids))
+
+    def _fetch_rows(self, row_numbers: List[int], headers: List[str],
+                    total_rows: Optional[int] = None) -> pd.DataFrame:
+        """
+        Download specific rows.
+
+        Runs of consecutive rows are read as one range, and the ranges are sent
+        MAX_RANGES_PER_REQUEST per batch_get request. When the rows are more than
+        half of the sheet, the whole sheet is read in one request instead.
+
+        Args:
+            row_numbers: Sheet row numbers (the header is row 1)
+            headers: Header row
+            total_rows: Number of data rows in the sheet, if known
+
+        Returns:
+            DataFrame with one record per requested row, in the order requested
+        """
+        if not row_numbers:
+            return pd.DataFrame(columns=headers)
+
+        if total_rows is not None and len(row_numbers) > total_rows // 2:
+            values = self.sheet.get_all_values()
+            return pd.DataFrame([_record_values(values[r - 1] if r <= len(values) else [], headers)
+                                 for r in row_numbers], columns=headers)
+
+        windows = []
+        for row in sorted(set(row_numbers)):
+            if windows and row == windows[-1][1] + 1:
+                windows[-1][1] = row
+            else:
+                windows.append([row, row])
+
+        last_col = _column_letter(len(headers))
+        values = {}
+        for i in range(0, len(windows), MAX_RANGES_PER_REQUEST):
+            batch = windows[i:i + MAX_RANGES_PER_REQUEST]
+            value_ranges = self.sheet.batch_get([f"A{start}:{last_col}{end}" for start, end in batch])
+            for (start, end), value_range in zip(batch, value_ranges):
+                # The API leaves out empty rows at the end of a range
+                for row in range(start, end + 1):
+                    values[row] = value_range[row - start] if row - start < len(value_range) else []
+        return pd.DataFrame([_record_values(values[r], headers) for r in row_numbers], columns=headers)
+
+    def _next_id(self) -> int:
+        """Work out the next record ID from the live id column (a replica may be stale)."""
+        ids = [v for v in self._id_values() if isinstance(v, int)]
+        return max(ids) + 1 if ids else 1
+
+    def sync(self) -> Dict:
+        """
+        Reconcile the local replica with the worksheet.
+
+        Only the id and timestamp columns are downloaded to find changed rows, and then
+        just those rows are fetched. Timestamps miss edits that don't change them (typed
+        into the sheet by hand, or two within one second), so once every verify_interval,
+        and always without a timestamp column, rows are compared by hash instead.
+
+        Returns:
+            Dictionary summarising what was synced
+        """
+        if self.replica is None:
+            raise ValueError("No replica configured")
+
+        headers = self.sheet.row_values(1)
+        local = self.replica.load() if self.replica.exists() else None
+
+        if local is None or list(local.columns) != headers or "id" not in headers:
+            df = self._fetch_all()
+            self.replica.save(df)
+            self.replica.mark_synced(verified=True)
+            return {"mode": "full", "rows": len(df)}
+
+        if "timestamp" not in headers or self.replica.needs_verify():
+            return self._sync_by_hash(local)
+
+        id_range = _column_letter(headers.index("id") + 1)
+        ts_range = _column_letter(headers.index("timestamp") + 1)
+        id_values, ts_values = self.sheet.batch_get([f"{id_range}2:{id_range}", f"{ts_range}2:{ts_range}"])
+        remote_ids = [str(_numericise(row[0])) if row else "" for row in id_values]
+        remote_ts = [row[0] if row else "" for row in ts_values]
+        remote_ts += [""] * (len(remote_ids) - len(remote_ts))
+
+        order = {}
+        remote = {}
+        for row_num, (rid, ts) in enumerate(zip(remote_ids, remote_ts), start=2):
+            if rid != "":
+                order[rid] = row_num
+                remote[rid] = ts
+
+        local_ts = dict(zip(local["id"].astype(str), local["timestamp"].fillna("").astype(str)))
+        changed = [rid for rid, ts in remote.items() if local_ts.get(rid) != ts]
+        deleted = [rid for rid in local_ts if rid not in remote]
+
+        if not changed and not deleted:
+            self.replica.mark_synced()
+            return {"mode": "incremental", "changed": 0, "deleted": 0}
+
+        # Fetching most of the sheet row by row is slower than one bulk read
+        if len(changed) > len(remote) // 2:
+            df = self._fetch_all()
+            self.replica.save(df)
+            self.replica.mark_synced(verified=True)
+            return {"mode": "full", "rows": len(df)}
+
+        changed_rows = self._fetch_rows([order[rid] for rid in changed], headers)
+        self.replica.apply_changes(changed_rows, deleted, order)
+        self.replica.mark_synced()
+        return {"mode": "incremental", "changed": len(changed), "deleted": len(deleted)}
+
+    def _sync_by_hash(self, local: pd.DataFrame) -> Dict:
+        """
+        Reconcile the replica by comparing row hashes, when there is no timestamp
+        column or the verify interval has elapsed.
+
+        Any cell may have changed, so the whole sheet is downloaded to compare;
+        only the changed and deleted rows are then written to the replica. Add a
+        timestamp column to download less between verifications.
+        """
+        remote = self._fetch_all()
+        local_hashes = LocalReplica.row_hashes(local)
+        remote_hashes = LocalReplica.row_hashes(remote)
+
+        changed = [rid for rid, h in remote_hashes.items() if local_hashes.get(rid) != h]
+        deleted = [rid for rid in local_hashes if rid not in remote_hashes]
+        if changed or deleted:
+            ids = remote["id"].astype(str)
+            order = {rid: row_num for row_num, rid in enumerate(ids, start=2)}
+            self.replica.apply_changes(remote[ids.isin(changed)], deleted, order)
+        self.replica.mark_synced(verified=True)
+        return {"mode": "hash", "changed": len(changed), "deleted": len(deleted)}
+
     def get_spreadsheet_url(self) -> str:
         """Get the URL of the Google Spreadsheet."""
         try:
-            spreadsheet = self.client.open(self.spreadsheet_name)
-            return spreadsheet.url
+            if self.spreadsheet is None:
+                self.spreadsheet = self.client.open(self.spreadsheet_name)
+            return self.spreadsheet.url
         except:
             return ""
+
+    def _extend_header(self, columns: List[str], headers: Optional[List[str]] = None) -> List[str]:
+        """Add any missing columns to the header row in one call and return the full header (read unless given)."""
+        headers = list(self.sheet.row_values(1) if headers is None else headers)
+        missing = [col for col in columns if col not in headers]
+        if missing:
+            headers += missing
+            self.sheet.update([headers], "A1")
+        return headers
+
+    def import_chunks(self, chunks: Iterable[pd.DataFrame], mode: str = "append") -> int:
+        """
+        Import a stream of DataFrames, e.g. a large file read in chunks.
+
+        Each chunk is appended with one API call as it arrives, in the worksheet's
+        column order.
+
+        Args:
+            chunks: DataFrames to import, all with the same columns
+            mode: 'append' to add to existing data, 'replace' to overwrite
+
+        Returns:
+            Number of records imported
+
+        Raises:
+            Exception: Whatever stopped the import; chunks already written stay imported
+        """
+        if mode == "replace":
+            self._snapshot_if_not_empty("before replace import")
+            self.sheet.clear()
+            empty = pd.DataFrame(columns=["id", "timestamp"])
+            if self.replica is not None:
+                self.replica.save(empty)
+            self._on_change(reset=True, table=empty)
+            next_id = 1
+        else:
+            next_id = self._next_id()
+
+        imported = 0
+        headers = None
+        for chunk in chunks:
+            chunk = chunk.reset_index(drop=True)
+            chunk.insert(0, "id", range(next_id, next_id + len(chunk)))
+            chunk["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if headers is None:
+                headers = self._extend_header(list(chunk.columns))
+            chunk = chunk.reindex(columns=headers)
+            self.sheet.append_rows(_cell_rows(chunk))
+
+            if self.replica is not None:
+                self.replica.append(chunk)
+            self._on_change(added=chunk)
+            next_id += len(chunk)
+            imported += len(chunk)
+        return imported
+
+    def upsert(self, df_import: pd.DataFrame, key: str) -> Optional[Dict]:
+        """
+        Update records whose key matches an imported row and insert the rest.
+
+        Only records with a changed value are written: all updated rows go in one
+        batch_update call and all new rows in one append call.
+
+        Args:
+            df_import: Rows to upsert
+            key: Column identifying a record, e.g. a product code
+
+        Returns:
+            Dictionary with inserted/updated/unchanged counts, or None on error
+        """
+        try:
+            df = self._fetch_all()
+            plan = plan_upsert(df, df_import, key)
+            updated, inserted = plan["updated"], plan["inserted"]
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            headers = self._extend_header(list(updated.columns) + list(inserted.columns))
+
+            if len(updated) > 0:
+                updated["timestamp"] = now
+                updated = updated.reindex(columns=headers)
+                last_col = _column_letter(len(headers))
+                # Worksheet row = table position + 2 (header row, 1-based rows)
+                self.sheet.batch_update([
+                    {"range": f"A{position + 2}:{last_col}{position + 2}", "values": [row]}
+                    for position, row in zip(plan["positions"], _cell_rows(updated))
+                ])
+
+            if len(inserted) > 0:
+                next_id = 1 if len(df) == 0 else int(pd.to_numeric(df["id"], errors="coerce").max()) + 1
+                inserted.insert(0, "id", range(next_id, next_id + len(inserted)))
+                inserted["timestamp"] = now
+                inserted = inserted.reindex(columns=headers)
+                self.sheet.append_rows(_cell_rows(inserted))
+
+            if len(updated) + len(inserted) > 0:
+                if self.replica is not None:
+                    table = df.reindex(columns=headers).astype(object)
+                    table.iloc[plan["positions"]] = updated.to_numpy(dtype=object)
+                    self.replica.save(pd.concat([table, inserted], ignore_index=True))
+                self._on_change(added=pd.concat([updated, inserted], ignore_index=True), removed=plan["removed"])
+
+            return {"inserted": len(inserted), "updated": len(updated), "unchanged": plan["unchanged"]}
+        except Exception as e:
+            print(f"Error upserting data: {str(e)}")
+            return None
+
+    def delete_where(self, q: Query) -> Optional[int]:
+        """
+        Delete every record matching a query's filters.
+
+        A snapshot is taken first, so the deletion can be undone with restore().
+        Each run of adjacent matching rows is removed with one call, bottom-up so
+        row numbers stay valid.
+
+        Args:
+            q: Query whose where() predicates select the records to delete
+
+        Returns:
+            Number of records deleted, or None on error
+        """
+        if not q.predicates:
+            print("Refusing to delete without a filter; use bulk_import(mode='replace') to empty the table")
+            return None
+        try:
+            df = self._fetch_all()
+            mask = q.mask(df).to_numpy()
+            if not mask.any():
+                return 0
+            self._snapshots.snapshot(df, "before delete")
+
+            # Worksheet row = table position + 2; group adjacent rows into ranges
+            rows = np.flatnonzero(mask) + 2
+            breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+            for run in reversed(np.split(rows, breaks)):
+                self.sheet.delete_rows(int(run[0]), int(run[-1]))
+
+            removed = df[mask]
+            if self.replica is not None:
+                self.replica.save(df[~mask])
+            self._on_change(removed=removed, table=df[~mask])
+            return len(removed)
+        except Exception as e:
+            print(f"Error deleting records: {str(e)}")
+            return None
+
+    def reindex(self) -> bool:
+        """
+        Rebuild the local replica and the table statistics from the worksheet.
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            df = self._fetch_all()
+            self._stats.build(df, None)
+            if self.replica is not None:
+                self.replica.save(df)
+                self.replica.mark_synced(verified=True)
+            return True
+        except Exception as e:
+            print(f"Error rebuilding replica: {str(e)}")
+            return False
+
+    def _snapshot_if_not_empty(self, label: str) -> Optional[int]:
+        """
+        Snapshot the worksheet before a destructive write.
+
+        Reads the live worksheet rather than the replica, which may be behind.
+        Errors propagate so the write is abandoned.
+        """
+        df = self._fetch_all()
+        if len(df) == 0:
+            return None
+        return self._snapshots.snapshot(df, label)
+
+    def snapshot(self, label: str = "") -> Optional[int]:
+        """
+        Save the current version of the worksheet to the local snapshot directory.
+
+        Snapshots are taken automatically before replace imports and restores.
+        Only ID ranges that changed since the last snapshot take up new space.
+
+        Args:
+            label: Why the snapshot was taken
+
+        Returns:
+            Snapshot version, or None on error
+        """
+        try:
+            return self._snapshots.snapshot(self._fetch_all(), label)
+        except Exception as e:
+            print(f"Error taking snapshot: {str(e)}")
+            return None
+
+    def list_snapshots(self) -> pd.DataFrame:
+        """List the stored snapshots (version, time, label, rows, chunks)."""
+        return self._snapshots.list()
+
+    def restore(self, version: int) -> bool:
+        """
+        Put the worksheet back the way it was at a snapshot.
+
+        The current worksheet is snapshotted first, so a restore can be undone too.
+
+        Args:
+            version: Snapshot version from list_snapshots
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            df = self._snapshots.load(version)
+            self._snapshot_if_not_empty(f"before restore of snapshot {version}")
+
+            self.sheet.clear()
+            self.sheet.update([df.columns.values.tolist()] + _cell_rows(df))
+
+            if self.replica is not None:
+                self.replica.save(df)
+            self._on_change(reset=True, table=df)
+            return True
+        except Exception as e:
+            print(f"Error restoring snapshot: {str(e)}")
+            return False
+
+    def diff(self, from_version: int, to_version: int) -> Dict:
+        """
+        Compare two snapshots.
+
+        Returns:
+            Dictionary with inserted/updated rows, deleted IDs and added/removed columns
+            (see SnapshotStore.diff)
+        """
+        return self._snapshots.diff(from_version, to_version)
@@ -0,0 +1,363 @@
+"""
+Import Pipeline Module
+Validates and normalizes uploaded tables against the database schema in vectorized passes.
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Optional, List, Dict
+
+
+# Column types the pipeline can coerce to
+TYPES = ("int", "float", "bool", "str")
+
+# Columns the database generates itself
+RESERVED_COLUMNS = ("id", "timestamp")
+
+_TRUE_VALUES = ("true", "yes", "y", "1", "t")
+_FALSE_VALUES = ("false", "no", "n", "0", "f")
+
+# Currency symbols and spaces stripped before parsing numbers
+_NUMBER_NOISE = r"[\s$£€]"
+
+# Numbers with commas are only accepted when the commas group thousands ("1,200.50", not "1,5")
+_THOUSANDS = r"[+-]?\d{1,3}(,\d{3})+(\.\d+)?"
+
+# Values checked before a whole column is parsed when inferring its type
+_INFER_SAMPLE = 1000
+
+
+def _is_text(series: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def column_type(series: pd.Series) -> str:
+    """Map a column's dtype to one of TYPES."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.cat.categories.to_series()
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    return "str"
+
+
+def table_schema(df: pd.DataFrame) -> Dict[str, str]:
+    """
+    Work out the column types of an existing table, e.g. from a sample of its rows.
+
+    Returns:
+        Column -> type, without the generated id/timestamp columns
+    """
+    return {col: column_type(df[col]) for col in df.columns if col not in RESERVED_COLUMNS}
+
+
+def _map_distinct(series: pd.Series, func) -> pd.Series:
+    """
+    Apply a column function to each distinct value only.
+
+    Exports repeat the same values a lot, so string work on the distinct values
+    plus a take() is much cheaper than on every row.
+    """
+    codes, uniques = pd.factorize(series)
+    if len(uniques) > len(series) // 2:
+        return func(series)
+    mapped = func(pd.Series(uniques, dtype=series.dtype)).to_numpy()
+    result = pd.Series(mapped.take(np.where(codes < 0, 0, codes)) if len(mapped) else
+                       np.full(len(series), np.nan), index=series.index)
+    result[codes < 0] = np.nan
+    return result
+
+
+def _parse_numbers(text: pd.Series) -> pd.Series:
+    """Parse text to floats, NaN where it isn't a number."""
+    numbers = pd.to_numeric(text, errors="coerce")
+    retry = numbers.isna() & text.notna()
+    if retry.any():
+        # Only values like "$1,200.50" need cleaning up first
+        cleaned = text[retry].str.replace(_NUMBER_NOISE, "", regex=True)
+        grouped = cleaned.str.fullmatch(_THOUSANDS)
+        cleaned = cleaned.where(~cleaned.str.contains(",", regex=False) | grouped)
+        numbers[retry] = pd.to_numeric(cleaned.str.replace(",", "", regex=False), errors="coerce")
+    return numbers.astype(float)
+
+
+def infer_type(series: pd.Series) -> str:
+    """Guess the type of a new text column: int or float if every value is numeric, else str."""
+    values = series.dropna()
+    if len(values) == 0 or not _is_text(series):
+        return column_type(series)
+    if _parse_numbers(values.iloc[:_INFER_SAMPLE].astype(str)).isna().any():
+        return "str"
+    numbers = _parse_numbers(values.astype(str))
+    if numbers.isna().any():
+        return "str"
+    return "int" if bool((numbers % 1 == 0).all()) else "float"
+
+
+def profile(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarize every column of a table in one pass over the frame.
+
+    Returns:
+        DataFrame with the column name, dtype, non-null/null/distinct counts,
+        min/max for numeric columns and a sample value
+    """
+    non_null = df.count()
+    numeric = df.select_dtypes("number")
+    minimum = numeric.min() if len(numeric.columns) else pd.Series(dtype=float)
+    maximum = numeric.max() if len(numeric.columns) else pd.Series(dtype=float)
+
+    # First non-null value of each column
+    first = df.bfill().iloc[0] if len(df) else pd.Series(index=df.columns, dtype=object)
+
+    return pd.DataFrame({
+        "Column Name": df.columns,
+        "Data Type": df.dtypes.astype(str).to_numpy(),
+        "Non-Null Count": non_null.to_numpy(),
+        "Null Count": (len(df) - non_null).to_numpy(),
+        "Distinct": df.nunique().to_numpy(),
+        "Min": minimum.reindex(df.columns).to_numpy(),
+        "Max": maximum.reindex(df.columns).to_numpy(),
+        "Sample Value": first.reindex(df.columns).astype(str).replace("nan", "").to_numpy(),
+    })
+
+
+class ImportPipeline:
+    """
+    Cleans an uploaded table before bulk_import.
+
+    Each step runs on whole columns at once:
+
+    1. Header names are trimmed; generated id/timestamp columns are dropped
+    2. Text values are trimmed and empty strings become missing values
+    3. Columns are coerced to the table's types (new columns get an inferred type);
+       values that don't fit reject their row
+    4. Rows missing a required column are rejected
+    5. Rows repeating the key column are rejected, keeping the last occurrence
+
+    Read uploads with ``dtype=str`` so coercion sees the values exactly as written.
+    """
+
+    def __init__(self, schema: Optional[Dict[str, str]] = None, required: Optional[List[str]] = None,
+                 key: Optional[str] = None, trim: bool = True, keep: str = "last"):
+        """
+        Initialize the pipeline.
+
+        Args:
+            schema: Column -> "int", "float", "bool" or "str" (see table_schema)
+            required: Columns every row must have a value in
+            key: Column that identifies a record (e.g. a Cin7 product code); duplicates are rejected
+            trim: Strip surrounding whitespace from text values
+            keep: Which duplicate of a key to import, "first" or "last"
+        """
+        for col, col_type in (schema or {}).items():
+            if col_type not in TYPES:
+                raise ValueError(f"Unsupported type for {col}: {col_type}")
+        if keep not in ("first", "last"):
+            raise ValueError("keep must be 'first' or 'last'")
+        self.schema = dict(schema or {})
+        self.required = list(required or [])
+        self.key = key
+        self.trim = trim
+        self.keep = keep
+
+    def _coerce(self, series: pd.Series, col_type: str):
+        """
+        Convert a column to a type.
+
+        Returns:
+            Tuple of (converted column, mask of values that couldn't be converted)
+        """
+        present = series.notna()
+        if col_type == "str":
+            if not pd.api.types.is_object_dtype(series) and pd.api.types.is_string_dtype(series):
+                return series, pd.Series(False, index=series.index)
+            # Mixed values (e.g. numbers and text) all become text
+            return series.where(~present, series.astype(str)), pd.Series(False, index=series.index)
+
+        if col_type == "bool":
+            lowered = _map_distinct(series, lambda s: s.astype(str).str.strip().str.lower())
+            converted = pd.Series(pd.NA, index=series.index, dtype="boolean")
+            converted[lowered.isin(_TRUE_VALUES)] = True
+            converted[lowered.isin(_FALSE_VALUES)] = False
+            return converted, present & converted.isna()
+
+        if _is_text(series):
+            numbers = _map_distinct(series, lambda s: _parse_numbers(s.astype(str).str.strip())).astype(float)
+        else:
+            numbers = pd.to_numeric(series, errors="coerce")
+        invalid = present & numbers.isna()
+        if col_type == "int":
+            fractional = numbers.notna() & (numbers % 1 != 0)
+            invalid |= fractional
+            numbers = numbers.where(~fractional).astype("Int64")
+        return numbers, invalid
+
+    def run(self, df: pd.DataFrame) -> Dict:
+        """
+        Validate and normalize an upload.
+
+        Args:
+            df: Uploaded table
+
+        Returns:
+            Dictionary with:
+                data: Clean rows, ready for bulk_import
+                rejected: Rejected rows as uploaded, with "row" (line in the file)
+                          and "reason" columns
+                profile: Column profile of the clean rows (see profile)
+                types: Column -> type the data was coerced to
+                errors: Problems that block the whole import (e.g. a missing required column)
+                warnings: Things changed along the way
+        """
+        errors, warnings = [], []
+        df = df.reset_index(drop=True)
+        df.columns = [str(col).strip() for col in df.columns]
+
+        reserved = [col for col in df.columns if col in RESERVED_COLUMNS]
+        if reserved:
+            warnings.append(f"Ignored generated column(s): {', '.join(reserved)}")
+        original = df
+        df = df.drop(columns=reserved)
+
+        missing = [col for col in self.required + ([self.key] if self.key else []) if col not in df.columns]
+        if missing:
+            errors.append(f"Missing required column(s): {', '.join(missing)}")
+
+        reasons = pd.Series("", index=df.index, dtype=object)
+        types = {}
+        columns = {}
+        for col in df.columns:
+            series = df[col]
+            if self.trim and _is_text(series):
+                series = _map_distinct(series, lambda s: s.str.strip().replace("", np.nan))
+            col_type = self.schema.get(col) or infer_type(series)
+            types[col] = col_type
+            series, invalid = self._coerce(series, col_type)
+            if invalid.any():
+                reasons[invalid] += f"{col}: not a valid {col_type}; "
+                if col_type in ("int", "float") and _is_text(df[col]):
+                    # e.g. "1,5": a decimal comma or a typo, not a thousands separator
+                    commas = invalid & df[col].astype(str).str.contains(",", regex=False)
+                    reasons[commas] = reasons[commas].str.replace(
+                        f"{col}: not a valid {col_type}; ", f"{col}: commas only separate thousands; ", regex=False)
+            columns[col] = series
+        df = pd.DataFrame(columns, index=df.index)
+
+        for col in self.required:
+            if col in df.columns:
+                reasons[df[col].isna()] += f"{col}: missing; "
+
+        if self.key and self.key in df.columns:
+            # Only compare rows that passed the other checks
+            valid = reasons == ""
+            duplicate = df.loc[valid, self.key].duplicated(keep=self.keep).reindex(df.index, fill_value=False)
+            reasons[duplicate] += f"{self.key}: duplicate; "
+
+        bad = reasons != ""
+        rejected = original[bad].copy()
+        rejected.insert(0, "row", rejected.index + 2)  # +1 for the header, +1 for 1-based lines
+        rejected["reason"] = reasons[bad].str.rstrip("; ")
+
+        changed = [col for col, col_type in types.items() if col not in self.schema and col_type != "str"]
+        if changed:
+            warnings.append(f"New numeric column(s): {', '.join(changed)}")
+
+        clean = df[~bad].reset_index(drop=True)
+        return {
+            "data": clean,
+            "rejected": rejected.reset_index(drop=True),
+            "profile": profile(clean),
+            "types": types,
+            "errors": errors,
+            "warnings": warnings,
+        }
+
+
+def _key_strings(series: pd.Series) -> pd.Series:
+    """Key values as text, so 5, 5.0 and "5" all match."""
+    if pd.api.types.is_float_dtype(series):
+        values = series.dropna()
+        if bool((values % 1 == 0).all()):
+            series = series.astype("Int64")
+    return series.astype(str).str.strip()
+
+
+def _like(incoming: pd.Series, existing: pd.Series) -> pd.Series:
+    """Convert incoming text to the existing column's type where it parses."""
+    if not _is_text(incoming) or not pd.api.types.is_numeric_dtype(existing) \
+            or pd.api.types.is_bool_dtype(existing):
+        return incoming
+    numbers = _parse_numbers(incoming.astype(str))
+    unparsed = numbers.isna() & incoming.notna()
+    return numbers if not unparsed.any() else incoming.where(unparsed, numbers)
+
+
+def plan_upsert(existing: pd.DataFrame, incoming: pd.DataFrame, key: str) -> Dict:
+    """
+    Match incoming rows to existing records by a key column.
+
+    Rows whose key is already in the table update that record (only if a value
+    actually differs); the rest are inserts. Matching and comparison are done on
+    whole columns.
+
+    Args:
+        existing: The current table
+        incoming: Rows to upsert (generated id/timestamp columns are ignored
+                  unless key is "id")
+        key: Column identifying a record
+
+    Returns:
+        Dictionary with:
+            positions: Row positions in existing of the records to update
+            updated: New versions of those records, with every column of both tables
+            removed: Old versions of those records
+            inserted: Rows to insert (no id/timestamp yet)
+            unchanged: Number of matched records with no differences
+    """
+    if key not in incoming.columns:
+        raise ValueError(f"Key column {key} not in the upload")
+    drop = [col for col in RESERVED_COLUMNS if col in incoming.columns and col != key]
+    incoming = incoming.drop(columns=drop).reset_index(drop=True)
+    incoming = incoming[incoming[key].notna()].drop_duplicates(key, keep="last").reset_index(drop=True)
+
+    if key in existing.columns and len(existing) > 0:
+        existing_keys = _key_strings(existing[key])
+        first = existing_keys.drop_duplicates(keep="first")
+        lookup = pd.Series(first.index.to_numpy(), index=first.to_numpy())
+        positions = lookup.reindex(_key_strings(incoming[key]).to_numpy()).to_numpy()
+    else:
+        positions = np.full(len(incoming), np.nan)
+    matched = ~pd.isna(positions)
+
+    inserted = incoming[~matched].reset_index(drop=True)
+    if key == "id":
+        inserted = inserted.drop(columns="id")
+
+    matches = incoming[matched].reset_index(drop=True)
+    positions = positions[matched].astype(np.int64)
+    removed = existing.iloc[positions].reset_index(drop=True)
+    columns = list(existing.columns) + [col for col in incoming.columns if col not in existing.columns]
+    updated = removed.reindex(columns=columns)
+
+    differs = np.zeros(len(matches), dtype=bool)
+    for col in incoming.columns:
+        if col == key or col in RESERVED_COLUMNS:
+            continue
+        new = _like(matches[col], existing[col]) if col in existing.columns else matches[col]
+        old = updated[col]
+        same = (old.astype(object) == new.astype(object)).fillna(False).to_numpy(dtype=bool) \
+            | (old.isna() & new.isna()).to_numpy()
+        differs |= ~same
+        updated[col] = new.to_numpy() if not isinstance(new.dtype, pd.CategoricalDtype) else new.astype(object)
+
+    return {
+        "positions": positions[differs],
+        "updated": updated[differs].reset_index(drop=True),
+        "removed": removed[differs].reset_index(drop=True),
+        "inserted": inserted,
+        "unchanged": int((~differs).sum()),
+    }
@@ -0,0 +1,320 @@
+"""
+Partitioned CSV Database Module
+CSVDatabase stored as a directory of partition files, split by id range or by a key column.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import zlib
+from typing import Optional, List, Dict
+
+import numpy as np
+import pandas as pd
+from csv_db import CSVDatabase
+from query import Query
+import storage
+
+
+# File in the partition directory recording how the table is split
+LAYOUT_FILE = "_layout.json"
+
+
+def _key_text(value) -> Optional[str]:
+    """Partition key of a value as text, so 5, 5.0 and "5" share a partition; None if empty."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class PartitionedCSVDatabase(CSVDatabase):
+    """
+    A CSVDatabase stored as a directory of partition files.
+
+    Rows are split by id range (partition_by="id", rows_per_partition IDs per
+    file) or by the value of a key column (e.g. partition_by="Category", one file
+    per category). The API is the same as CSVDatabase's and the table is still
+    cached as a whole, but a write only rewrites the partitions holding rows it
+    added or removed (so a new column only reaches those files), and only
+    partitions that changed on disk are read again. Queries that can't use the
+    cached table only read the partitions their id or key predicates can match,
+    several at a time.
+
+    With a key layout, rows come back grouped by partition rather than in id
+    order. The change log, text index, statistics and snapshots sit beside the
+    directory and cover the whole table.
+    """
+
+    def __init__(self, db_path: str = "data_partitions", partition_by: Optional[str] = None,
+                 rows_per_partition: int = 100_000, extension: str = ".csv", **options):
+        """
+        Initialize the partitioned database.
+
+        Args:
+            db_path: Directory holding the partition files
+            partition_by: "id" for id ranges, or the name of a key column. An existing
+                          directory keeps its layout; default "id" for a new one.
+            rows_per_partition: IDs per partition file with the id layout
+            extension: Partition file extension; ".csv.gz", ".csv.zst" or ".csv.lz4" compress them
+            options: Other CSVDatabase options (text_columns, compact_memory, ...)
+        """
+        self._layout_path = os.path.join(db_path, LAYOUT_FILE)
+        self.partition_by = partition_by or "id"
+        self.rows_per_partition = rows_per_partition
+        self.extension = extension
+        # Partition file -> key value as text (key layout)
+        self._keys = {}
+        self._layout_changed = False
+        # Partition file -> (file signature, rows) as last read
+        self._parts = {}
+        if os.path.exists(self._layout_path):
+            self._read_layout()
+            if partition_by is not None and partition_by != self.partition_by:
+                raise ValueError(f"{db_path} is partitioned by {self.partition_by!r}, not {partition_by!r}")
+        super().__init__(db_path=db_path, **options)
+
+    # Layout
+
+    def _read_layout(self):
+        with open(self._layout_path) as f:
+            layout = json.load(f)
+        self.partition_by = layout["partition_by"]
+        self.rows_per_partition = layout["rows_per_partition"]
+        self.extension = layout["extension"]
+        self._keys.update(layout.get("keys", {}))
+
+    def _save_layout(self):
+        """Write the layout, keeping keys other writers added and dropping those of removed files."""
+        if os.path.exists(self._layout_path):
+            with open(self._layout_path) as f:
+                self._keys = {**json.load(f).get("keys", {}), **self._keys}
+        files = set(self._partition_files())
+        self._keys = {name: key for name, key in self._keys.items() if name in files}
+        layout = {"partition_by": self.partition_by, "rows_per_partition": self.rows_per_partition,
+                  "extension": self.extension, "keys": self._keys}
+        tmp_path = self._layout_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(layout, f)
+        os.replace(tmp_path, self._layout_path)
+        self._layout_changed = False
+
+    def _ensure_db_exists(self):
+        """Create the partition directory and its layout file."""
+        os.makedirs(self.db_path, exist_ok=True)
+        if not os.path.exists(self._layout_path):
+            self._save_layout()
+
+    def _remove_data(self):
+        """Delete the partition directory."""
+        shutil.rmtree(self.db_path, ignore_errors=True)
+
+    def _partition_files(self) -> List[str]:
+        """Names of the partition files, in order."""
+        return sorted(name for name in os.listdir(self.db_path) if name.endswith(self.extension))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.db_path, name)
+
+    def _file_signature(self, name: str):
+        stat = os.stat(self._path(name))
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _signature(self):
+        """Identity of the whole table: changes when any partition file does."""
+        entries = []
+        for name in self._partition_files():
+            try:
+                entries.append((name, *self._file_signature(name)))
+            except FileNotFoundError:
+                continue
+        latest = max((entry[1] for entry in entries), default=0)
+        return (latest, sum(entry[2] for entry in entries), len(entries), zlib.crc32(repr(entries).encode()),
+                self._schema.version)
+
+    def _file_for_key(self, key: Optional[str]) -> str:
+        """Partition file of a key value; the hash keeps names unique after unsafe characters are replaced."""
+        if key is None:
+            name = "null" + self.extension
+        else:
+            slug = re.sub(r"[^\w.-]+", "_", key)[:40].strip("_.") or "key"
+            name = f"{slug}-{hashlib.md5(key.encode('utf-8')).hexdigest()[:8]}{self.extension}"
+        if self._keys.get(name, "") != key:
+            self._keys[name] = key
+            self._layout_changed = True
+        return name
+
+    def _partition_of(self, df: pd.DataFrame) -> np.ndarray:
+        """Partition file name of each row."""
+        if len(df) == 0:
+            return np.array([], dtype=object)
+        if self.partition_by == "id":
+            ids = pd.to_numeric(df["id"]).to_numpy(dtype=np.int64)
+            starts, inverse = np.unique((ids - 1) // self.rows_per_partition * self.rows_per_partition + 1,
+                                        return_inverse=True)
+            names = np.array([f"id-{start:010d}{self.extension}" for start in starts], dtype=object)
+            return names[inverse]
+        if self.partition_by not in df.columns:
+            return np.full(len(df), self._file_for_key(None), dtype=object)
+        codes, values = pd.factorize(df[self.partition_by], use_na_sentinel=False)
+        names = np.array([self._file_for_key(_key_text(value)) for value in values], dtype=object)
+        return names[codes]
+
+    # Reading
+
+    def _read_partitions(self, names: List[str]) -> Dict[str, tuple]:
+        """Read partition files, several at a time on machines with more than one core."""
+        def read(name):
+            signature = self._file_signature(name)
+            # An explicit usecols also keeps storage.read_csv from starting a worker pool of its own
+            return name, (signature, storage.read_csv(self._path(name), usecols=None))
+
+        workers = min(len(names), os.cpu_count() or 1)
+        if workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return dict(pool.map(read, names))
+        return dict(read(name) for name in names)
+
+    def _partition_frames(self, names: List[str]) -> List[pd.DataFrame]:
+        """Rows of each partition, re-reading only the files that changed since they were last read."""
+        with self._lock:
+            stale = []
+            for name in names:
+                cached = self._parts.get(name)
+                if cached is None or cached[0] != self._file_signature(name):
+                    stale.append(name)
+            self._parts.update(self._read_partitions(stale))
+            # Partitions not rewritten since a schema change still have the old columns
+            return [self._schema.apply(self._parts[name][1]) for name in names]
+
+    def _read_table(self) -> pd.DataFrame:
+        names = self._partition_files()
+        frames = self._partition_frames(names)
+        # Forget partitions that were removed
+        self._parts = {name: self._parts[name] for name in names}
+        if not frames:
+            return pd.DataFrame(columns=["id", "timestamp"])
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def _extend_cache(cached: pd.DataFrame, added: pd.DataFrame) -> Optional[pd.DataFrame]:
+        # Appended rows go to their partitions, not the end of the table; only those files are re-read
+        return None
+
+    def _prune(self, q: Query) -> List[str]:
+        """Partitions that can hold rows matching the query's id or key predicates."""
+        names = self._partition_files()
+        if self.partition_by != "id" and any(name not in self._keys for name in names):
+            # Another writer added partitions
+            self._read_layout()
+        for column, op, value in q.predicates:
+            if column != self.partition_by:
+                continue
+            if self.partition_by == "id":
+                names = [name for name in names if self._id_range_matches(name, op, value)]
+            elif op in ("==", "in"):
+                keys = {_key_text(v) for v in ([value] if op == "==" else value)}
+                names = [name for name in names if name not in self._keys or self._keys[name] in keys]
+        return names
+
+    def _id_range_matches(self, name: str, op: str, value) -> bool:
+        """Check whether an id-range partition can hold IDs matching a predicate."""
+        first = int(name[3:13])
+        last = first + self.rows_per_partition - 1
+        try:
+            if op == "between":
+                low, high = float(value[0]), float(value[1])
+                return first <= high and last >= low
+            if op == "in":
+                return any(first <= float(v) <= last for v in value)
+            value = float(value)
+        except (TypeError, ValueError):
+            return True
+        return {"==": first <= value <= last, "<": first < value, "<=": first <= value,
+                ">": last > value, ">=": last >= value}.get(op, True)
+
+    def _scan(self, q: Query) -> pd.DataFrame:
+        """Filter the partitions the query can match, instead of streaming the whole table."""
+        frames = [q.filter(df) for df in self._partition_frames(self._prune(q))]
+        if not frames:
+            return pd.DataFrame(columns=["id", "timestamp"])
+        return pd.concat(frames)
+
+    def read_chunks(self, chunksize: int, columns: Optional[List[str]] = None):
+        """Stream the table partition by partition, in chunks of up to chunksize rows."""
+        frames = self._partition_frames(self._partition_files())
+        # Partitions written at different times may have different columns
+        names = list(dict.fromkeys(col for df in frames for col in df.columns))
+        names = [col for col in names if columns is None or col in columns]
+        for df in frames:
+            df = df.reindex(columns=names)
+            for start in range(0, len(df), chunksize):
+                yield df.iloc[start:start + chunksize]
+
+    # Writing
+
+    def _write_table(self, df: pd.DataFrame, added: Optional[pd.DataFrame] = None,
+                     removed: Optional[pd.DataFrame] = None):
+        """Rewrite the partitions holding the added and removed rows (all of them if not given)."""
+        names = self._partition_of(df)
+        groups = pd.Series(np.arange(len(df))).groupby(names).indices if len(df) else {}
+        # A column named like a dropped or renamed one must not meet the old one in unwritten partitions
+        rewrite_all = (added is None and removed is None) or self._schema.conflicts(df.columns)
+        if rewrite_all:
+            targets = set(groups) | set(self._partition_files())
+        else:
+            targets = set()
+            for rows in (added, removed):
+                if rows is not None and len(rows):
+                    targets.update(self._partition_of(rows))
+
+        for name in sorted(targets):
+            if name in groups:
+                storage.write_csv(df.iloc[groups[name]], self._path(name))
+            elif os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+                self._layout_changed = True
+        if self._layout_changed:
+            self._save_layout()
+        if rewrite_all:
+            self._schema.materialize()
+
+    def _append_rows(self, rows: pd.DataFrame) -> bool:
+        """Append rows to their partitions; a partition gaining columns is rewritten on its own."""
+        if self._schema.conflicts(rows.columns):
+            return False
+        names = self._partition_of(rows)
+        for name, positions in pd.Series(np.arange(len(rows))).groupby(names).indices.items():
+            part = rows.iloc[positions]
+            path = self._path(name)
+            if not os.path.exists(path):
+                storage.write_csv(part, path)
+            elif not storage.append_csv(part, path):
+                existing = self._partition_frames([name])[0]
+                storage.write_csv(pd.concat([existing, part], ignore_index=True), path)
+        if self._layout_changed:
+            self._save_layout()
+        return True
+
+    def _check_schema_column(self, column: str) -> bool:
+        if column == self.partition_by:
+            print(f"Column {column} is the partition key")
+            return False
+        return super()._check_schema_column(column)
+
+    def partitions(self) -> pd.DataFrame:
+        """
+        List the partition files.
+
+        Returns:
+            DataFrame with partition (file name), key (key value or first ID) and bytes
+        """
+        rows = []
+        for name in self._partition_files():
+            key = int(name[3:13]) if self.partition_by == "id" else self._keys.get(name)
+            rows.append({"partition": name, "key": key, "bytes": os.path.getsize(self._path(name))})
+        return pd.DataFrame(rows, columns=["partition", "key", "bytes"])
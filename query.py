@@ -0,0 +1,278 @@
+"""
+Query Module
+Filters, sorting, limits and group-by aggregates that each backend can execute efficiently.
+"""
+
+import pandas as pd
+from typing import Optional, List, Dict, Tuple
+
+
+OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "between", "in", "contains", "prefix")
+AGGREGATES = ("count", "sum", "mean", "min", "max", "nunique")
+
+_SQL_AGGREGATES = {
+    "count": "COUNT({col})",
+    "sum": "SUM({col})",
+    "mean": "AVG({col})",
+    "min": "MIN({col})",
+    "max": "MAX({col})",
+    "nunique": "COUNT(DISTINCT {col})",
+}
+
+
+def _quote(name: str) -> str:
+    """Quote an identifier for SQL."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def coerce_value(series: pd.Series, value):
+    """Convert a comparison value to the column's type, e.g. "10" for a numeric column."""
+    if isinstance(value, str) and pd.api.types.is_numeric_dtype(series):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+class Query:
+    """
+    A query against one table.
+
+    Build it by chaining calls, then pass it to a backend's query() method:
+
+        q = Query().where("price", ">=", 10).where("category", "in", ["A", "B"]).order_by("price").limit(20)
+        stats = Query().aggregate(records=("id", "count"), last_updated=("timestamp", "max"))
+    """
+
+    def __init__(self):
+        self.predicates: List[Tuple[str, str, object]] = []
+        self.selected: Optional[List[str]] = None
+        self.ordering: List[Tuple[str, bool]] = []
+        self.row_limit: Optional[int] = None
+        self.group_columns: List[str] = []
+        self.aggregates: Dict[str, Tuple[str, str]] = {}
+
+    def where(self, column: str, op: str, value) -> "Query":
+        """
+        Add a predicate. All predicates must match (AND).
+
+        Args:
+            column: Column to test
+            op: One of ==, !=, <, <=, >, >=, between (value is (low, high)),
+                in (value is a list), contains (case-insensitive substring), prefix
+                (case-sensitive)
+            value: Value to compare against
+
+        Returns:
+            The query, for chaining
+        """
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+        if op == "between" and len(value) != 2:
+            raise ValueError("between needs a (low, high) pair")
+        self.predicates.append((column, op, value))
+        return self
+
+    def select(self, *columns: str) -> "Query":
+        """Only return these columns."""
+        self.selected = list(columns)
+        return self
+
+    def order_by(self, column: str, ascending: bool = True) -> "Query":
+        """Sort the results. Call again to add further sort keys."""
+        self.ordering.append((column, ascending))
+        return self
+
+    def limit(self, n: int) -> "Query":
+        """Return at most n rows."""
+        self.row_limit = n
+        return self
+
+    def group_by(self, *columns: str) -> "Query":
+        """Group rows before aggregating."""
+        self.group_columns = list(columns)
+        return self
+
+    def aggregate(self, **aggregates: Tuple[str, str]) -> "Query":
+        """
+        Compute aggregates, e.g. aggregate(total=("qty", "sum")).
+
+        Supported functions: count, sum, mean, min, max, nunique.
+
+        Returns:
+            The query, for chaining
+        """
+        for name, (column, func) in aggregates.items():
+            if func not in AGGREGATES:
+                raise ValueError(f"Unsupported aggregate: {func}")
+        self.aggregates.update(aggregates)
+        return self
+
+    @property
+    def is_aggregate(self) -> bool:
+        return bool(self.aggregates)
+
+    def columns_needed(self) -> Optional[List[str]]:
+        """
+        Get the columns the query reads, so backends can skip the rest.
+
+        Returns:
+            List of column names, or None if every column is needed
+        """
+        if self.is_aggregate:
+            output = list(self.group_columns) + [col for col, _ in self.aggregates.values()]
+        elif self.selected is not None:
+            output = list(self.selected) + [col for col, _ in self.ordering]
+        else:
+            return None
+        needed = output + [col for col, _, _ in self.predicates]
+        return list(dict.fromkeys(needed))
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Evaluate the predicates against a frame in vectorized form.
+
+        Args:
+            df: Rows to test
+
+        Returns:
+            Boolean Series aligned with df
+        """
+        mask = pd.Series(True, index=df.index)
+        for column, op, value in self.predicates:
+            if column not in df.columns:
+                return pd.Series(False, index=df.index)
+            series = df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype) and op in ("<", "<=", ">", ">=", "between"):
+                # Categoricals (compact tables) can't compare with values outside their categories
+                series = series.astype(series.cat.categories.dtype)
+            if op == "==":
+                mask &= series == coerce_value(series, value)
+            elif op == "!=":
+                mask &= series != coerce_value(series, value)
+            elif op == "<":
+                mask &= series < coerce_value(series, value)
+            elif op == "<=":
+                mask &= series <= coerce_value(series, value)
+            elif op == ">":
+                mask &= series > coerce_value(series, value)
+            elif op == ">=":
+                mask &= series >= coerce_value(series, value)
+            elif op == "between":
+                low, high = value
+                mask &= series.between(coerce_value(series, low), coerce_value(series, high))
+            elif op == "in":
+                mask &= series.isin([coerce_value(series, v) for v in value])
+            elif op == "contains":
+                mask &= series.astype(str).str.contains(str(value), case=False, regex=False, na=False)
+            elif op == "prefix":
+                mask &= series.astype(str).str.startswith(str(value), na=False)
+        return mask
+
+    def filter(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Keep only the rows matching the predicates."""
+        if not self.predicates:
+            return df
+        return df[self.mask(df)]
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Run the whole query against an in-memory frame.
+
+        Args:
+            df: The table, or any superset of the matching rows
+
+        Returns:
+            DataFrame with the query results
+        """
+        result = self.filter(df)
+
+        if self.is_aggregate:
+            if self.group_columns:
+                result = result.groupby(self.group_columns, dropna=False, observed=True).agg(**self.aggregates).reset_index()
+            else:
+                result = pd.DataFrame({
+                    name: [getattr(result[col], func)() if col in result.columns else None]
+                    for name, (col, func) in self.aggregates.items()
+                })
+
+        if self.ordering:
+            keys = [col for col, _ in self.ordering if col in result.columns]
+            if keys:
+                ascending = [asc for col, asc in self.ordering if col in result.columns]
+                result = result.sort_values(keys, ascending=ascending, kind="stable")
+
+        if self.row_limit is not None:
+            result = result.head(self.row_limit)
+
+        if self.selected is not None and not self.is_aggregate:
+            result = result[[col for col in self.selected if col in result.columns]]
+
+        return result.reset_index(drop=True) if self.ordering or self.is_aggregate else result
+
+    def to_sql(self, table: str) -> Tuple[str, List]:
+        """
+        Compile the query to parameterised SQL for SQL backends.
+
+        Args:
+            table: Table name
+
+        Returns:
+            Tuple of (sql, params)
+        """
+        params = []
+
+        if self.is_aggregate:
+            columns = [_quote(col) for col in self.group_columns]
+            for name, (col, func) in self.aggregates.items():
+                columns.append(f"{_SQL_AGGREGATES[func].format(col=_quote(col))} AS {_quote(name)}")
+        elif self.selected is not None:
+            columns = [_quote(col) for col in self.selected]
+        else:
+            columns = ["*"]
+
+        sql = f"SELECT {', '.join(columns)} FROM {_quote(table)}"
+
+        conditions = []
+        for column, op, value in self.predicates:
+            col = _quote(column)
+            if op == "between":
+                conditions.append(f"{col} BETWEEN ? AND ?")
+                params.extend(value)
+            elif op == "in":
+                values = list(value)
+                if not values:
+                    conditions.append("0")
+                    continue
+                conditions.append(f"{col} IN ({', '.join('?' for _ in values)})")
+                params.extend(values)
+            elif op == "contains":
+                # LIKE ignores ASCII case, like the pandas path
+                escaped = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                conditions.append(f"{col} LIKE ? ESCAPE '\\'")
+                params.append(f"%{escaped}%")
+            elif op == "prefix":
+                # Case-sensitive, like str.startswith (LIKE would ignore case)
+                conditions.append(f"substr({col}, 1, ?) = ?")
+                params.extend([len(str(value)), str(value)])
+            else:
+                sql_op = "=" if op == "==" else op
+                conditions.append(f"{col} {sql_op} ?")
+                params.append(value)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        if self.is_aggregate and self.group_columns:
+            sql += " GROUP BY " + ", ".join(_quote(col) for col in self.group_columns)
+
+        if self.ordering:
+            sql += " ORDER BY " + ", ".join(
+                f"{_quote(col)} {'ASC' if asc else 'DESC'}" for col, asc in self.ordering
+            )
+
+        if self.row_limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(self.row_limit))
+
+        return sql, params
@@ -0,0 +1,308 @@
+"""
+Local Replica Module
+Keeps a local CSV, SQLite or Parquet mirror of a remote table so reads don't hit the network.
+"""
+
+import pandas as pd
+import numpy as np
+import os
+import sqlite3
+import time
+from typing import Optional, List, Dict
+
+
+def _sql_value(value):
+    """Convert a cell value to a type sqlite3 accepts, with missing values as NULL."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value
+
+
+def _parquet_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Make a frame storable as Parquet while keeping its types.
+
+    Parquet needs one type per column, and sheet columns often mix numbers with
+    "" for empty cells. In such columns empty cells become nulls, and the column
+    is stored as numbers if the rest are numbers, and as text otherwise.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if not (pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])):
+            continue
+        values = df[col].mask(df[col].eq(""), None)
+        present = values.dropna()
+        if len(present) == 0:
+            df[col] = values.astype(object)
+        elif present.map(type).nunique() > 1 or not isinstance(present.iloc[0], str):
+            numbers = pd.to_numeric(present, errors="coerce")
+            if numbers.notna().all():
+                df[col] = pd.to_numeric(values, errors="coerce")
+            else:
+                df[col] = values.map(lambda v: v if v is None or isinstance(v, str) else str(v))
+        else:
+            df[col] = values
+    return df
+
+
+def _numeric_id(record_id: str):
+    """An ID kept as text (e.g. "12") as the number it is stored as, so SQL comparisons match."""
+    try:
+        return int(record_id)
+    except ValueError:
+        return record_id
+
+
+class LocalReplica:
+    """
+    A local mirror of a remote worksheet, stored as CSV, SQLite or Parquet.
+
+    With SQLite, writes of single records only touch those rows. A CSV replica
+    appends new rows but rewrites the file for updates and deletes, and a Parquet
+    replica is rewritten by every write, so SQLite suits tables that change often.
+    """
+
+    SQLITE_TABLE = "data"
+
+    def __init__(self, path: str, sync_interval: float = 60.0, verify_interval: float = 600.0):
+        """
+        Initialize the local replica.
+
+        Args:
+            path: Path of the replica file. The format is picked from the extension:
+                  .sqlite/.db for SQLite, .parquet for Parquet, anything else is CSV.
+            sync_interval: Seconds between reconciliations with the remote table
+            verify_interval: Seconds between reconciliations that compare every row
+                             rather than only the timestamps
+        """
+        self.path = path
+        self.sync_interval = sync_interval
+        self.verify_interval = verify_interval
+        self.format = self._detect_format(path)
+        self.last_sync = 0.0
+        self.last_verify = 0.0
+        self._df = None
+
+    @staticmethod
+    def _detect_format(path: str) -> str:
+        """Work out the storage format from the file extension."""
+        ext = os.path.splitext(path)[1].lower()
+        if ext in (".sqlite", ".sqlite3", ".db"):
+            return "sqlite"
+        if ext == ".parquet":
+            return "parquet"
+        return "csv"
+
+    def exists(self) -> bool:
+        """Check whether the replica has been populated."""
+        return self._df is not None or os.path.exists(self.path)
+
+    def needs_sync(self) -> bool:
+        """Check whether the sync interval has elapsed since the last reconciliation."""
+        return time.time() - self.last_sync >= self.sync_interval
+
+    def needs_verify(self) -> bool:
+        """Check whether the verify interval has elapsed since every row was last compared."""
+        return time.time() - self.last_verify >= self.verify_interval
+
+    def mark_synced(self, verified: bool = False):
+        """
+        Record that the replica was just reconciled with the remote table.
+
+        Args:
+            verified: Every row was compared (or downloaded), not only the timestamps
+        """
+        self.last_sync = time.time()
+        if verified:
+            self.last_verify = self.last_sync
+
+    def load(self) -> pd.DataFrame:
+        """Load the replica, from memory if it has already been read."""
+        if self._df is None:
+            if not os.path.exists(self.path):
+                return pd.DataFrame(columns=["id", "timestamp"])
+            if self.format == "sqlite":
+                with sqlite3.connect(self.path) as conn:
+                    self._df = pd.read_sql(f'SELECT * FROM "{self.SQLITE_TABLE}"', conn)
+            elif self.format == "parquet":
+                self._df = pd.read_parquet(self.path)
+            else:
+                self._df = pd.read_csv(self.path)
+        return self._df
+
+    def save(self, df: pd.DataFrame):
+        """
+        Replace the replica contents.
+
+        Args:
+            df: Full table to store locally
+        """
+        df = df.reset_index(drop=True)
+        if self.format == "sqlite":
+            with sqlite3.connect(self.path) as conn:
+                df.to_sql(self.SQLITE_TABLE, conn, if_exists="replace", index=False)
+        elif self.format == "parquet":
+            df = _parquet_frame(df)
+            df.to_parquet(self.path, index=False)
+        else:
+            df.to_csv(self.path, index=False)
+        self._df = df
+
+    def _sqlite_columns(self, conn, columns) -> List[str]:
+        """Add any missing columns to the SQLite table and return its columns."""
+        existing = [row[1] for row in conn.execute(f'PRAGMA table_info("{self.SQLITE_TABLE}")')]
+        for col in columns:
+            if col not in existing:
+                conn.execute(f'ALTER TABLE "{self.SQLITE_TABLE}" ADD COLUMN "{col}"')
+                existing.append(col)
+        return existing
+
+    def _sqlite_update(self, conn, record_id, data: Dict):
+        data = {key: value for key, value in data.items() if key != "id"}
+        if not data:
+            return
+        self._sqlite_columns(conn, data)
+        assignments = ", ".join(f'"{key}" = ?' for key in data)
+        conn.execute(f'UPDATE "{self.SQLITE_TABLE}" SET {assignments} WHERE "id" = ?',
+                     [_sql_value(value) for value in data.values()] + [_sql_value(record_id)])
+
+    def _sqlite_insert(self, conn, rows: pd.DataFrame):
+        if len(rows) == 0:
+            return
+        self._sqlite_columns(conn, rows.columns)
+        columns = ", ".join(f'"{col}"' for col in rows.columns)
+        marks = ", ".join("?" for _ in rows.columns)
+        conn.executemany(f'INSERT INTO "{self.SQLITE_TABLE}" ({columns}) VALUES ({marks})',
+                         [[_sql_value(value) for value in row] for row in rows.itertuples(index=False)])
+
+    def query_sql(self, sql: str, params: List) -> pd.DataFrame:
+        """
+        Run SQL against a SQLite replica.
+
+        Args:
+            sql: SELECT statement over the replica table
+            params: Query parameters
+
+        Returns:
+            DataFrame containing the results
+        """
+        if self.format != "sqlite":
+            raise ValueError("SQL queries need a SQLite replica")
+        with sqlite3.connect(self.path) as conn:
+            return pd.read_sql(sql, conn, params=params)
+
+    def append(self, df_new: pd.DataFrame):
+        """
+        Append rows that were just written to the remote table.
+
+        Args:
+            df_new: Rows to append
+        """
+        if not os.path.exists(self.path) or self.format == "parquet":
+            df = self.load()
+            self.save(df_new if len(df) == 0 else pd.concat([df, df_new], ignore_index=True))
+            return
+
+        if self.format == "sqlite":
+            with sqlite3.connect(self.path) as conn:
+                self._sqlite_insert(conn, df_new)
+        else:
+            header = list(self._df.columns) if self._df is not None else list(pd.read_csv(self.path, nrows=0).columns)
+            if any(col not in header for col in df_new.columns):
+                # New columns change the header, so the file is rewritten
+                self.save(pd.concat([self.load(), df_new], ignore_index=True))
+                return
+            df_new.reindex(columns=header).to_csv(self.path, mode="a", header=False, index=False)
+        if self._df is not None:
+            self._df = pd.concat([self._df, df_new], ignore_index=True)
+
+    def update(self, record_id: int, data: Dict):
+        """
+        Apply a record update that was just written to the remote table.
+
+        Args:
+            record_id: ID of the updated record
+            data: Dictionary containing the updated data
+        """
+        if self.format == "sqlite" and os.path.exists(self.path):
+            with sqlite3.connect(self.path) as conn:
+                self._sqlite_update(conn, record_id, data)
+            if self._df is not None:
+                self._df = self._updated(self._df, record_id, data)
+            return
+        self.save(self._updated(self.load(), record_id, data))
+
+    @staticmethod
+    def _updated(df: pd.DataFrame, record_id, data: Dict) -> pd.DataFrame:
+        df = df.copy()
+        mask = df["id"].astype(str) == str(record_id)
+        for key, value in data.items():
+            if key != "id":
+                if key in df.columns and df[key].dtype != object and isinstance(value, str):
+                    df[key] = df[key].astype(object)
+                df.loc[mask, key] = value
+        return df
+
+    def delete(self, record_id: int):
+        """
+        Apply a record deletion that was just written to the remote table.
+
+        Args:
+            record_id: ID of the deleted record
+        """
+        if self.format == "sqlite" and os.path.exists(self.path):
+            with sqlite3.connect(self.path) as conn:
+                conn.execute(f'DELETE FROM "{self.SQLITE_TABLE}" WHERE "id" = ?', [_sql_value(record_id)])
+            if self._df is not None:
+                self._df = self._df[self._df["id"].astype(str) != str(record_id)].reset_index(drop=True)
+            return
+        df = self.load()
+        self.save(df[df["id"].astype(str) != str(record_id)])
+
+    def apply_changes(self, changed: pd.DataFrame, deleted_ids: List[str], order: Dict[str, int]):
+        """
+        Merge a set of changed rows fetched from the remote table.
+
+        Args:
+            changed: Inserted or updated rows, with the full set of columns
+            deleted_ids: IDs (as strings) of rows no longer present remotely
+            order: Mapping of ID (as string) to remote row number, used to keep the sheet order
+        """
+        df = self.load()
+        changed = changed.reindex(columns=list(dict.fromkeys(list(df.columns) + list(changed.columns))))
+        drop = set(deleted_ids) | set(changed["id"].astype(str))
+        merged = df[~df["id"].astype(str).isin(drop)]
+        merged = pd.concat([merged, changed], ignore_index=True)
+        positions = merged["id"].astype(str).map(order)
+        merged = merged.assign(_row=positions).sort_values("_row", kind="stable").drop(columns="_row")
+        if self.format != "sqlite" or not os.path.exists(self.path):
+            self.save(merged)
+            return
+
+        # Only the changed rows are written; updated rows keep their place in the table
+        known = set(df["id"].astype(str))
+        ids = changed["id"].astype(str)
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(f'DELETE FROM "{self.SQLITE_TABLE}" WHERE "id" = ?',
+                             [[_sql_value(_numeric_id(rid))] for rid in deleted_ids])
+            for record in changed[ids.isin(known)].to_dict("records"):
+                self._sqlite_update(conn, record["id"], record)
+            self._sqlite_insert(conn, changed[~ids.isin(known)])
+        self._df = merged.reset_index(drop=True)
+
+    @staticmethod
+    def row_hashes(df: pd.DataFrame) -> Dict[str, int]:
+        """
+        Hash every row so changed rows can be found without a timestamp column.
+
+        Args:
+            df: Table to hash
+
+        Returns:
+            Mapping of ID (as string) to row hash
+        """
+        normalized = df.fillna("").astype(str)
+        hashes = pd.util.hash_pandas_object(normalized, index=False)
+        return dict(zip(normalized["id"], hashes))
@@ -0,0 +1,205 @@
+"""
+Schema Module
+Column additions, drops and renames of a CSV table recorded in a sidecar, so they don't rewrite the data file.
+"""
+
+import pandas as pd
+import json
+import os
+from typing import Optional, List, Dict
+
+
+class TableSchema:
+    """
+    Schema changes not yet written into a table's data file, stored as JSON beside it.
+
+    The data file keeps the columns it was last written with (its header). On top
+    of that the sidecar records:
+
+    - extra: columns added since, in order. The file doesn't have them yet, so
+      they read as empty until a record with a value in them rewrites the file.
+      (Files written by older versions may hold values after the header's columns.)
+    - dropped: file columns that are hidden
+    - renames: file column -> name it is shown as
+    - defaults: column -> value shown for rows that existed when it was added
+      (IDs up to max_id) and have no value of their own
+
+    Every change bumps the version, which is part of the table's signature, so
+    caches and the other sidecars notice it. Rewriting the whole file writes
+    the current schema and clears the record (materialize).
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the schema sidecar.
+
+        Args:
+            path: JSON file holding the pending schema changes
+        """
+        self.path = path
+        self.data = self._empty(0)
+        self._file_signature = None
+
+    @staticmethod
+    def _empty(version: int) -> Dict:
+        return {"version": version, "extra": [], "dropped": [], "renames": {}, "defaults": {}}
+
+    def load(self) -> Dict:
+        """Get the schema record, re-reading the file only if it changed."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._file_signature is not None:
+                self.data, self._file_signature = self._empty(0), None
+            return self.data
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if signature != self._file_signature:
+            with open(self.path) as f:
+                self.data = {**self._empty(0), **json.load(f)}
+            self._file_signature = signature
+        return self.data
+
+    def _save(self):
+        self.data["version"] += 1
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self._file_signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    @property
+    def version(self) -> int:
+        return self.load()["version"]
+
+    @property
+    def pending(self) -> bool:
+        """True if the data file's columns differ from the table's."""
+        data = self.load()
+        return bool(data["extra"] or data["dropped"] or data["renames"] or data["defaults"])
+
+    def hidden(self) -> List[str]:
+        """File columns that aren't shown under their own name (dropped or renamed)."""
+        data = self.load()
+        return data["dropped"] + list(data["renames"])
+
+    def file_column(self, column: str) -> str:
+        """Name in the data file of a table column."""
+        for file_name, name in self.load()["renames"].items():
+            if name == column:
+                return file_name
+        return column
+
+    def file_columns(self, header: List[str]) -> List[str]:
+        """Columns of the file's rows: its header, then the columns appended after it."""
+        return header + [col for col in self.load()["extra"] if col not in header]
+
+    def read_options(self, header: List[str]) -> Dict:
+        """pd.read_csv arguments for reading the file's rows with the extra columns included."""
+        columns = self.file_columns(header)
+        if len(columns) == len(header):
+            return {}
+        # Names instead of the header line, so rows longer than the header parse
+        return {"header": None, "skiprows": 1, "names": columns}
+
+    def usecols(self, needed: Optional[List[str]], columns: List[str]) -> Optional[List[str]]:
+        """
+        File columns to read for some table columns.
+
+        Args:
+            needed: Table columns wanted, or None for all
+            columns: Columns of the file (see file_columns)
+
+        Returns:
+            File column names, including "id" when a needed column has defaults; None for all
+        """
+        if needed is None:
+            return None
+        data = self.load()
+        if any(col in data["defaults"] for col in needed):
+            needed = list(needed) + ["id"]
+        wanted = {self.file_column(col) for col in needed}
+        return [col for col in columns if col in wanted and col not in data["dropped"]]
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Turn rows as stored in the file into rows of the table.
+
+        Args:
+            df: Rows read from the data file
+
+        Returns:
+            The rows with dropped columns removed, renamed columns renamed, added
+            columns present and defaults filled in
+        """
+        data = self.load()
+        if not (data["extra"] or data["dropped"] or data["renames"] or data["defaults"]):
+            return df
+        df = df.drop(columns=[col for col in data["dropped"] if col in df.columns])
+        df = df.rename(columns={old: new for old, new in data["renames"].items() if old in df.columns})
+        for col in data["extra"]:
+            name = data["renames"].get(col, col)
+            if col not in data["dropped"] and name not in df.columns:
+                df[name] = pd.Series(index=df.index, dtype=object)
+        for col, default in data["defaults"].items():
+            if col in df.columns and "id" in df.columns:
+                older = df[col].isna() & (pd.to_numeric(df["id"], errors="coerce") <= default["max_id"])
+                if older.any():
+                    try:
+                        df.loc[older, col] = default["value"]
+                    except (TypeError, ValueError):
+                        # The default doesn't fit the column's type, e.g. text in a number column
+                        df[col] = df[col].astype(object)
+                        df.loc[older, col] = default["value"]
+        return df
+
+    def conflicts(self, columns) -> bool:
+        """True if a table column has the name of a hidden file column, so rows can't be appended."""
+        hidden = set(self.hidden())
+        return any(col in hidden for col in columns)
+
+    def to_file_columns(self, rows: pd.DataFrame) -> pd.DataFrame:
+        """Rename table columns of rows to their names in the data file, for appending."""
+        renames = {new: old for old, new in self.load()["renames"].items() if new in rows.columns}
+        return rows.rename(columns=renames) if renames else rows
+
+    def add_column(self, column: str, default=None, max_id: int = 0):
+        """
+        Record a new column.
+
+        Args:
+            column: Column name
+            default: Value shown for existing rows (IDs up to max_id)
+            max_id: Highest record ID when the column was added
+        """
+        data = self.load()
+        data["extra"].append(column)
+        if default is not None:
+            data["defaults"][column] = {"value": default, "max_id": int(max_id)}
+        self._save()
+
+    def drop_column(self, column: str):
+        """Hide a column."""
+        data = self.load()
+        data["dropped"].append(self.file_column(column))
+        data["renames"] = {old: new for old, new in data["renames"].items() if new != column}
+        data["defaults"].pop(column, None)
+        self._save()
+
+    def rename_column(self, column: str, new_name: str):
+        """Show a column under a new name."""
+        data = self.load()
+        file_name = self.file_column(column)
+        if new_name == file_name:
+            data["renames"].pop(file_name, None)
+        else:
+            data["renames"][file_name] = new_name
+        if column in data["defaults"]:
+            data["defaults"][new_name] = data["defaults"].pop(column)
+        self._save()
+
+    def materialize(self):
+        """Forget the recorded changes after the whole table was written with the current schema."""
+        if self.pending:
+            self.data = self._empty(self.data["version"])
+            self._save()
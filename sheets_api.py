@@ -0,0 +1,324 @@
+"""
+Sheets API Module
+Central executor for Google Sheets API calls: client-side rate limiting, retries with backoff and a circuit breaker.
+"""
+
+import random
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+# Client-side request budget (the Sheets API allows 60 requests per minute per user by default)
+REQUESTS_PER_MINUTE = 60
+
+# Requests that may be sent back to back before the rate limit kicks in
+BURST = 10
+
+# HTTP statuses worth retrying: rate limited, or a temporary server problem
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Statuses for which the request certainly wasn't carried out, so even appends can be retried
+REJECTED_STATUSES = (429,)
+
+# Calls that would repeat their effect if a request that actually succeeded were sent again
+NON_IDEMPOTENT = ("append_row", "append_rows", "insert_row", "insert_rows", "insert_cols",
+                  "delete_rows", "delete_columns", "add_worksheet", "create")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting how often requests are sent.
+
+    Refills at rate_per_minute / 60 tokens per second up to capacity tokens. A
+    Retry-After answer from the API pauses the whole bucket, so every caller
+    sharing it backs off, not just the one that was throttled.
+    """
+
+    def __init__(self, rate_per_minute: float = REQUESTS_PER_MINUTE, capacity: int = BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take one token, sleeping until one is available.
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """Hold back every request for the given number of seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an API that keeps failing.
+
+    After failure_threshold failed calls in a row the circuit opens and calls
+    fail immediately. Once reset_timeout seconds have passed, one trial call is
+    let through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state: "closed", "open" or "half-open"."""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Check whether a call may go ahead now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+def _status_of(error: Exception) -> Optional[int]:
+    """Get the HTTP status of a failed API call (gspread APIError), if it has one."""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        status = getattr(error, "code", None)
+    return status if isinstance(status, int) and status > 0 else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Read the Retry-After header (seconds or an HTTP date) of a throttled call."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("Retry-After") if hasattr(headers, "get") else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _is_network_error(error: Exception) -> bool:
+    """Check for a dropped connection or timeout, which may not have reached the API."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    requests = sys.modules.get("requests")
+    return requests is not None and isinstance(error, (requests.exceptions.ConnectionError,
+                                                       requests.exceptions.Timeout))
+
+
+class SheetsExecutor:
+    """
+    Runs Google Sheets API calls with rate limiting, retries and a circuit breaker.
+
+    Every call first takes a token from the rate limiter. Throttled (429) and
+    temporary server errors (5xx) are retried with jittered exponential backoff,
+    waiting at least as long as the API's Retry-After header asks. Calls that
+    still fail count towards the circuit breaker; while it is open, calls raise
+    CircuitOpenError straight away so callers can fall back to cached data.
+
+    Wrap gspread objects with wrap() to send all their calls through the executor.
+    """
+
+    def __init__(self, bucket: Optional[TokenBucket] = None, breaker: Optional[CircuitBreaker] = None,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 16.0):
+        """
+        Initialize the executor.
+
+        Args:
+            bucket: Rate limiter (default: a new REQUESTS_PER_MINUTE bucket)
+            breaker: Circuit breaker (default: a new one)
+            max_retries: Retries per call before giving up
+            base_delay: Backoff before the first retry, doubled for each further one
+            max_delay: Longest backoff between retries
+        """
+        self.bucket = bucket or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0, "throttled_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _should_retry(self, error: Exception, name: str) -> bool:
+        status = _status_of(error)
+        if status in REJECTED_STATUSES:
+            return True
+        if name in NON_IDEMPOTENT:
+            return False
+        return status in RETRY_STATUSES or (status is None and _is_network_error(error))
+
+    def call(self, func, /, *args, **kwargs):
+        """
+        Run one API call.
+
+        Args:
+            func: gspread method to call
+            args, kwargs: Its arguments
+
+        Returns:
+            Whatever the call returns
+
+        Raises:
+            CircuitOpenError: The API has been failing and the breaker is open
+            Exception: The call's own error, once retrying doesn't help
+        """
+        name = getattr(func, "__name__", "")
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError(f"Google Sheets is unavailable (circuit open); not calling {name}")
+
+        attempt = 0
+        while True:
+            self._count("throttled_seconds", self.bucket.acquire())
+            self._count("calls")
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                transient = _status_of(e) in RETRY_STATUSES or _is_network_error(e)
+                if not transient:
+                    # The API answered; the request itself was wrong (e.g. not found)
+                    self.breaker.record_success()
+                    raise
+                # Give up early if other calls have meanwhile opened the circuit
+                if attempt >= self.max_retries or not self._should_retry(e, name) \
+                        or self.breaker.state == "open":
+                    self._count("failures")
+                    self.breaker.record_failure()
+                    raise
+
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    self.bucket.pause(retry_after)
+                    delay = max(delay, retry_after)
+                attempt += 1
+                self._count("retries")
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    def wrap(self, target):
+        """Route every method call of a gspread client, spreadsheet or worksheet through this executor."""
+        if target is None or isinstance(target, ResilientProxy):
+            return target
+        return ResilientProxy(target, self)
+
+
+def _is_api_object(value) -> bool:
+    """Check for gspread objects whose methods call the API (client, spreadsheet, worksheet)."""
+    return any(hasattr(value, attr) for attr in ("row_values", "add_worksheet", "open_by_key"))
+
+
+class ResilientProxy:
+    """
+    Stand-in for a gspread object that sends its method calls through a SheetsExecutor.
+
+    Spreadsheets and worksheets returned by those calls are wrapped too, so code
+    using the proxy never reaches the API directly. Plain attributes (title,
+    url, id, ...) are read from the wrapped object.
+    """
+
+    def __init__(self, target, executor: SheetsExecutor):
+        self._target = target
+        self._executor = executor
+
+    @property
+    def unwrapped(self):
+        """The gspread object behind the proxy."""
+        return self._target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            args = [arg.unwrapped if isinstance(arg, ResilientProxy) else arg for arg in args]
+            result = self._executor.call(attr, *args, **kwargs)
+            if isinstance(result, list) and result and all(_is_api_object(item) for item in result):
+                return [self._executor.wrap(item) for item in result]
+            return self._executor.wrap(result) if _is_api_object(result) else result
+
+        call.__name__ = name
+        return call
+
+    def __repr__(self):
+        return f"ResilientProxy({self._target!r})"
+
+
+# Executor shared by every database object in the process, so they share one
+# rate limit and one view of the API's health
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def default_executor() -> SheetsExecutor:
+    """Get the process-wide executor, creating it on first use."""
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = SheetsExecutor()
+        return _default_executor
+
@@ -0,0 +1,265 @@
+"""
+Sheets Fakes Module
+In-memory stand-ins for gspread's client, spreadsheet and worksheet, with fault injection,
+used by the tests and benchmark.py in place of a Google account.
+"""
+
+import random
+import re
+from typing import Optional, List, Dict
+
+from gspread.exceptions import APIError
+
+from gsheets_db import _column_letter, _numericise
+
+
+class FakeResponse:
+    """Just enough of a requests.Response for gspread's APIError."""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+        self.text = f"HTTP {status_code}"
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": self.text, "status": "FAKE"}}
+
+
+def api_error(status: int, retry_after: Optional[float] = None) -> Exception:
+    """Build the gspread APIError the real client raises for an HTTP error."""
+    return APIError(FakeResponse(status, retry_after))
+
+
+def _split_a1(a1: str):
+    """Split "B12" into (12, 2); missing parts are None ("B" -> (None, 2))."""
+    match = re.match(r"^([A-Z]*)(\d*)$", a1)
+    letters, digits = match.group(1), match.group(2)
+    col = 0
+    for ch in letters:
+        col = col * 26 + (ord(ch) - 64)
+    return (int(digits) if digits else None), (col or None)
+
+
+class Cell:
+    """A found cell, like gspread.Cell."""
+
+    def __init__(self, row: int, col: int, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+class FakeWorksheet:
+    """
+    In-memory worksheet implementing the gspread methods the backends use.
+
+    Faults can be injected per call: fail_next() fails the next calls with an
+    HTTP status (e.g. 429 with a Retry-After header), and fail_rate fails a
+    random share of calls. ``calls`` records every method called, ``requests``
+    every call with its range, row or column, and ``cells_returned`` counts the
+    cells read, to compare request patterns.
+    """
+
+    def __init__(self, title: str = "data", rows: Optional[List[List]] = None,
+                 fail_rate: float = 0.0, fail_status: int = 503, seed: int = 0):
+        self.title = title
+        self.id = abs(hash(title)) % 1_000_000
+        self.rows = [list(row) for row in (rows or [])]
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.calls = []
+        self.requests = []
+        self.cells_returned = 0
+        self._failures = []
+        self._random = random.Random(seed)
+
+    def fail_next(self, count: int = 1, status: int = 429, retry_after: Optional[float] = None):
+        """Make the next count calls fail with an HTTP status."""
+        self._failures.extend([(status, retry_after)] * count)
+
+    def recover(self):
+        """Stop injecting faults."""
+        self._failures = []
+        self.fail_rate = 0.0
+
+    def _call(self, name: str, target=None):
+        """Record a call and raise an injected fault, if any (before any change is made)."""
+        self.calls.append(name)
+        self.requests.append((name, target))
+        if self._failures:
+            raise api_error(*self._failures.pop(0))
+        if self.fail_rate and self._random.random() < self.fail_rate:
+            raise api_error(self.fail_status)
+
+    def _returned(self, values):
+        self.cells_returned += sum(len(row) if isinstance(row, list) else 1 for row in values)
+        return values
+
+    def _text_rows(self) -> List[List[str]]:
+        return [["" if v is None else str(v) for v in row] for row in self.rows]
+
+    def _range(self, a1: str) -> List[List[str]]:
+        """Values of an A1 range, trimmed of empty trailing rows and cells like the API does."""
+        start, _, end = a1.split("!")[-1].partition(":")
+        r1, c1 = _split_a1(start)
+        r2, c2 = _split_a1(end) if end else (r1, c1)
+        r1, c1 = r1 or 1, c1 or 1
+        r2 = r2 or len(self.rows)
+        c2 = c2 or max((len(row) for row in self.rows), default=0)
+        values = []
+        for row in self._text_rows()[r1 - 1:r2]:
+            cells = row[c1 - 1:c2]
+            while cells and cells[-1] == "":
+                cells.pop()
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _write(self, a1: str, values: List[List]):
+        r1, c1 = _split_a1(a1.split("!")[-1].split(":")[0])
+        r1, c1 = r1 or 1, c1 or 1
+        for i, row in enumerate(values):
+            while len(self.rows) < r1 + i:
+                self.rows.append([])
+            target = self.rows[r1 - 1 + i]
+            for j, value in enumerate(row):
+                while len(target) < c1 + j:
+                    target.append("")
+                target[c1 - 1 + j] = value
+
+    # Reads
+
+    def row_values(self, row: int, **kwargs) -> List[str]:
+        self._call("row_values", row)
+        values = self._range(f"A{row}:{row}")
+        return self._returned(values[0] if values else [])
+
+    def col_values(self, col: int, **kwargs) -> List[str]:
+        self._call("col_values", col)
+        values = [row[col - 1] if len(row) >= col else "" for row in self._text_rows()]
+        while values and values[-1] == "":
+            values.pop()
+        return self._returned(values)
+
+    def get_all_values(self, **kwargs) -> List[List[str]]:
+        self._call("get_all_values")
+        return self._returned(self._text_rows())
+
+    def get_all_records(self, **kwargs) -> List[Dict]:
+        self._call("get_all_records")
+        values = self._returned(self._text_rows())
+        if not values:
+            return []
+        headers = values[0]
+        records = []
+        for row in values[1:]:
+            row = row + [""] * (len(headers) - len(row))
+            records.append({header: _numericise(value) for header, value in zip(headers, row)})
+        return records
+
+    def get(self, range_name: str, **kwargs) -> List[List[str]]:
+        self._call("get", range_name)
+        return self._returned(self._range(range_name))
+
+    def batch_get(self, ranges: List[str], **kwargs) -> List[List[List[str]]]:
+        self._call("batch_get", list(ranges))
+        result = [self._range(a1) for a1 in ranges]
+        for values in result:
+            self._returned(values)
+        return result
+
+    def find(self, query, in_column: Optional[int] = None, **kwargs):
+        self._call("find")
+        for i, row in enumerate(self._text_rows()):
+            for j, value in enumerate(row):
+                if value == str(query) and (in_column is None or in_column == j + 1):
+                    return Cell(i + 1, j + 1, value)
+        return None
+
+    # Writes
+
+    def append_row(self, values: List, **kwargs):
+        self._call("append_row")
+        self.rows.append(list(values))
+
+    def append_rows(self, values: List[List], **kwargs):
+        self._call("append_rows")
+        self.rows.extend(list(row) for row in values)
+
+    def update(self, values: List[List], range_name: str = "A1", **kwargs):
+        self._call("update", range_name)
+        self._write(range_name, values)
+
+    def batch_update(self, data: List[Dict], **kwargs):
+        self._call("batch_update", [item["range"] for item in data])
+        for item in data:
+            self._write(item["range"], item["values"])
+
+    def update_cell(self, row: int, col: int, value):
+        self._call("update_cell")
+        self._write(f"{_column_letter(col)}{row}", [[value]])
+
+    def delete_rows(self, start_index: int, end_index: Optional[int] = None):
+        self._call("delete_rows", start_index)
+        del self.rows[start_index - 1:end_index or start_index]
+
+    def delete_columns(self, start_index: int, end_index: Optional[int] = None):
+        self._call("delete_columns")
+        for row in self.rows:
+            del row[start_index - 1:end_index or start_index]
+
+    def clear(self):
+        self._call("clear")
+        self.rows = []
+
+
+class FakeSpreadsheet:
+    """In-memory spreadsheet holding FakeWorksheets."""
+
+    def __init__(self, title: str = "SDATA Database", **worksheet_options):
+        """
+        Args:
+            title: Spreadsheet name
+            worksheet_options: Passed to every FakeWorksheet created (e.g. fail_rate)
+        """
+        self.title = title
+        self.url = "https://docs.google.com/spreadsheets/d/fake-" + re.sub(r"\W+", "-", title)
+        self.worksheet_options = worksheet_options
+        self._worksheets = {}
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        if title not in self._worksheets:
+            import gspread
+            raise gspread.WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def worksheets(self) -> List[FakeWorksheet]:
+        return list(self._worksheets.values())
+
+    def add_worksheet(self, title: str, rows=1000, cols=26, **kwargs) -> FakeWorksheet:
+        worksheet = FakeWorksheet(title, **self.worksheet_options)
+        self._worksheets[title] = worksheet
+        return worksheet
+
+    def del_worksheet(self, worksheet: FakeWorksheet):
+        self._worksheets.pop(worksheet.title, None)
+
+
+class FakeClient:
+    """In-memory stand-in for an authorized gspread client."""
+
+    def __init__(self, **worksheet_options):
+        self.worksheet_options = worksheet_options
+        self.spreadsheets = {}
+
+    def open(self, title: str) -> FakeSpreadsheet:
+        if title not in self.spreadsheets:
+            import gspread
+            raise gspread.SpreadsheetNotFound(title)
+        return self.spreadsheets[title]
+
+    def create(self, title: str, **kwargs) -> FakeSpreadsheet:
+        spreadsheet = FakeSpreadsheet(title, **self.worksheet_options)
+        self.spreadsheets[title] = spreadsheet
+        return spreadsheet
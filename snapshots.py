@@ -0,0 +1,266 @@
+"""
+Snapshots Module
+Point-in-time table versions stored as content-addressed row chunks, so unchanged rows cost nothing.
+"""
+
+import pandas as pd
+import numpy as np
+import gzip
+import hashlib
+import io
+import json
+import os
+from typing import Optional, List, Dict
+from datetime import datetime
+
+
+class SnapshotStore:
+    """
+    Directory of table snapshots.
+
+    A snapshot splits the table into chunks of CHUNK_IDS consecutive record IDs.
+    Each chunk is stored once under a hash of its contents (``chunks/<hash>.csv.gz``)
+    and a small JSON manifest (``manifests/<version>.json``) lists the chunks of a
+    version. Chunks that didn't change since an earlier snapshot are shared, so
+    snapshotting a mostly-unchanged table only writes the changed ID ranges.
+    """
+
+    # Record IDs per chunk
+    CHUNK_IDS = 5_000
+
+    # Snapshots kept; older ones are pruned along with chunks nothing else uses
+    MAX_SNAPSHOTS = 20
+
+    def __init__(self, root_dir: str, max_snapshots: Optional[int] = None):
+        """
+        Initialize the snapshot store. The directory is created on the first snapshot.
+
+        Args:
+            root_dir: Directory holding the chunks and manifests
+            max_snapshots: Snapshots to keep (default MAX_SNAPSHOTS)
+        """
+        self.root_dir = root_dir
+        self.max_snapshots = max_snapshots or self.MAX_SNAPSHOTS
+        self.chunk_dir = os.path.join(root_dir, "chunks")
+        self.manifest_dir = os.path.join(root_dir, "manifests")
+
+    def _chunk_path(self, chunk_hash: str) -> str:
+        return os.path.join(self.chunk_dir, chunk_hash + ".csv.gz")
+
+    def _manifest_path(self, version: int) -> str:
+        return os.path.join(self.manifest_dir, f"{version}.json")
+
+    def versions(self) -> List[int]:
+        """Get the stored snapshot versions, oldest first."""
+        if not os.path.isdir(self.manifest_dir):
+            return []
+        return sorted(int(name[:-5]) for name in os.listdir(self.manifest_dir)
+                      if name.endswith(".json") and name[:-5].isdigit())
+
+    def manifest(self, version: int) -> Dict:
+        """Read the manifest of a snapshot."""
+        try:
+            with open(self._manifest_path(version)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(f"Snapshot {version} not found") from None
+
+    def list(self) -> pd.DataFrame:
+        """
+        List the stored snapshots.
+
+        Returns:
+            DataFrame with version, time, label, rows and chunks columns
+        """
+        rows = []
+        for version in self.versions():
+            manifest = self.manifest(version)
+            rows.append({"version": version, "time": manifest["time"], "label": manifest["label"],
+                         "rows": manifest["rows"], "chunks": len(manifest["chunks"])})
+        return pd.DataFrame(rows, columns=["version", "time", "label", "rows", "chunks"])
+
+    @staticmethod
+    def _normalized(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Give whole-number float columns an integer type.
+
+        A column turns float as soon as one value is missing, which would change
+        every row's hash and text ("742" -> "742.0") although no value changed.
+        """
+        columns = {}
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_float_dtype(series):
+                values = series.dropna()
+                if len(values) and bool((values % 1 == 0).all()) and values.abs().max() < 2 ** 53:
+                    series = series.astype("Int64")
+            columns[col] = series
+        return pd.DataFrame(columns, index=df.index)
+
+    def _chunks_of(self, df: pd.DataFrame):
+        """
+        Split a table into ID-range chunks and hash each one.
+
+        Hashing uses pandas' vectorized row hashes, so chunks that didn't change
+        never have to be serialized.
+
+        Yields:
+            Tuples of (chunk key, content hash, chunk rows)
+        """
+        if len(df) == 0:
+            return
+        df = self._normalized(df.sort_values("id", kind="stable"))
+        ids = pd.to_numeric(df["id"], errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+        keys = (ids - 1) // self.CHUNK_IDS
+        row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        header = json.dumps([str(col) for col in df.columns]).encode("utf-8")
+
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(df)]):
+            digest = hashlib.sha256(header)
+            digest.update(row_hashes[start:end].tobytes())
+            yield int(keys[start]), digest.hexdigest(), df.iloc[start:end]
+
+    def snapshot(self, df: pd.DataFrame, label: str = "") -> int:
+        """
+        Store a version of a table.
+
+        Args:
+            df: The whole table (must have an "id" column)
+            label: Why the snapshot was taken, e.g. "before replace import"
+
+        Returns:
+            Version number of the new snapshot
+        """
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+        chunks = []
+        written = 0
+        for key, chunk_hash, rows in self._chunks_of(df):
+            path = self._chunk_path(chunk_hash)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(gzip.compress(rows.to_csv(index=False).encode("utf-8"), compresslevel=1))
+                os.replace(tmp_path, path)
+                written += 1
+            chunks.append({"key": key, "hash": chunk_hash, "rows": len(rows)})
+
+        manifest = {
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "label": label,
+            "columns": [str(col) for col in df.columns],
+            "rows": len(df),
+            "chunks": chunks,
+            "new_chunks": written,
+        }
+
+        # Claim the next version number; another process may be snapshotting too
+        versions = self.versions()
+        version = (versions[-1] if versions else 0) + 1
+        while True:
+            manifest["version"] = version
+            try:
+                fd = os.open(self._manifest_path(version), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            except FileExistsError:
+                version += 1
+                continue
+            with os.fdopen(fd, "w") as f:
+                json.dump(manifest, f)
+            break
+
+        self.prune()
+        return version
+
+    def _read_chunk(self, chunk_hash: str, dtype=None) -> pd.DataFrame:
+        with gzip.open(self._chunk_path(chunk_hash), "rb") as f:
+            return pd.read_csv(io.BytesIO(f.read()), dtype=dtype)
+
+    def load(self, version: int) -> pd.DataFrame:
+        """
+        Rebuild a table as it was at a snapshot.
+
+        Args:
+            version: Snapshot version
+
+        Returns:
+            DataFrame with the table's rows and columns at that version
+        """
+        manifest = self.manifest(version)
+        if not manifest["chunks"]:
+            return pd.DataFrame(columns=manifest["columns"])
+        # Parse all chunks as one CSV so column types are inferred over the whole table
+        parts = []
+        for i, chunk in enumerate(manifest["chunks"]):
+            with gzip.open(self._chunk_path(chunk["hash"]), "rb") as f:
+                data = f.read()
+            if i > 0:
+                data = data.split(b"\n", 1)[1]
+            parts.append(data)
+        return self._normalized(pd.read_csv(io.BytesIO(b"".join(parts))))
+
+    def diff(self, from_version: int, to_version: int) -> Dict:
+        """
+        Work out which records changed between two snapshots.
+
+        Only ID ranges whose chunks differ are read, so diffing two versions of a
+        large table that differ in a few records is fast. Values are compared as text.
+
+        Args:
+            from_version: Older snapshot
+            to_version: Newer snapshot
+
+        Returns:
+            Dictionary with:
+                inserted: Rows only in to_version
+                updated: Rows of to_version whose values differ from from_version
+                deleted: IDs only in from_version
+                columns_added / columns_removed: Column changes
+        """
+        old, new = self.manifest(from_version), self.manifest(to_version)
+        old_chunks = {chunk["key"]: chunk["hash"] for chunk in old["chunks"]}
+        new_chunks = {chunk["key"]: chunk["hash"] for chunk in new["chunks"]}
+        changed = [key for key in sorted(set(old_chunks) | set(new_chunks))
+                   if old_chunks.get(key) != new_chunks.get(key)]
+
+        def read(chunks: Dict, columns: List[str]) -> pd.DataFrame:
+            frames = [self._read_chunk(chunks[key], dtype=str) for key in changed if key in chunks]
+            if not frames:
+                return pd.DataFrame(columns=columns, dtype=str)
+            return pd.concat(frames, ignore_index=True)
+
+        before = read(old_chunks, old["columns"]).set_index("id")
+        after = read(new_chunks, new["columns"]).set_index("id")
+
+        inserted_ids = after.index.difference(before.index)
+        deleted_ids = before.index.difference(after.index)
+        common = after.index.intersection(before.index)
+
+        columns = list(dict.fromkeys(list(after.columns) + list(before.columns)))
+        left = before.loc[common].reindex(columns=columns).fillna("")
+        right = after.loc[common].reindex(columns=columns).fillna("")
+        updated_ids = common[(left != right).any(axis=1).to_numpy()] if len(common) else common
+
+        return {
+            "inserted": after.loc[inserted_ids].reset_index(),
+            "updated": after.loc[updated_ids].reset_index(),
+            "deleted": [int(i) for i in deleted_ids],
+            "columns_added": [col for col in new["columns"] if col not in old["columns"]],
+            "columns_removed": [col for col in old["columns"] if col not in new["columns"]],
+        }
+
+    def prune(self):
+        """Delete snapshots beyond max_snapshots and any chunks no snapshot uses."""
+        versions = self.versions()
+        for version in versions[:-self.max_snapshots]:
+            os.remove(self._manifest_path(version))
+        if len(versions) <= self.max_snapshots:
+            return
+
+        used = set()
+        for version in self.versions():
+            used.update(chunk["hash"] for chunk in self.manifest(version)["chunks"])
+        for name in os.listdir(self.chunk_dir):
+            if name.endswith(".csv.gz") and name[:-7] not in used:
+                os.remove(os.path.join(self.chunk_dir, name))
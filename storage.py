@@ -0,0 +1,341 @@
+"""
+Storage Module
+Reads and writes CSV tables as plain text or block-compressed gzip/zstd/lz4 files.
+"""
+
+import pandas as pd
+import gzip
+import io
+import os
+from typing import Optional, List, Dict, Tuple
+
+
+# File extension -> codec name
+CODECS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+    ".lz4": "lz4",
+}
+
+# Uncompressed bytes per compressed block when a whole table is written
+BLOCK_BYTES = 4 * 1024 * 1024
+
+# Plain CSV files at least this big are parsed in parallel by read_csv
+PARALLEL_THRESHOLD_BYTES = 64 * 1024 * 1024
+
+# Rows read up front to agree on column types before the parallel parse
+SCHEMA_SAMPLE_ROWS = 10_000
+
+# Bytes scanned at a time while looking for chunk boundaries
+_SCAN_BYTES = 1024 * 1024
+
+
+def codec_for(path: str) -> Optional[str]:
+    """
+    Work out the compression codec from a file name.
+
+    Args:
+        path: e.g. "data.csv", "data.csv.gz", "data.csv.zst", "data.csv.lz4"
+
+    Returns:
+        "gzip", "zstd", "lz4", or None for plain CSV
+    """
+    return CODECS.get(os.path.splitext(path)[1].lower())
+
+
+def compress_block(data: bytes, codec: str) -> bytes:
+    """
+    Compress one self-contained block.
+
+    Each codec's format allows blocks to be concatenated, so appending a block
+    to a file produces a valid compressed stream.
+    """
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "lz4":
+        import lz4.frame
+        return lz4.frame.compress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def open_stream(path: str):
+    """
+    Open a table file for reading as an uncompressed byte stream.
+
+    Compressed files are decompressed block after block as they are read,
+    so chunked readers never hold the whole file in memory.
+    """
+    codec = codec_for(path)
+    if codec is None:
+        return open(path, "rb")
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True,
+                                                          closefd=True)
+    if codec == "lz4":
+        import lz4.frame
+        return lz4.frame.open(path, "rb")
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def read_csv(path: str, **kwargs) -> pd.DataFrame:
+    """
+    Read a whole table.
+
+    Large plain CSV files (PARALLEL_THRESHOLD_BYTES and up, with no extra
+    arguments) are parsed on several cores with read_csv_parallel, in a thread
+    pool: this runs inside watcher and server threads, where starting worker
+    processes isn't safe.
+
+    Args:
+        path: Table file
+        kwargs: Extra arguments for pd.read_csv
+
+    Returns:
+        DataFrame with the table contents
+    """
+    if codec_for(path) is None:
+        if not kwargs and (os.cpu_count() or 1) > 1 and os.path.getsize(path) >= PARALLEL_THRESHOLD_BYTES:
+            return read_csv_parallel(path, use_threads=True)
+        return pd.read_csv(path, **kwargs)
+    with open_stream(path) as stream:
+        return pd.read_csv(stream, **kwargs)
+
+
+def split_offsets(path: str, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split a plain CSV file into byte ranges that each hold whole rows.
+
+    A boundary is only placed on a line break outside a quoted field, so values
+    containing quoted newlines are never cut in half. Quote parity is tracked by
+    counting quote characters, which also handles doubled ("") quotes.
+
+    Args:
+        path: CSV file with a header row
+        parts: Number of ranges wanted
+
+    Returns:
+        List of (start, end) byte offsets covering every row after the header
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.readline()
+        data_start = f.tell()
+        if data_start >= size:
+            return []
+
+        targets = [data_start + (size - data_start) * i // parts for i in range(1, parts)]
+        boundaries = [data_start]
+        position = data_start
+        in_quotes = False
+
+        for target in targets:
+            if target <= boundaries[-1]:
+                continue
+
+            # Carry the quote state forward to the target
+            f.seek(position)
+            while position < target:
+                block = f.read(min(_SCAN_BYTES, target - position))
+                if not block:
+                    break
+                in_quotes ^= block.count(b'"') % 2 == 1
+                position += len(block)
+
+            # Move on to the next line break outside quotes
+            boundary = size
+            while True:
+                block = f.read(_SCAN_BYTES)
+                if not block:
+                    break
+                start = 0
+                found = -1
+                while True:
+                    newline = block.find(b"\n", start)
+                    if newline == -1:
+                        break
+                    in_quotes ^= block.count(b'"', start, newline) % 2 == 1
+                    start = newline + 1
+                    if not in_quotes:
+                        found = newline
+                        break
+                if found != -1:
+                    boundary = position + found + 1
+                    position = boundary
+                    break
+                in_quotes ^= block.count(b'"', start) % 2 == 1
+                position += len(block)
+
+            if boundary >= size:
+                break
+            boundaries.append(boundary)
+
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def _parse_range(path: str, start: int, end: int, names: List[str], dtype: Dict) -> pd.DataFrame:
+    """Parse one byte range of a CSV file (runs in a worker)."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if not data.strip():
+        return pd.DataFrame(columns=names)
+    return pd.read_csv(io.BytesIO(data), header=None, names=names, dtype=dtype)
+
+
+def read_csv_parallel(path: str, workers: Optional[int] = None, use_threads: bool = True,
+                      dtype: Optional[Dict] = None) -> pd.DataFrame:
+    """
+    Parse a plain CSV file on several cores.
+
+    The file is split at row boundaries, each range is parsed in a thread (or
+    process) pool and the pieces are concatenated. Column types are agreed up
+    front from a sample so text columns stay text in every piece; a column whose
+    pieces still parse differently is read again as text.
+
+    Args:
+        path: CSV file with a header row
+        workers: Number of workers (default: all cores)
+        use_threads: Use threads; False uses processes, which can be faster but must
+                     only be started from the main thread of a script
+        dtype: Column types that override the sampled schema
+
+    Returns:
+        DataFrame with the table contents
+    """
+    workers = workers or os.cpu_count() or 1
+    sample = pd.read_csv(path, nrows=SCHEMA_SAMPLE_ROWS)
+    names = list(sample.columns)
+
+    schema = {col: str for col in names
+              if pd.api.types.is_object_dtype(sample[col]) or pd.api.types.is_string_dtype(sample[col])}
+    schema.update(dtype or {})
+
+    ranges = split_offsets(path, workers)
+    if len(ranges) <= 1 or workers == 1:
+        return pd.read_csv(path, dtype=schema or None)
+
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    pool = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    with pool(max_workers=workers) as executor:
+        futures = [executor.submit(_parse_range, path, start, end, names, schema) for start, end in ranges]
+        pieces = [future.result() for future in futures]
+
+        # A column can look numeric in the sample and hold text further on. Where the
+        # pieces disagree the column is read again as text, as pd.read_csv would have it
+        mixed = {col: str for col in names if col not in schema and _types_disagree(piece[col] for piece in pieces)}
+        if mixed:
+            schema.update(mixed)
+            futures = [executor.submit(_parse_range, path, start, end, names, schema) for start, end in ranges]
+            pieces = [future.result() for future in futures]
+    return pd.concat(pieces, ignore_index=True)
+
+
+def _types_disagree(columns) -> bool:
+    """Whether the pieces of a column were parsed as different kinds of values."""
+    kinds = set()
+    for column in columns:
+        if column.isna().all():
+            continue  # An empty piece takes any type
+        kinds.add("number" if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+                  else str(column.dtype))
+    return len(kinds) > 1
+
+
+def read_csv_chunks(path: str, chunksize: int, **kwargs):
+    """
+    Iterate over a table in chunks of rows.
+
+    Args:
+        path: Table file
+        chunksize: Rows per chunk
+        kwargs: Extra arguments for pd.read_csv
+
+    Yields:
+        DataFrames of up to chunksize rows
+    """
+    with open_stream(path) as stream:
+        with pd.read_csv(stream, chunksize=chunksize, **kwargs) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+def read_header(path: str) -> List[str]:
+    """Read just the column names of a table."""
+    with open_stream(path) as stream:
+        return list(pd.read_csv(stream, nrows=0).columns)
+
+
+def write_csv(df: pd.DataFrame, path: str):
+    """
+    Write a whole table.
+
+    Compressed tables are split into independently compressed blocks at line
+    boundaries and written to a temporary file that replaces the old one.
+
+    Args:
+        df: Table to write
+        path: Table file
+    """
+    codec = codec_for(path)
+    if codec is None:
+        df.to_csv(path, index=False)
+        return
+
+    data = df.to_csv(index=False).encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        start = 0
+        while start < len(data):
+            end = min(start + BLOCK_BYTES, len(data))
+            if end < len(data):
+                # Blocks end on a line break so each one holds whole rows
+                end = data.find(b"\n", end)
+                end = len(data) if end == -1 else end + 1
+            f.write(compress_block(data[start:end], codec))
+            start = end
+    os.replace(tmp_path, path)
+
+
+def append_csv(rows: pd.DataFrame, path: str) -> bool:
+    """
+    Append rows without rewriting the file.
+
+    Only possible when every column of the new rows already exists in the file;
+    the rows are written in the file's column order. Compressed tables get one
+    new compressed block, so nothing already on disk is recompressed.
+
+    Args:
+        rows: Rows to append
+        path: Table file
+
+    Returns:
+        True if the rows were appended, False if the caller must rewrite the table
+    """
+    header = read_header(path)
+    if not header or any(col not in header for col in rows.columns):
+        return False
+
+    data = rows.reindex(columns=header).to_csv(index=False, header=False).encode("utf-8")
+    codec = codec_for(path)
+    if codec is None:
+        with open(path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    data = b"\n" + data
+            f.write(data)
+    else:
+        with open(path, "ab") as f:
+            f.write(compress_block(data, codec))
+    return True
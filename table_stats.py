@@ -0,0 +1,354 @@
+"""
+Table Statistics Module
+Per-table statistics sidecar (row count, null counts, min/max, distinct estimates) kept up to date by every write.
+"""
+
+import pandas as pd
+import numpy as np
+import base64
+import json
+import os
+from typing import Optional, List, Dict
+from datetime import datetime
+
+
+# HyperLogLog registers = 2 ** HLL_PRECISION; 12 gives about 1.6% error on distinct counts
+HLL_PRECISION = 12
+
+# Sketches can't forget removed values, so they are rebuilt once this share of rows was removed
+REBUILD_RATIO = 0.2
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch over 64-bit value hashes, updated with numpy."""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(2 ** precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray):
+        """Add values given as uint64 hashes."""
+        if len(hashes) == 0:
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # Rank = position of the first 1-bit in the remaining bits
+        ranks = (bits - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def estimate(self) -> int:
+        """Estimated number of distinct values added."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Small cardinalities: linear counting is more accurate
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+    def to_text(self) -> str:
+        return base64.b64encode(self.registers.tobytes()).decode("ascii")
+
+    @classmethod
+    def from_text(cls, text: str, precision: int = HLL_PRECISION) -> "HyperLogLog":
+        return cls(precision, np.frombuffer(base64.b64decode(text), dtype=np.uint8).copy())
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Number of significant bits of each uint64 (0 for 0)."""
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = (values >> np.uint64(shift)) != 0
+        length[high] += shift
+        values[high] >>= np.uint64(shift)
+    return length + (values != 0)
+
+
+def _values(series: pd.Series) -> pd.Series:
+    """Non-null values of a column, with categoricals in plain form. Empty cells count as null."""
+    values = series.dropna()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(values.cat.categories.dtype)
+    if pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+        values = values[values != ""]
+    return values
+
+
+def _is_number(values: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+
+def _parsed_type(values: pd.Series) -> Optional[str]:
+    """
+    Type pd.read_csv gives a column holding these non-null values once they are in
+    the file: bool, int64, float64 or str. None when there are no values.
+    """
+    if len(values) == 0:
+        return None
+    if pd.api.types.is_bool_dtype(values):
+        return "bool"
+    if _is_number(values):
+        return "int64" if pd.api.types.is_integer_dtype(values) else "float64"
+    text = values.astype(str).str.strip()
+    if text.str.lower().isin(["true", "false"]).all():
+        return "bool"
+    if pd.to_numeric(text, errors="coerce").notna().all():
+        return "int64" if text.str.fullmatch(r"[+-]?\d+").all() else "float64"
+    return "str"
+
+
+def _merge_types(old: Optional[str], new: Optional[str]) -> Optional[str]:
+    """Type of a column holding values of both types."""
+    if old is None or old == new:
+        return new or old
+    if new is None:
+        return old
+    if {old, new} == {"int64", "float64"}:
+        return "float64"
+    return "str"
+
+
+def _hashes(values: pd.Series) -> np.ndarray:
+    """
+    Hash non-null values. Numbers are hashed by value, so 5 and 5.0 count once;
+    callers convert numeric text (e.g. form input) to numbers first.
+    """
+    if _is_number(values):
+        values = values.astype(np.float64)
+    elif not pd.api.types.is_string_dtype(values) or pd.api.types.is_object_dtype(values):
+        values = values.astype(str)
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def _scalar(value):
+    """Convert a numpy scalar to a JSON-friendly Python value."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class TableStats:
+    """
+    Statistics of one table, stored as a JSON file beside it.
+
+    For each column: non-null and null counts, min and max, and a HyperLogLog
+    sketch estimating the number of distinct values. Writes update it from the
+    changed rows only. Deletes can't lower a min/max or a distinct estimate
+    without looking at the remaining rows. Such bounds are recomputed when the
+    writer has the table at hand, and otherwise marked inexact until the next rebuild.
+
+    Like the text index, the file names the data file signature it describes,
+    so a change made by a writer that doesn't maintain it triggers a rebuild.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the statistics sidecar.
+
+        Args:
+            path: JSON file holding the statistics
+        """
+        self.path = path
+        self.data = None
+
+    @property
+    def signature(self):
+        return self.data["signature"] if self.data is not None else None
+
+    @staticmethod
+    def _column_stats(series: pd.Series) -> Dict:
+        """Compute the statistics of one column."""
+        values = _values(series)
+        sketch = HyperLogLog()
+        sketch.add(_hashes(values))
+        entry = {
+            # From the values rather than series.dtype, which reflects how the frame was built
+            "dtype": _parsed_type(values),
+            "count": int(len(values)),
+            "nulls": int(len(series) - len(values)),
+            "min": None,
+            "max": None,
+            "bounds_exact": True,
+            "distinct": sketch.estimate(),
+            "hll": sketch.to_text(),
+        }
+        if len(values):
+            if not _is_number(values):
+                values = values.astype(str)
+            entry["min"], entry["max"] = _scalar(values.min()), _scalar(values.max())
+        return entry
+
+    def build(self, df: pd.DataFrame, signature):
+        """
+        Compute the statistics of a whole table and save them.
+
+        Args:
+            df: The full table
+            signature: Signature of the data file the table was read from
+        """
+        self.data = {
+            "signature": list(signature) if signature is not None else None,
+            "rows": int(len(df)),
+            "removed_since_build": 0,
+            "built": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "columns": {str(col): self._column_stats(df[col]) for col in df.columns},
+        }
+        self._save()
+
+    def _save(self):
+        self.data["updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self, signature) -> bool:
+        """
+        Load the statistics file.
+
+        Args:
+            signature: Current signature of the data file
+
+        Returns:
+            True if the statistics are current for that signature, False if they must be rebuilt
+        """
+        try:
+            with open(self.path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = None
+            return False
+        return signature is None or self.data.get("signature") == list(signature)
+
+    def reset(self):
+        """Drop the statistics so they are rebuilt when next needed."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.data = None
+
+    def _add(self, rows: pd.DataFrame):
+        """Fold new rows into the statistics."""
+        columns = self.data["columns"]
+        for col in rows.columns:
+            col = str(col)
+            if col not in columns:
+                # A new column: every existing row is null in it
+                columns[col] = self._column_stats(pd.Series([], dtype=rows[col].dtype))
+                columns[col]["nulls"] = self.data["rows"]
+            entry = columns[col]
+            values = _values(rows[col])
+            entry["dtype"] = _merge_types(entry["dtype"], _parsed_type(values))
+            entry["count"] += int(len(values))
+            entry["nulls"] += int(len(rows) - len(values))
+            if len(values) == 0:
+                continue
+
+            # Compare as numbers while the column holds only numbers (form input arrives as text)
+            numbers = pd.to_numeric(values, errors="coerce")
+            if isinstance(entry["min"], str):
+                values = values.astype(str)
+            elif numbers.notna().all():
+                values = numbers
+            else:
+                if entry["min"] is not None:
+                    # Text arrived in a numeric column; text and number order differ
+                    entry["min"], entry["max"], entry["bounds_exact"] = str(entry["min"]), str(entry["max"]), False
+                values = values.astype(str)
+            low, high = _scalar(values.min()), _scalar(values.max())
+            entry["min"] = low if entry["min"] is None else min(entry["min"], low)
+            entry["max"] = high if entry["max"] is None else max(entry["max"], high)
+
+            sketch = HyperLogLog.from_text(entry["hll"])
+            sketch.add(_hashes(values))
+            entry["hll"], entry["distinct"] = sketch.to_text(), sketch.estimate()
+        # Columns missing from the new rows get nulls
+        for col, entry in columns.items():
+            if col not in rows.columns:
+                entry["nulls"] += int(len(rows))
+        self.data["rows"] += int(len(rows))
+
+    def _remove(self, rows: pd.DataFrame) -> List[str]:
+        """Take removed rows out of the counts; returns columns whose min/max may have changed."""
+        columns = self.data["columns"]
+        touched = []
+        for col, entry in columns.items():
+            if col not in rows.columns:
+                entry["nulls"] -= int(len(rows))
+                continue
+            values = _values(rows[col])
+            entry["count"] -= int(len(values))
+            entry["nulls"] -= int(len(rows) - len(values))
+            if len(values) and entry["min"] is not None:
+                if isinstance(entry["min"], str):
+                    values = values.astype(str)
+                else:
+                    values = pd.to_numeric(values, errors="coerce")
+                if bool((values <= entry["min"]).any()) or bool((values >= entry["max"]).any()):
+                    touched.append(col)
+        self.data["rows"] -= int(len(rows))
+        self.data["removed_since_build"] += int(len(rows))
+        return touched
+
+    def record_change(self, prev_signature, signature, added: Optional[pd.DataFrame] = None,
+                      removed: Optional[pd.DataFrame] = None, table: Optional[pd.DataFrame] = None):
+        """
+        Update the statistics after a write, from the changed rows only.
+
+        An update is a removal of the old row plus an addition.
+
+        Args:
+            prev_signature: Data file signature the change was based on
+            signature: Data file signature after the change
+            added: Rows added (or new versions of updated rows)
+            removed: Rows removed (or old versions of updated rows)
+            table: The full table after the change, if the writer has it; used to
+                   recompute bounds that a removal may have invalidated
+        """
+        if self.data is None and not self.load(prev_signature):
+            self.data = None
+        if self.data is None or (prev_signature is not None and self.signature != list(prev_signature)):
+            # Missing or out of date: rebuild if possible, else on next use
+            if table is not None:
+                self.build(table, signature)
+            else:
+                self.reset()
+            return
+
+        touched = self._remove(removed) if removed is not None and len(removed) else []
+        if added is not None and len(added):
+            self._add(added)
+
+        rows = self.data["rows"]
+        if table is not None and self.data["removed_since_build"] > REBUILD_RATIO * max(rows, 1):
+            # Distinct estimates still count removed values; start over from the table
+            self.build(table, signature)
+            return
+        for col in touched:
+            entry = self.data["columns"][col]
+            if table is not None and col in table.columns:
+                fresh = self._column_stats(table[col])
+                entry["min"], entry["max"], entry["bounds_exact"] = fresh["min"], fresh["max"], True
+            else:
+                entry["bounds_exact"] = False
+        self.data["signature"] = list(signature) if signature is not None else None
+        self._save()
+
+    def summary(self) -> Dict:
+        """
+        Get the statistics without the sketches.
+
+        Returns:
+            Dictionary with rows, built/updated times and a "columns" DataFrame
+            (column, dtype, count, nulls, min, max, distinct, bounds_exact); dtype is
+            the type the column parses as from the file, None while it has no values
+        """
+        columns = pd.DataFrame(
+            [{"column": col, **{k: v for k, v in entry.items() if k != "hll"}}
+             for col, entry in self.data["columns"].items()],
+            columns=["column", "dtype", "count", "nulls", "min", "max", "distinct", "bounds_exact"]
+        )
+        return {"rows": self.data["rows"], "built": self.data["built"], "updated": self.data.get("updated"),
+                "columns": columns}
@@ -0,0 +1,151 @@
+"""
+Tests for the Google Sheets range reads: the exact ranges get_ids, read_page, read_record and search
+request from a recording fake worksheet, with id as the first column or not.
+Run with: python -m pytest test_gsheets_reads.py
+"""
+
+import pytest
+
+import gsheets_db
+from gsheets_db import GoogleSheetsDatabase
+from query import Query
+from sheets_api import SheetsExecutor, TokenBucket
+from sheets_fakes import FakeClient
+
+ROWS = 20
+
+
+def make_db(monkeypatch, tmp_path, columns):
+    """A database on a fake worksheet holding ROWS records with the given column order."""
+    monkeypatch.chdir(tmp_path)  # the statistics file lands in the working directory
+    client = FakeClient()
+    db = GoogleSheetsDatabase(client=client, executor=SheetsExecutor(bucket=TokenBucket(rate_per_minute=1e6,
+                                                                                        capacity=1000)))
+    worksheet = client.open(db.spreadsheet_name).worksheet(db.worksheet_name)
+    records = [{"id": i, "timestamp": "2024-01-01 00:00:00", "Name": f"item {i}",
+                "Group": "even" if i % 2 == 0 else "odd", "Block": "low" if i <= 3 else "high"}
+               for i in range(1, ROWS + 1)]
+    worksheet.rows = [columns] + [[record[col] for col in columns] for record in records]
+    worksheet.requests = []
+    return db, worksheet
+
+
+@pytest.fixture
+def id_first(monkeypatch, tmp_path):
+    return make_db(monkeypatch, tmp_path, ["id", "timestamp", "Name", "Group", "Block"])
+
+
+@pytest.fixture
+def id_third(monkeypatch, tmp_path):
+    return make_db(monkeypatch, tmp_path, ["Name", "Group", "id", "timestamp", "Block"])
+
+
+def test_get_ids(id_first):
+    db, worksheet = id_first
+    assert db.get_ids() == list(range(1, ROWS + 1))
+    assert worksheet.requests == [("row_values", 1), ("col_values", 1)]
+
+
+def test_get_ids_reads_the_id_column(id_third):
+    db, worksheet = id_third
+    assert db.get_ids() == list(range(1, ROWS + 1))
+    assert worksheet.requests == [("row_values", 1), ("col_values", 3)]
+
+
+def test_read_page(id_first):
+    db, worksheet = id_first
+    page = db.read_page(10, 5)
+    assert page["id"].tolist() == [11, 12, 13, 14, 15]
+    assert page.index.tolist() == [10, 11, 12, 13, 14]
+    assert worksheet.requests == [("batch_get", ["1:1", "12:16"])]
+
+
+def test_read_empty_page(id_first):
+    db, worksheet = id_first
+    assert db.read_page(10, 0).empty
+    assert worksheet.requests == []
+
+
+def test_underscores_stay_text():
+    assert gsheets_db._numericise("1_000") == "1_000"
+    assert gsheets_db._numericise("1000") == 1000
+
+
+def test_read_record(id_first):
+    db, worksheet = id_first
+    assert db.read_record(7)["Name"] == "item 7"
+    assert worksheet.requests == [("row_values", 1), ("batch_get", ["A2:A"]), ("batch_get", ["A8:E8"])]
+
+
+def test_read_record_with_id_not_first(id_third):
+    db, worksheet = id_third
+    record = db.read_record(7)
+    assert record["id"] == 7 and record["Name"] == "item 7"
+    assert worksheet.requests == [("row_values", 1), ("batch_get", ["C2:C"]), ("batch_get", ["A8:E8"])]
+
+
+def test_read_missing_record(id_first):
+    db, worksheet = id_first
+    assert db.read_record(99) is None
+    assert worksheet.requests == [("row_values", 1), ("batch_get", ["A2:A"])]
+
+
+def test_search_single_row(id_first):
+    db, worksheet = id_first
+    rows = db.search("Name", "item 4")
+    assert rows["id"].tolist() == [4]
+    assert rows.index.tolist() == [3]
+    assert worksheet.requests == [("row_values", 1), ("col_values", 3), ("batch_get", ["A5:E5"])]
+
+
+def test_search_merges_consecutive_rows(id_third):
+    db, worksheet = id_third
+    rows = db.search("Block", "low")
+    assert rows["id"].tolist() == [1, 2, 3]
+    assert worksheet.requests == [("row_values", 1), ("col_values", 5), ("batch_get", ["A2:E4"])]
+
+
+def test_search_splits_ranges_across_requests(id_first, monkeypatch):
+    db, worksheet = id_first
+    monkeypatch.setattr(gsheets_db, "MAX_RANGES_PER_REQUEST", 4)
+    rows = db.search("Group", "even")
+    assert rows["id"].tolist() == list(range(2, ROWS + 1, 2))
+    assert worksheet.requests == [
+        ("row_values", 1), ("col_values", 4),
+        ("batch_get", ["A3:E3", "A5:E5", "A7:E7", "A9:E9"]),
+        ("batch_get", ["A11:E11", "A13:E13", "A15:E15", "A17:E17"]),
+        ("batch_get", ["A19:E19", "A21:E21"]),
+    ]
+
+
+def test_query_by_ids_with_id_not_first(id_third, monkeypatch):
+    db, worksheet = id_third
+    monkeypatch.setattr(gsheets_db, "MAX_RANGES_PER_REQUEST", 2)
+    rows = db.query(Query().where("id", "in", [2, 5, 9]))
+    assert rows["Name"].tolist() == ["item 2", "item 5", "item 9"]
+    assert worksheet.requests == [("row_values", 1), ("batch_get", ["C2:C"]),
+                                  ("batch_get", ["A3:E3", "A6:E6"]), ("batch_get", ["A10:E10"])]
+
+
+def test_search_reads_whole_sheet_for_most_rows(id_first):
+    db, worksheet = id_first
+    rows = db.search("Block", "high")
+    assert rows["id"].tolist() == list(range(4, ROWS + 1))
+    assert worksheet.requests == [("row_values", 1), ("col_values", 5), ("get_all_values", None)]
+
+
+def test_delete_record_with_id_not_first(id_third):
+    db, worksheet = id_third
+    assert db.delete_record(5)
+    assert worksheet.requests[:3] == [("row_values", 1), ("col_values", 3), ("delete_rows", 6)]
+    assert 5 not in db.get_ids()
+    assert len(worksheet.rows) == ROWS
+
+
+def test_update_record_with_id_not_first(id_third):
+    db, worksheet = id_third
+    assert db.update_record(5, {"Name": "renamed"})
+    assert worksheet.requests[:2] == [("row_values", 1), ("col_values", 3)]
+    assert worksheet.requests[2][0] == "batch_update"
+    assert sorted(worksheet.requests[2][1]) == ["A6", "D6"]
+    assert db.read_record(5)["Name"] == "renamed"
@@ -0,0 +1,50 @@
+"""
+Tests that a Query returns the same rows run by pandas and compiled to SQL on a SQLite replica.
+Run with: python -m pytest test_query.py
+"""
+
+import pandas as pd
+import pytest
+
+from query import Query
+from replica import LocalReplica
+
+TABLE = pd.DataFrame({
+    "id": [1, 2, 3, 4, 5, 6],
+    "Name": ["Apple", "apple pie", "APPLE", "Banana", "a_b%c", "Apricot"],
+    "Price": [1.5, 3.0, 2.0, 0.5, 9.0, 4.0],
+})
+
+QUERIES = [
+    Query().where("Name", "prefix", "App"),
+    Query().where("Name", "prefix", "app"),
+    Query().where("Name", "prefix", "APP"),
+    Query().where("Name", "prefix", "a_b%"),
+    Query().where("Name", "prefix", "a_"),
+    Query().where("Name", "contains", "pie"),
+    Query().where("Name", "contains", "_b%"),
+    Query().where("Price", "between", (1, 3)),
+    Query().where("id", "in", [2, 4, 9]),
+    Query().where("Price", ">", 2).where("Name", "prefix", "A"),
+]
+
+
+@pytest.fixture
+def replica(tmp_path):
+    replica = LocalReplica(str(tmp_path / "replica.sqlite"))
+    replica.save(TABLE)
+    return replica
+
+
+@pytest.mark.parametrize("q", QUERIES, ids=lambda q: repr(q.predicates))
+def test_sqlite_matches_pandas(replica, q):
+    sql, params = q.to_sql(LocalReplica.SQLITE_TABLE)
+    from_sql = replica.query_sql(sql, params)
+    from_pandas = q.apply(TABLE)
+    assert sorted(from_sql["id"].tolist()) == sorted(from_pandas["id"].tolist())
+
+
+def test_prefix_is_case_sensitive(replica):
+    q = Query().where("Name", "prefix", "app")
+    assert q.apply(TABLE)["id"].tolist() == [2]
+    assert replica.query_sql(*q.to_sql(LocalReplica.SQLITE_TABLE))["id"].tolist() == [2]
@@ -0,0 +1,217 @@
+"""
+Tests for the Sheets API executor: retries, backoff, the circuit breaker and writes that must not be repeated.
+Run with: python -m pytest test_sheets_api.py
+"""
+
+import pytest
+from gspread.exceptions import APIError
+
+import sheets_api
+from sheets_api import SheetsExecutor, TokenBucket, CircuitBreaker, CircuitOpenError
+from sheets_fakes import FakeWorksheet, api_error
+
+
+class FakeClock:
+    """Replaces sheets_api's time module: sleeping advances the clock instantly and is recorded."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sheets_api, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def worksheet():
+    return FakeWorksheet(rows=[["id", "Name"], [1, "a"], [2, "b"]])
+
+
+def make_executor(**options) -> SheetsExecutor:
+    """Executor with a rate limit that never waits, so only backoff shows up as sleeps."""
+    return SheetsExecutor(bucket=TokenBucket(rate_per_minute=1e6, capacity=1000), **options)
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retries_transient_errors(clock, worksheet, status):
+    executor = make_executor()
+    worksheet.fail_next(2, status=status)
+
+    assert executor.wrap(worksheet).row_values(1) == ["id", "Name"]
+    assert worksheet.calls == ["row_values"] * 3
+    assert executor.stats["retries"] == 2
+    assert executor.stats["failures"] == 0
+    assert executor.breaker.state == "closed"
+
+
+def test_does_not_retry_client_errors(clock, worksheet):
+    executor = make_executor()
+    worksheet.fail_next(1, status=400)
+
+    with pytest.raises(APIError):
+        executor.wrap(worksheet).row_values(1)
+    assert worksheet.calls == ["row_values"]
+    assert clock.sleeps == []
+    # The API answered, so it counts as healthy
+    assert executor.breaker.failures == 0
+
+
+def test_gives_up_after_max_retries(clock, worksheet):
+    executor = make_executor(max_retries=2)
+    worksheet.fail_next(5, status=503)
+
+    with pytest.raises(APIError):
+        executor.wrap(worksheet).row_values(1)
+    assert len(worksheet.calls) == 3
+    assert executor.stats["failures"] == 1
+
+
+def test_backoff_doubles_up_to_max_delay(clock, worksheet, monkeypatch):
+    monkeypatch.setattr(sheets_api.random, "uniform", lambda low, high: high)
+    executor = make_executor(max_retries=5, base_delay=1.0, max_delay=4.0)
+    worksheet.fail_next(5, status=503)
+
+    executor.wrap(worksheet).row_values(1)
+    assert clock.sleeps == [1.0, 2.0, 4.0, 4.0, 4.0]
+
+
+def test_backoff_is_jittered(clock, worksheet, monkeypatch):
+    monkeypatch.setattr(sheets_api.random, "uniform", lambda low, high: (low + high) / 2)
+    executor = make_executor(base_delay=2.0)
+    worksheet.fail_next(1, status=500)
+
+    executor.wrap(worksheet).row_values(1)
+    assert clock.sleeps == [1.0]
+
+
+def test_waits_for_retry_after(clock, worksheet):
+    executor = make_executor(base_delay=0.01)
+    worksheet.fail_next(1, status=429, retry_after=7)
+
+    executor.wrap(worksheet).row_values(1)
+    assert clock.sleeps == [7.0]
+    # The pause is shared: the bucket holds every caller back until it ends
+    assert executor.bucket._paused_until == pytest.approx(1007.0)
+
+
+def test_circuit_opens_after_consecutive_failures(clock, worksheet):
+    executor = make_executor(breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30), max_retries=0)
+    sheet = executor.wrap(worksheet)
+    worksheet.fail_next(2, status=503)
+
+    for _ in range(2):
+        with pytest.raises(APIError):
+            sheet.row_values(1)
+    assert executor.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        sheet.row_values(1)
+    # Rejected without reaching the API
+    assert len(worksheet.calls) == 2
+    assert executor.stats["rejected"] == 1
+
+
+def test_circuit_closes_after_successful_trial(clock, worksheet):
+    executor = make_executor(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30), max_retries=0)
+    sheet = executor.wrap(worksheet)
+    worksheet.fail_next(1, status=503)
+    with pytest.raises(APIError):
+        sheet.row_values(1)
+
+    clock.now += 29
+    assert executor.breaker.state == "open"
+    clock.now += 1
+    assert executor.breaker.state == "half-open"
+
+    assert sheet.row_values(1) == ["id", "Name"]
+    assert executor.breaker.state == "closed"
+
+
+def test_failed_trial_reopens_circuit(clock, worksheet):
+    executor = make_executor(breaker=CircuitBreaker(failure_threshold=3, reset_timeout=30), max_retries=0)
+    sheet = executor.wrap(worksheet)
+    worksheet.fail_next(4, status=503)
+    for _ in range(3):
+        with pytest.raises(APIError):
+            sheet.row_values(1)
+
+    clock.now += 30
+    with pytest.raises(APIError):
+        sheet.row_values(1)
+    # One failed trial is enough to open it again, for a full reset_timeout
+    assert executor.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        sheet.row_values(1)
+    assert len(worksheet.calls) == 4
+
+
+def test_half_open_lets_one_trial_through(clock, worksheet):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+@pytest.mark.parametrize("status", [500, 503])
+def test_does_not_replay_appends_after_server_errors(clock, worksheet, status):
+    executor = make_executor()
+    worksheet.fail_next(1, status=status)
+
+    with pytest.raises(APIError):
+        executor.wrap(worksheet).append_row([3, "c"])
+    # The first request may have been carried out, so it isn't sent again
+    assert worksheet.calls == ["append_row"]
+    assert executor.stats["retries"] == 0
+
+
+def test_does_not_replay_deletes_after_server_errors(clock, worksheet):
+    executor = make_executor()
+    worksheet.fail_next(1, status=503)
+
+    with pytest.raises(APIError):
+        executor.wrap(worksheet).delete_rows(2)
+    assert worksheet.calls == ["delete_rows"]
+    assert len(worksheet.rows) == 3
+
+
+def test_retries_appends_rejected_by_rate_limit(clock, worksheet):
+    executor = make_executor()
+    worksheet.fail_next(1, status=429)
+
+    executor.wrap(worksheet).append_row([3, "c"])
+    assert worksheet.calls == ["append_row"] * 2
+    assert worksheet.rows[-1] == [3, "c"] and len(worksheet.rows) == 4
+
+
+def test_retries_idempotent_writes(clock, worksheet):
+    executor = make_executor()
+    worksheet.fail_next(1, status=503)
+
+    executor.wrap(worksheet).update([["z"]], "B2")
+    assert worksheet.calls == ["update"] * 2
+    assert worksheet.rows[1] == [1, "z"]
+
+
+def test_rate_limit_spaces_requests(clock, worksheet):
+    executor = SheetsExecutor(bucket=TokenBucket(rate_per_minute=60, capacity=2))
+    sheet = executor.wrap(worksheet)
+
+    for _ in range(4):
+        sheet.row_values(1)
+    assert sum(clock.sleeps) == pytest.approx(2.0)
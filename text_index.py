@@ -0,0 +1,318 @@
+"""
+Text Index Module
+Inverted word index over text columns, for fast partial-word search as the user types.
+"""
+
+import pandas as pd
+import numpy as np
+import json
+import os
+import pickle
+import re
+from typing import Optional, List, Dict, Tuple
+
+
+TOKEN_PATTERN = r"\w+"
+
+# Match quality weights: whole word, start of a word, anywhere inside a word
+EXACT, PREFIX, SUBSTRING = 3, 2, 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase words."""
+    return re.findall(TOKEN_PATTERN, str(text).lower())
+
+
+def _trigrams(token: str) -> set:
+    """Get the three-character substrings of a word."""
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class TextIndex:
+    """
+    Word -> record ID postings for each indexed column.
+
+    The index lives in two files beside the data file: a pickled base and an
+    append-only log of changes. Every log entry names the data file signature it
+    applies to and the one it produces, so a change made by a writer that doesn't
+    maintain the index breaks the chain and triggers a rebuild.
+    """
+
+    # Log entries replayed on load before the base file is rewritten
+    COMPACT_AFTER = 200
+
+    # Changes touching more rows than this drop the index instead of logging postings
+    MAX_LOGGED_ROWS = 10_000
+
+    def __init__(self, path: str, columns: List[str]):
+        """
+        Initialize the text index.
+
+        Args:
+            path: Path of the base index file; the change log is stored at path + ".log"
+            columns: Text columns to index
+        """
+        self.path = path
+        self.log_path = path + ".log"
+        self.columns = list(columns)
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {}
+        self.signature = None
+        self._vocabulary = {}
+
+    def _postings_for(self, df: pd.DataFrame) -> Dict[str, Dict[str, np.ndarray]]:
+        """Compute word -> sorted unique IDs for each indexed column of some rows."""
+        result = {}
+        ids = df["id"].to_numpy()
+        for column in self.columns:
+            result[column] = {}
+            if column not in df.columns or len(df) == 0:
+                continue
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Compact tables hold repetitive text as categoricals, which can't take fillna("")
+                values = values.astype(object)
+            words = values.fillna("").astype(str).str.lower().str.findall(TOKEN_PATTERN)
+            exploded = pd.DataFrame({"id": ids, "word": words}).explode("word").dropna(subset=["word"])
+            if len(exploded) == 0:
+                continue
+
+            # Sort (word, id) pairs once and slice out each word's IDs
+            codes, vocabulary = pd.factorize(exploded["word"])
+            id_values = exploded["id"].to_numpy(dtype=np.int64)
+            order = np.lexsort((id_values, codes))
+            codes, id_values = codes[order], id_values[order]
+            keep = np.ones(len(codes), dtype=bool)
+            keep[1:] = (codes[1:] != codes[:-1]) | (id_values[1:] != id_values[:-1])
+            codes, id_values = codes[keep], id_values[keep]
+            result[column] = self._unpack(vocabulary.take(np.unique(codes)), codes, id_values)
+        return result
+
+    @staticmethod
+    def _unpack(words, codes: np.ndarray, id_values: np.ndarray) -> Dict[str, np.ndarray]:
+        """Split a sorted ID array into per-word postings."""
+        boundaries = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+        return dict(zip(words, np.split(id_values, boundaries)))
+
+    @staticmethod
+    def _pack(postings: Dict[str, np.ndarray]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Flatten per-word postings into one array, which pickles much faster."""
+        words = list(postings)
+        lengths = np.array([len(postings[w]) for w in words], dtype=np.int64)
+        ids = np.concatenate([postings[w] for w in words]) if words else np.array([], dtype=np.int64)
+        return words, lengths, ids
+
+    def _merge(self, delta: Dict[str, Dict[str, np.ndarray]], remove: bool = False):
+        """Add or remove postings in memory."""
+        for column, words in delta.items():
+            postings = self.postings.setdefault(column, {})
+            vocabulary = self._vocabulary.get(column)
+            for word, ids in words.items():
+                ids = np.asarray(ids, dtype=np.int64)
+                current = postings.get(word)
+                if remove:
+                    if current is None:
+                        continue
+                    remaining = np.setdiff1d(current, ids, assume_unique=True)
+                    if len(remaining):
+                        postings[word] = remaining
+                    else:
+                        del postings[word]
+                        if vocabulary is not None:
+                            for gram in _trigrams(word):
+                                vocabulary.get(gram, set()).discard(word)
+                elif current is None:
+                    postings[word] = ids
+                    if vocabulary is not None:
+                        for gram in _trigrams(word):
+                            vocabulary.setdefault(gram, set()).add(word)
+                else:
+                    postings[word] = np.union1d(current, ids)
+
+    def build(self, df: pd.DataFrame, signature):
+        """
+        Index a whole table and save it as the new base.
+
+        Args:
+            df: The full table
+            signature: Signature of the data file the table was read from
+        """
+        self.postings = self._postings_for(df)
+        self.signature = list(signature)
+        self._vocabulary = {}
+        self._save_base()
+
+    def _save_base(self):
+        """Write the base file and empty the change log."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            packed = {column: self._pack(words) for column, words in self.postings.items()}
+            pickle.dump({"columns": self.columns, "signature": self.signature, "postings": packed}, f)
+        os.replace(tmp_path, self.path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    def load(self, signature) -> bool:
+        """
+        Load the base file and replay the change log.
+
+        Args:
+            signature: Current signature of the data file
+
+        Returns:
+            True if the index is current for that signature, False if it must be rebuilt
+        """
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                base = pickle.load(f)
+        except Exception:
+            return False
+        if base.get("columns") != self.columns:
+            return False
+
+        self.postings = {}
+        for column, (words, lengths, ids) in base["postings"].items():
+            codes = np.repeat(np.arange(len(words)), lengths)
+            self.postings[column] = self._unpack(words, codes, ids)
+        self._vocabulary = {}
+        current = base["signature"]
+        entries = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry["prev"] != current:
+                        return False
+                    self._merge(entry["remove"], remove=True)
+                    self._merge(entry["add"])
+                    current = entry["sig"]
+                    entries += 1
+
+        self.signature = current
+        if current != list(signature):
+            return False
+        if entries > self.COMPACT_AFTER:
+            self._save_base()
+        return True
+
+    def record_change(self, prev_signature, signature, added: Optional[pd.DataFrame] = None,
+                      removed: Optional[pd.DataFrame] = None):
+        """
+        Log a change to the table, updating the in-memory index if it is loaded.
+
+        Only the postings of the changed rows are computed, so this is cheap for
+        single-record writes. An update is a removal of the old row plus an addition.
+
+        Args:
+            prev_signature: Data file signature the change was based on
+            signature: Data file signature after the change
+            added: Rows added (or new versions of updated rows)
+            removed: Rows removed (or old versions of updated rows)
+        """
+        changed_rows = (len(added) if added is not None else 0) + (len(removed) if removed is not None else 0)
+        if changed_rows > self.MAX_LOGGED_ROWS or not os.path.exists(self.path):
+            self.reset()
+            return
+
+        remove_delta = self._postings_for(removed) if removed is not None else {}
+        add_delta = self._postings_for(added) if added is not None else {}
+        entry = {
+            "prev": list(prev_signature) if prev_signature else None,
+            "sig": list(signature),
+            "remove": {col: {w: ids.tolist() for w, ids in words.items()} for col, words in remove_delta.items()},
+            "add": {col: {w: ids.tolist() for w, ids in words.items()} for col, words in add_delta.items()},
+        }
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+        if self.signature is not None and self.signature == entry["prev"]:
+            self._merge(remove_delta, remove=True)
+            self._merge(add_delta)
+            self.signature = entry["sig"]
+
+    def reset(self):
+        """Drop the index so it is rebuilt on the next search."""
+        for path in (self.path, self.log_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.postings = {}
+        self.signature = None
+        self._vocabulary = {}
+
+    def _words_matching(self, column: str, term: str) -> List[Tuple[str, int]]:
+        """Find indexed words containing a search term, with their match weight."""
+        postings = self.postings.get(column, {})
+
+        if len(term) < 3:
+            # Too short for trigrams; only match the start of words
+            candidates = [word for word in postings if word.startswith(term)]
+        else:
+            if column not in self._vocabulary:
+                vocabulary = {}
+                for word in postings:
+                    for gram in _trigrams(word):
+                        vocabulary.setdefault(gram, set()).add(word)
+                self._vocabulary[column] = vocabulary
+            vocabulary = self._vocabulary[column]
+            grams = sorted(_trigrams(term), key=lambda g: len(vocabulary.get(g, ())))
+            candidates = set(vocabulary.get(grams[0], set()))
+            for gram in grams[1:]:
+                candidates &= vocabulary.get(gram, set())
+                if not candidates:
+                    break
+            candidates = [word for word in candidates if term in word]
+
+        matches = []
+        for word in candidates:
+            if word == term:
+                matches.append((word, EXACT))
+            elif word.startswith(term):
+                matches.append((word, PREFIX))
+            else:
+                matches.append((word, SUBSTRING))
+        return matches
+
+    def search(self, query: str, columns: Optional[List[str]] = None, limit: int = 20) -> List[int]:
+        """
+        Find the records best matching a free-text query.
+
+        Records matching more of the query's words rank first, then records whose
+        words match more closely (whole word, then word prefix, then substring).
+
+        Args:
+            query: Text typed by the user; each word may be partial
+            columns: Indexed columns to search (default: all)
+            limit: Maximum number of IDs to return
+
+        Returns:
+            Record IDs, best match first
+        """
+        columns = columns or self.columns
+        scores = None
+        hits = None
+
+        for term in tokenize(query):
+            ids_parts = []
+            weight_parts = []
+            for column in columns:
+                for word, weight in self._words_matching(column, term):
+                    ids = self.postings[column][word]
+                    ids_parts.append(ids)
+                    weight_parts.append(np.full(len(ids), weight))
+            if not ids_parts:
+                continue
+
+            term_scores = pd.Series(np.concatenate(weight_parts), index=np.concatenate(ids_parts))
+            term_scores = term_scores.groupby(level=0).max()
+            term_hits = pd.Series(1, index=term_scores.index)
+            scores = term_scores if scores is None else scores.add(term_scores, fill_value=0)
+            hits = term_hits if hits is None else hits.add(term_hits, fill_value=0)
+
+        if scores is None:
+            return []
+
+        ranking = pd.DataFrame({"hits": hits, "score": scores})
+        ranking["id"] = ranking.index
+        ranking = ranking.sort_values(["hits", "score", "id"], ascending=[False, False, True])
+        return [int(i) for i in ranking["id"].head(limit)]
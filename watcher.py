@@ -0,0 +1,162 @@
+"""
+File Watcher Module
+Notices changes to a data file in the background, using inotify where available and polling otherwise.
+"""
+
+import os
+import threading
+import time
+from typing import Optional, Callable, List
+
+
+def _file_signature(path: str):
+    """Get the mtime/size/inode of a file (of every file, for a directory), or None if it doesn't exist."""
+    try:
+        if os.path.isdir(path):
+            with os.scandir(path) as entries:
+                return tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size, entry.inode())
+                                    for entry in entries if entry.is_file()))
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class FileWatcher:
+    """
+    Calls a function whenever a file's contents change (or any file in a directory),
+    or one of the extra files watched with it (e.g. a sidecar that changes how it reads).
+
+    On Linux with the optional ``inotify_simple`` package installed, the watcher
+    sleeps until the kernel reports a write, so an idle file costs no I/O. Otherwise
+    it checks the file's metadata every ``interval`` seconds.
+    """
+
+    # Pause after a write event so a rewrite in progress can finish
+    SETTLE_SECONDS = 0.05
+
+    def __init__(self, path: str, callback: Callable[[], None], interval: float = 0.5,
+                 extra_paths: Optional[List[str]] = None):
+        """
+        Initialize the watcher.
+
+        Args:
+            path: File (or directory of files) to watch
+            callback: Called (from the watcher thread) after each change
+            interval: Seconds between checks when polling
+            extra_paths: Other files whose changes also call the callback
+        """
+        self.path = os.path.abspath(path)
+        self.paths = [self.path] + [os.path.abspath(extra) for extra in extra_paths or []]
+        self.callback = callback
+        self.interval = interval
+        self.backend = "inotify" if self._inotify_available() else "polling"
+        self._signature = self._signatures()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _inotify_available() -> bool:
+        """Check whether inotify can be used on this system."""
+        try:
+            import inotify_simple  # noqa: F401
+            return True
+        except (ImportError, OSError):
+            return False
+
+    def start(self):
+        """Start watching in a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        target = self._run_inotify if self.backend == "inotify" else self._run_polling
+        self._thread = threading.Thread(target=target, name=f"watch:{os.path.basename(self.path)}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=max(self.interval, 1.0) + 1.0)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _signatures(self):
+        return tuple(_file_signature(path) for path in self.paths)
+
+    def _check(self):
+        """Call the callback if a watched file's signature changed since the last check."""
+        signature = self._signatures()
+        if signature != self._signature:
+            self._signature = signature
+            try:
+                self.callback()
+            except Exception as e:
+                print(f"Error in file watcher callback: {e}")
+
+    def _run_polling(self):
+        """Check the file's metadata every interval."""
+        while not self._stop.wait(self.interval):
+            self._check()
+
+    def _run_inotify(self):
+        """Sleep until the kernel reports a write to a watched file's directory."""
+        from inotify_simple import INotify, flags
+
+        inotify = INotify()
+        # Watch the directories so atomic replaces (rename over the file) are seen too
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE
+        # Watch descriptor -> names of the watched files in it (None: any file of a watched directory)
+        names = {}
+        for path in self.paths:
+            if os.path.isdir(path):
+                names[inotify.add_watch(path, mask)] = None
+            else:
+                wd = inotify.add_watch(os.path.dirname(path), mask)
+                if names.get(wd, set()) is not None:
+                    names[wd] = names.get(wd, set()) | {os.path.basename(path)}
+        # Catch changes made after start() but before the watches were in place
+        self._check()
+        try:
+            while not self._stop.is_set():
+                # Wake up periodically so stop() is noticed
+                events = inotify.read(timeout=1000)
+                if any(names.get(event.wd) is None or event.name in names[event.wd] for event in events):
+                    time.sleep(self.SETTLE_SECONDS)
+                    self._check()
+        finally:
+            inotify.close()
+
+
+def autorefresh(db, interval: float = 1.0, key: str = "autorefresh"):
+    """
+    Rerun the Streamlit app when a watched database changes.
+
+    Call once near the top of the app, after ``db.watch()``. A small fragment
+    compares ``db.data_version`` (an in-memory counter bumped by the watcher) with
+    the version this session last rendered, so checking costs no file I/O.
+    Needs a Streamlit version with ``st.fragment``; on older versions it does nothing.
+
+    Args:
+        db: CSVDatabase that is being watched
+        interval: Seconds between checks
+        key: Session state key used to remember the rendered version
+    """
+    import streamlit as st
+
+    if not hasattr(st, "fragment"):
+        return
+
+    # This run renders the current data
+    st.session_state[key] = db.data_version
+
+    @st.fragment(run_every=interval)
+    def _check_for_changes():
+        if db.data_version != st.session_state[key]:
+            st.session_state[key] = db.data_version
+            st.rerun()
+
+    _check_for_changes()